@@ -0,0 +1,7 @@
+"""
+Каталог изображений: индексация описаний от LLM, полнотекстовый и семантический поиск.
+
+Запуск команд: python -m catalog <команда> [аргументы] (список — python -m catalog --help).
+Импорт пакета и модулей не загружает faiss, sentence_transformers и torch:
+они импортируются только в функциях, которым нужны.
+"""
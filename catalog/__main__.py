@@ -0,0 +1,6 @@
+from .cli import main
+
+if __name__ == "__main__":
+    # Проверка имени: дочерние процессы multiprocessing (spawn) импортируют этот модуль
+    # как __mp_main__ и не должны повторно запускать команду
+    main()
@@ -0,0 +1,384 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import numpy as np
+from .fake_ollama import start_fake_ollama
+from .import_time import measure_commands
+
+# Параметры по умолчанию
+IMAGES = 200                 # Изображений в синтетическом дереве
+RESOLUTION = '1920x1280'     # Разрешение синтетических изображений
+FILES_PER_DIR = 100          # Файлов в одном каталоге дерева
+ROWS = [10000, 100000, 1000000]   # Размеры синтетических каталогов для поиска
+LATENCY = 0.05               # Задержка фейкового Ollama, секунды
+QUERIES = 200                # Запросов на каждый вид поиска
+K = 10                       # Результатов на запрос
+INSERT_CHUNK = 10000         # Строк каталога, вставляемых одной транзакцией
+DESCRIPTION_WORDS = 40       # Слов в синтетическом описании
+SEED = 42
+IMPORT_REPEATS = 3           # Запусков на замер времени импорта команды; 0 — без замера
+
+# Словарь синтетических описаний: частые и редкие слова, чтобы FTS-запросы
+# находили и много, и мало совпадений
+VOCABULARY = ('закат', 'море', 'горы', 'лес', 'город', 'улица', 'портрет', 'собака', 'кошка', 'река',
+              'мост', 'небо', 'облака', 'снег', 'пляж', 'цветы', 'дерево', 'здание', 'машина', 'поезд',
+              'ночь', 'утро', 'туман', 'дождь', 'озеро', 'поле', 'дорога', 'окно', 'свет', 'тень',
+              'красный', 'синий', 'зеленый', 'желтый', 'теплый', 'холодный', 'яркий', 'темный',
+              'крупный', 'план', 'перспектива', 'композиция', 'силуэт', 'отражение', 'фон', 'передний',
+              'человек', 'группа', 'праздник', 'рынок', 'площадь', 'храм', 'маяк', 'корабль', 'парк')
+
+def _peak_rss():
+    """Пиковый объем резидентной памяти текущего процесса в байтах (ru_maxrss — КиБ в Linux, байты в macOS)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+def _percentiles(latencies):
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "mean_ms": float(latencies_ms.mean()),
+    }
+
+def parse_resolution(value):
+    """Разбирает разрешение вида 1920x1280."""
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+def make_image_tree(root, n_images, resolution=RESOLUTION, files_per_dir=FILES_PER_DIR, seed=SEED):
+    """
+    Создает дерево синтетических JPEG: по files_per_dir файлов в каталоге.
+
+    Изображения — плавные цветовые поля из случайной сетки с шумом, поэтому
+    их декодирование и сжатие ведут себя как у фотографий, а не как у заливки.
+    Для одинаковых параметров дерево всегда одно и то же; существующее дерево
+    с теми же параметрами используется повторно.
+
+    Returns:
+        int: Общий размер файлов в байтах
+    """
+    from PIL import Image
+
+    width, height = parse_resolution(resolution)
+    params = {"n_images": n_images, "resolution": resolution, "files_per_dir": files_per_dir, "seed": seed}
+    marker = os.path.join(root, 'tree.json')
+    if os.path.exists(marker):
+        with open(marker, encoding='utf-8') as f:
+            saved = json.load(f)
+        if saved["params"] == params:
+            return saved["bytes"]
+        shutil.rmtree(root)
+
+    total = 0
+    for i in range(n_images):
+        rng = np.random.default_rng([seed, i])
+        directory = os.path.join(root, f'dir{i // files_per_dir:04d}')
+        os.makedirs(directory, exist_ok=True)
+        grid = Image.fromarray(rng.integers(0, 256, (6, 8, 3), dtype=np.uint8))
+        image = grid.resize((width, height), Image.Resampling.BICUBIC)
+        noise = rng.integers(-12, 13, (height, width, 3))
+        pixels = np.clip(np.asarray(image, dtype=np.int16) + noise, 0, 255).astype(np.uint8)
+        path = os.path.join(directory, f'img{i:07d}.jpg')
+        Image.fromarray(pixels).save(path, quality=90)
+        total += os.path.getsize(path)
+    with open(marker, 'w', encoding='utf-8') as f:
+        json.dump({"params": params, "bytes": total}, f)
+    return total
+
+def synthetic_descriptions(start, size, seed=SEED):
+    """Синтетические описания строк start..start+size, детерминированные по seed."""
+    rng = np.random.default_rng([seed, start])
+    # Распределение слов близко к закону Ципфа: первые слова словаря встречаются чаще
+    weights = 1 / np.arange(1, len(VOCABULARY) + 1)
+    words = rng.choice(len(VOCABULARY), (size, DESCRIPTION_WORDS), p=weights / weights.sum())
+    return [' '.join(VOCABULARY[w] for w in row) for row in words]
+
+def make_queries(n_queries, seed=SEED):
+    """Запросы из двух-трех слов словаря."""
+    rng = np.random.default_rng(seed + 1)
+    return [' '.join(rng.choice(VOCABULARY, rng.integers(2, 4), replace=False)) for _ in range(n_queries)]
+
+@contextlib.contextmanager
+def _quiet(verbose):
+    """Подавляет построчный вывод индексации, чтобы он не искажал замеры."""
+    if verbose:
+        yield
+        return
+    import logging
+    logging.disable(logging.WARNING)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def _index_phase(workdir, image_root, ollama_url, pipeline, workers, max_inflight, verbose):
+    """
+    Индексирует дерево изображений в новую базу (выполняется в отдельном процессе,
+    чтобы пиковая память относилась только к этому этапу).
+    """
+    os.chdir(workdir)
+    with _quiet(verbose):
+        from . import metrics
+        from . import index_images
+        from .ollama_client import OllamaClient
+        from .describe_image import setup_logging
+
+        setup_logging()  # Как при запуске индексации из командной строки
+        metrics.enable()
+        client = OllamaClient([ollama_url], max_concurrency=max_inflight)
+        started = time.perf_counter()
+        try:
+            if pipeline:
+                index_images.index_images_pipelined([image_root], True, workers, max_inflight, client=client)
+            else:
+                index_images.index_images_in_directory([image_root], True, client)
+        finally:
+            client.close()
+        elapsed = time.perf_counter() - started
+
+    conn = index_images.init_db()
+    indexed = conn.execute("SELECT COUNT(*) FROM images WHERE description IS NOT NULL").fetchone()[0]
+    conn.close()
+    return {
+        "pipeline": pipeline,
+        "images_indexed": indexed,
+        "elapsed_s": elapsed,
+        "images_per_s": indexed / elapsed if elapsed else None,
+        "peak_rss_bytes": _peak_rss(),
+        "metrics": metrics.summary(),
+    }
+
+def _fill_catalog(conn, n_rows, seed):
+    """Заполняет каталог синтетическими строками в режиме массовой загрузки."""
+    from . import index_images
+
+    index_images.begin_bulk_load(conn)
+    for start in range(0, n_rows, INSERT_CHUNK):
+        size = min(INSERT_CHUNK, n_rows - start)
+        descriptions = synthetic_descriptions(start, size, seed)
+        conn.executemany('INSERT INTO images (file_path, description, exif_json) VALUES (?, ?, ?)',
+                         [(f'/synthetic/{(start + i) // FILES_PER_DIR:06d}/img{start + i:09d}.jpg', desc, '{}')
+                          for i, desc in enumerate(descriptions)])
+        conn.commit()
+    index_images.end_bulk_load(conn)
+
+def _fill_embeddings(conn, dimension, seed):
+    """
+    Заполняет хранилище эмбеддингов синтетическими кластеризованными векторами
+    с актуальными хешами описаний: update_store считает их готовыми,
+    и модель не пересчитывает миллион описаний.
+    """
+    from .benchmark_index import synthetic_chunks
+    from .embedding_store import init_store_table, content_hash, STORE_DTYPES
+
+    init_store_table(conn)
+    n_rows = conn.execute('SELECT COUNT(*) FROM images').fetchone()[0]
+    rows = conn.execute('SELECT id, description FROM images ORDER BY id')
+    for _, chunk in synthetic_chunks(n_rows, dimension, seed):
+        batch = rows.fetchmany(len(chunk))
+        conn.executemany('INSERT OR REPLACE INTO embeddings (image_id, content_hash, dtype, vector) VALUES (?, ?, ?, ?)',
+                         [(image_id, content_hash(desc), STORE_DTYPES['float32'], vector.tobytes())
+                          for (image_id, desc), vector in zip(batch, chunk)])
+    conn.commit()
+
+def _search_phase(workdir, n_rows, index_type, metric, encoding, n_queries, k, real_embeddings, seed, verbose):
+    """
+    Строит синтетический каталог из n_rows строк и индекс FAISS по нему
+    и измеряет задержку полнотекстового и векторного поиска
+    (выполняется в отдельном процессе).
+    """
+    os.chdir(workdir)
+    with _quiet(verbose):
+        from . import catalog_db
+        from . import index_images
+        from .embedding_store import update_store
+        from .create_faiss_index import build_full, init_state_table
+        from .search_images import load_index, load_model, search_similar, rank_results, get_image_info
+        from .hybrid_search import fts_search
+
+        started = time.perf_counter()
+        conn = index_images.init_db()
+        _fill_catalog(conn, n_rows, seed)
+        catalog_s = time.perf_counter() - started
+
+        model = load_model()
+        started = time.perf_counter()
+        if not real_embeddings:
+            _fill_embeddings(conn, model.get_sentence_embedding_dimension(), seed)
+        update_store(conn, model)
+        embed_s = time.perf_counter() - started
+
+        init_state_table(conn)
+        started = time.perf_counter()
+        _, ntotal = build_full(conn, index_type, metric=metric, encoding=encoding)
+        build_s = time.perf_counter() - started
+        conn.close()
+
+        queries = make_queries(n_queries, seed)
+        lookup_conn = catalog_db.connect(index_images.DB_PATH, readonly=True)
+        fts_latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            get_image_info(fts_search(query, k), lookup_conn)
+            fts_latencies.append(time.perf_counter() - started)
+
+        index = load_index()
+        lookup = lambda ids: get_image_info(ids, lookup_conn)
+        vector_latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            distances, indices = search_similar(query, index, model, k)
+            rank_results(distances, indices, lookup)
+            vector_latencies.append(time.perf_counter() - started)
+        lookup_conn.close()
+
+    return {
+        "rows": n_rows,
+        "index_type": index_type,
+        "metric": metric,
+        "encoding": encoding,
+        "vectors": ntotal,
+        "index_bytes": os.path.getsize('image_index.faiss'),
+        "catalog_build_s": catalog_s,
+        "embeddings_s": embed_s,
+        "index_build_s": build_s,
+        "db_bytes": os.path.getsize(index_images.DB_PATH),
+        "fts": _percentiles(fts_latencies),
+        "vector": _percentiles(vector_latencies),
+        "peak_rss_bytes": _peak_rss(),
+    }
+
+def _run_isolated(function, *args):
+    """Выполняет этап в новом процессе (spawn), чтобы замер памяти не включал предыдущие этапы."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+        return executor.submit(function, *args).result()
+
+def _fresh_dir(path):
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    return path
+
+def _environment():
+    """Сведения о запуске для сравнения результатов между коммитами."""
+    repo = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=repo).stdout.strip() or None
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    capture_output=True, text=True, cwd=repo).stdout.strip())
+    except OSError:
+        commit, dirty = None, None
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "started_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+def run_benchmark(workdir, images=IMAGES, resolution=RESOLUTION, rows=ROWS, index_type='flat',
+                  metric='l2', encoding='flat', pipeline=True, workers=4, max_inflight=4, latency=LATENCY, n_queries=QUERIES, k=K,
+                  real_embeddings=False, seed=SEED, verbose=False, import_repeats=IMPORT_REPEATS):
+    """
+    Запускает сквозной бенчмарк: индексацию дерева изображений через фейковый
+    Ollama и поиск по синтетическим каталогам каждого размера из rows.
+
+    Returns:
+        dict: Параметры, окружение и результаты этапов
+    """
+    workdir = os.path.abspath(workdir)
+    image_root = os.path.join(workdir, 'images')
+    result = {"environment": _environment(), "imports": None, "indexing": None, "search": []}
+
+    if import_repeats:
+        print("Время импорта команд...")
+        result["imports"] = measure_commands(repeats=import_repeats)
+        print('  ' + ', '.join(f"{name} {r['import_ms']:.0f} мс" for name, r in result["imports"].items()))
+
+    if images:
+        print(f"Синтетическое дерево: {images} изображений {resolution}...")
+        tree_bytes = make_image_tree(image_root, images, resolution, seed=seed)
+        server, url = start_fake_ollama(latency=latency)
+        try:
+            print(f"Индексация через фейковый Ollama ({url}, задержка {latency} с)...")
+            indexing = _run_isolated(_index_phase, _fresh_dir(os.path.join(workdir, 'index_run')), image_root,
+                                     url, pipeline, workers, max_inflight, verbose)
+        finally:
+            server.shutdown()
+        indexing.update({"tree_bytes": tree_bytes, "resolution": resolution, "ollama_latency_s": latency,
+                         "ollama_requests": server.requests})
+        result["indexing"] = indexing
+        print(f"  {indexing['images_indexed']} изображений за {indexing['elapsed_s']:.1f} с: "
+              f"{indexing['images_per_s']:.1f} изобр./с, пик памяти {indexing['peak_rss_bytes'] / 2**20:.0f} МиБ")
+
+    for n_rows in rows:
+        print(f"Каталог {n_rows} строк, индекс {index_type} ({metric}, {encoding})...")
+        search = _run_isolated(_search_phase, _fresh_dir(os.path.join(workdir, f'search_{n_rows}')), n_rows,
+                               index_type, metric, encoding, n_queries, k, real_embeddings, seed, verbose)
+        result["search"].append(search)
+        print(f"  построение индекса {search['index_build_s']:.2f} с; "
+              f"FTS p50={search['fts']['p50_ms']:.2f} мс p99={search['fts']['p99_ms']:.2f} мс; "
+              f"векторный p50={search['vector']['p50_ms']:.2f} мс p99={search['vector']['p99_ms']:.2f} мс; "
+              f"пик памяти {search['peak_rss_bytes'] / 2**20:.0f} МиБ")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Сквозной бенчмарк индексации и поиска на синтетическом каталоге.')
+    parser.add_argument('--images', type=int, default=IMAGES,
+                        help=f'Изображений в синтетическом дереве; 0 — без этапа индексации (по умолчанию: {IMAGES})')
+    parser.add_argument('--resolution', default=RESOLUTION,
+                        help=f'Разрешение синтетических изображений (по умолчанию: {RESOLUTION})')
+    parser.add_argument('--rows', type=int, nargs='*', default=ROWS,
+                        help=f'Размеры синтетических каталогов для поиска (по умолчанию: {" ".join(map(str, ROWS))})')
+    parser.add_argument('--index-type', default='flat', help='Тип FAISS индекса (по умолчанию: flat)')
+    parser.add_argument('--metric', choices=['l2', 'cosine'], default='l2', help='Метрика индекса (по умолчанию: l2)')
+    parser.add_argument('--encoding', choices=['flat', 'sqfp16', 'sq8'], default='flat',
+                        help='Хранение векторов в индексе (по умолчанию: flat)')
+    parser.add_argument('--sequential', action='store_true', help='Индексировать без конвейера')
+    parser.add_argument('--workers', type=int, default=4, help='Потоки подготовки изображений (по умолчанию: 4)')
+    parser.add_argument('--max-inflight', type=int, default=4,
+                        help='Одновременные запросы к Ollama (по умолчанию: 4)')
+    parser.add_argument('--latency', type=float, default=LATENCY,
+                        help=f'Задержка фейкового Ollama в секундах (по умолчанию: {LATENCY})')
+    parser.add_argument('--queries', type=int, default=QUERIES, help=f'Запросов на вид поиска (по умолчанию: {QUERIES})')
+    parser.add_argument('-k', type=int, default=K, help=f'Результатов на запрос (по умолчанию: {K})')
+    parser.add_argument('--real-embeddings', action='store_true',
+                        help='Вычислять эмбеддинги описаний моделью вместо синтетических векторов (медленно)')
+    parser.add_argument('--seed', type=int, default=SEED, help=f'Зерно генерации данных (по умолчанию: {SEED})')
+    parser.add_argument('--workdir', help='Рабочий каталог (по умолчанию временный; дерево изображений '
+                                          'в указанном каталоге сохраняется между запусками)')
+    parser.add_argument('--verbose', action='store_true', help='Не подавлять вывод индексации')
+    parser.add_argument('--import-repeats', type=int, default=IMPORT_REPEATS,
+                        help=f'Запусков на замер времени импорта каждой команды; 0 — без замера '
+                             f'(по умолчанию: {IMPORT_REPEATS})')
+    parser.add_argument('--output', help='Путь к JSON файлу с результатами')
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='catalog_bench_')
+    try:
+        result = run_benchmark(workdir, args.images, args.resolution, args.rows, args.index_type,
+                               args.metric, args.encoding, not args.sequential, args.workers, args.max_inflight, args.latency,
+                               args.queries, args.k, args.real_embeddings, args.seed, args.verbose,
+                               args.import_repeats)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    result["params"] = vars(args)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты сохранены в {args.output}")
+
+if __name__ == "__main__":
+    main()
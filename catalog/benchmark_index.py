@@ -0,0 +1,179 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import numpy as np
+import faiss
+from .create_faiss_index import (make_index, train_index, set_search_params, base_index, prepare_vectors,
+                                 TRAIN_SAMPLE_SIZE, METRICS, ENCODINGS, faiss_metric)
+
+# Константы
+DIMENSION = 384          # Размерность all-MiniLM-L6-v2
+CHUNK_SIZE = 100000      # Векторы генерируются и добавляются порциями
+N_CLUSTERS = 1000        # Количество кластеров в синтетических данных
+
+def _clustered(centers, seed, start, size):
+    """Порция кластеризованных векторов, детерминированно зависящая от seed и start."""
+    rng = np.random.default_rng([seed, start])
+    labels = rng.integers(0, len(centers), size)
+    noise = rng.standard_normal((size, centers.shape[1])).astype(np.float32) * 0.5
+    return centers[labels] + noise
+
+def _centers(dimension, seed):
+    return np.random.default_rng(seed).standard_normal((N_CLUSTERS, dimension)).astype(np.float32)
+
+def synthetic_chunks(n_vectors, dimension=DIMENSION, seed=42, chunk_size=CHUNK_SIZE):
+    """
+    Генерирует синтетические векторы порциями.
+
+    Данные кластеризованы (центры + шум), чтобы приближенные индексы
+    вели себя похоже на реальные эмбеддинги. Для одинакового seed
+    последовательность всегда одна и та же.
+    """
+    centers = _centers(dimension, seed)
+    for start in range(0, n_vectors, chunk_size):
+        size = min(chunk_size, n_vectors - start)
+        yield start, _clustered(centers, seed, start, size)
+
+def make_queries(n_queries, dimension=DIMENSION, seed=42):
+    """Генерирует запросы из того же распределения, что и данные, но не совпадающие с ними."""
+    return _clustered(_centers(dimension, seed), seed + 1, 0, n_queries)
+
+def ground_truth(n_vectors, queries, k, dimension=DIMENSION, metric='l2'):
+    """Точные k ближайших соседей перебором, без хранения всех векторов в памяти."""
+    metric_type = faiss_metric(metric)
+    queries = prepare_vectors(queries, metric_type)
+    heap = faiss.ResultHeap(len(queries), k, keep_max=metric_type == faiss.METRIC_INNER_PRODUCT)
+    for start, chunk in synthetic_chunks(n_vectors, dimension):
+        distances, indices = faiss.knn(queries, prepare_vectors(chunk, metric_type), k, metric_type)
+        heap.add_result(distances, np.where(indices >= 0, indices + start, -1))
+    heap.finalize()
+    return heap.I
+
+def build_index(index_type, n_vectors, dimension=DIMENSION, metric='l2', encoding='flat'):
+    """Строит индекс на синтетических данных и возвращает его вместе со временем построения."""
+    started = time.perf_counter()
+    index = make_index(dimension, index_type, n_vectors, metric, encoding)
+    if not index.is_trained:
+        # Обучающая выборка из первых порций, чтобы не генерировать все данные заранее
+        sample = [chunk for _, chunk in synthetic_chunks(min(n_vectors, TRAIN_SAMPLE_SIZE), dimension)]
+        train_index(index, prepare_vectors(np.concatenate(sample), index.metric_type))
+    for start, chunk in synthetic_chunks(n_vectors, dimension):
+        index.add_with_ids(prepare_vectors(chunk, index.metric_type),
+                           np.arange(start, start + len(chunk), dtype=np.int64))
+    return index, time.perf_counter() - started
+
+def index_memory(index):
+    """Размер сериализованного индекса в байтах (приближение занимаемой памяти)."""
+    fd, path = tempfile.mkstemp(suffix='.faiss')
+    os.close(fd)
+    try:
+        faiss.write_index(index, path)
+        return os.path.getsize(path)
+    finally:
+        os.remove(path)
+
+def measure(index, queries, gt, k):
+    """Измеряет recall@k и задержку одиночных запросов."""
+    latencies = []
+    queries = prepare_vectors(queries, index.metric_type)
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        _, indices = index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - started)
+        found[i] = indices[0]
+    recall = np.mean([len(set(found[i]) & set(gt[i])) / k for i in range(len(queries))])
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "recall_at_k": float(recall),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+
+def run_benchmark(sizes, index_types, k=10, n_queries=200, nprobes=(1, 8, 32), ef_searches=(16, 64, 128),
+                  metric_names=('l2',), encodings=('flat',)):
+    """
+    Запускает бенчмарк для всех размеров, типов индексов, метрик и способов хранения векторов.
+
+    recall@k считается относительно точного поиска в той же метрике, поэтому для
+    sqfp16 и sq8 он показывает потерю точности от квантования, а memory_ratio —
+    размер индекса относительно хранения в float32 (flat) того же типа.
+    """
+    results = []
+    queries = make_queries(n_queries)
+    for n_vectors in sizes:
+        print(f"\nКаталог: {n_vectors} векторов")
+        for metric in metric_names:
+            print(f"Вычисление точных соседей ({metric})...")
+            gt = ground_truth(n_vectors, queries, k, metric=metric)
+            for index_type in index_types:
+                flat_memory = None
+                for encoding in encodings:
+                    print(f"Построение индекса {index_type}, {metric}, {encoding}...")
+                    index, build_time = build_index(index_type, n_vectors, metric=metric, encoding=encoding)
+                    memory = index_memory(index)
+                    if encoding == 'flat':
+                        flat_memory = memory
+                    results.extend(_measure_settings(index, queries, gt, k, nprobes, ef_searches, {
+                        "n_vectors": n_vectors,
+                        "index_type": index_type,
+                        "metric": metric,
+                        "encoding": encoding,
+                        "build_time_s": build_time,
+                        "memory_bytes": memory,
+                        "bytes_per_vector": memory / n_vectors,
+                        "memory_ratio": memory / flat_memory if flat_memory else None,
+                    }))
+                    del index
+    return results
+
+def _measure_settings(index, queries, gt, k, nprobes, ef_searches, info):
+    """Измеряет индекс со всеми подходящими ему параметрами поиска."""
+    results = []
+    # Перебираем параметры поиска, подходящие для типа индекса
+    base = base_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        settings = [{"nprobe": nprobe} for nprobe in nprobes]
+    elif hasattr(base, 'hnsw'):
+        settings = [{"ef_search": ef} for ef in ef_searches]
+    else:
+        settings = [{}]
+
+    for params in settings:
+        set_search_params(index, params.get("nprobe"), params.get("ef_search"))
+        row = {**info, "params": params, **measure(index, queries, gt, k)}
+        results.append(row)
+        ratio = f" ({row['memory_ratio']:.2f} от flat)" if row['memory_ratio'] else ""
+        print(f"  {params or '-'}: recall@{k}={row['recall_at_k']:.3f} "
+              f"p50={row['p50_ms']:.2f}мс p99={row['p99_ms']:.2f}мс "
+              f"память={row['memory_bytes'] / 2**20:.1f}МБ{ratio}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк типов FAISS индексов на синтетических данных.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000000, 10000000],
+                        help='Размеры синтетических каталогов (по умолчанию: 1000000 10000000)')
+    parser.add_argument('--index-types', nargs='+', default=['flat', 'ivf', 'ivfpq', 'hnsw'],
+                        help='Типы индексов или строки faiss.index_factory')
+    parser.add_argument('--metrics', nargs='+', choices=list(METRICS), default=['l2'],
+                        help='Метрики: l2 и/или cosine (по умолчанию: l2)')
+    parser.add_argument('--encodings', nargs='+', choices=list(ENCODINGS), default=['flat'],
+                        help='Хранение векторов: flat, sqfp16, sq8 (по умолчанию: flat); '
+                             'flat указывается первым, чтобы посчитать экономию памяти')
+    parser.add_argument('-k', type=int, default=10, help='Количество соседей для recall@k (по умолчанию: 10)')
+    parser.add_argument('--queries', type=int, default=200, help='Количество запросов (по умолчанию: 200)')
+    parser.add_argument('--output', help='Путь к JSON файлу с результатами')
+    args = parser.parse_args()
+
+    results = run_benchmark(args.sizes, args.index_types, args.k, args.queries,
+                            metric_names=args.metrics, encodings=args.encodings)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты сохранены в {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import sqlite3
+import time
+from . import metrics
+
+# Параметры подключения к базе каталога
+DB_PATH = 'images.db'
+BUSY_TIMEOUT = 30.0          # Сколько ждать снятия блокировки записи, секунды
+COMMIT_INTERVAL = 2.0        # Максимальное время между фиксациями пакетной записи, секунды
+
+# PRAGMA, применяемые к каждому соединению. WAL позволяет читателям
+# (list_images, search_images, сервер поиска) работать параллельно с записью.
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',     # В режиме WAL не теряет целостность при сбое, fsync только на checkpoint
+    'cache_size': -65536,        # Отрицательное значение — размер в КиБ (64 МиБ)
+    'mmap_size': 268435456,      # 256 МиБ файла читается через отображение в память
+    'temp_store': 'MEMORY',
+}
+
+def configure(**pragmas):
+    """
+    Изменяет PRAGMA для всех последующих соединений.
+    Значения None пропускаются.
+    """
+    PRAGMAS.update({name: value for name, value in pragmas.items() if value is not None})
+
+def apply_pragmas(conn, readonly=False):
+    """Применяет настроенные PRAGMA к соединению."""
+    for name, value in PRAGMAS.items():
+        if readonly and name == 'journal_mode':
+            # Режим журнала хранится в файле базы; читатель не может его менять
+            continue
+        conn.execute(f'PRAGMA {name} = {value}')
+
+def connect(db_path=DB_PATH, readonly=False, **kwargs):
+    """
+    Открывает соединение с базой каталога с настроенными PRAGMA.
+
+    Args:
+        db_path (str): Путь к файлу базы данных
+        readonly (bool): Открыть только для чтения (mode=ro)
+        **kwargs: Дополнительные параметры sqlite3.connect
+    """
+    kwargs.setdefault('timeout', BUSY_TIMEOUT)
+    if readonly:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, **kwargs)
+    else:
+        conn = sqlite3.connect(db_path, **kwargs)
+    apply_pragmas(conn, readonly)
+    return conn
+
+class BatchWriter:
+    """
+    Пакетная запись: элементы накапливаются в памяти и записываются одной
+    транзакцией, когда набирается batch_size элементов или с последней
+    фиксации прошло commit_interval секунд.
+    """
+
+    def __init__(self, conn, write, batch_size=50, commit_interval=COMMIT_INTERVAL):
+        """
+        Args:
+            conn (sqlite3.Connection): Соединение для записи
+            write (callable): Функция write(conn, batch), выполняющая запись без фиксации
+            batch_size (int): Максимальное количество элементов в транзакции
+            commit_interval (float): Максимальное время между фиксациями, секунды
+        """
+        self.conn = conn
+        self.write = write
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self.batch = []
+        self.last_commit = time.monotonic()
+
+    def add(self, item):
+        self.batch.append(item)
+        if len(self.batch) >= self.batch_size or self.due():
+            self.flush()
+
+    def due(self):
+        """Истек ли интервал фиксации."""
+        return bool(self.batch) and time.monotonic() - self.last_commit >= self.commit_interval
+
+    def flush(self):
+        if self.batch:
+            try:
+                with metrics.timer('sqlite_write'):
+                    self.write(self.conn, self.batch)
+                    self.conn.commit()
+                metrics.inc('rows_written', len(self.batch))
+            except Exception:
+                self.conn.rollback()
+                raise
+            finally:
+                self.batch = []
+        self.last_commit = time.monotonic()
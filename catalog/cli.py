@@ -0,0 +1,44 @@
+import sys
+import importlib
+
+PROG = 'python -m catalog'
+
+# Команды: имя -> (модуль пакета, описание). Модуль импортируется только при запуске
+# своей команды, поэтому справка и легкие команды (list, exif) не загружают faiss и torch
+COMMANDS = {
+    'index': ('index_images', 'Индексация каталогов изображений'),
+    'describe': ('describe_image', 'Описание одного изображения через Ollama'),
+    'exif': ('extract_exif', 'EXIF-метаданные файлов в JSON'),
+    'list': ('list_images', 'Список проиндексированных изображений'),
+    'build-index': ('create_faiss_index', 'Создание и обновление FAISS индекса'),
+    'search': ('search_images', 'Семантический поиск по описаниям'),
+    'hybrid': ('hybrid_search', 'Гибридный поиск: полнотекстовый и семантический'),
+    'similar': ('image_hashes', 'Поиск похожих изображений по перцептивным хешам'),
+    'serve': ('search_server', 'HTTP-сервер поиска'),
+    'bench': ('benchmark_e2e', 'Сквозной бенчмарк индексации и поиска'),
+    'bench-index': ('benchmark_index', 'Бенчмарк типов FAISS индекса'),
+    'fake-ollama': ('fake_ollama', 'Имитация сервера Ollama для нагрузочных тестов'),
+    'import-time': ('import_time', 'Время импорта модулей команд'),
+}
+
+def usage():
+    """Список команд для --help."""
+    lines = [f'Использование: {PROG} <команда> [аргументы]', '', 'Команды:']
+    lines += [f'  {name:<12} {description}' for name, (_, description) in COMMANDS.items()]
+    lines += ['', f'Справка по команде: {PROG} <команда> --help']
+    return '\n'.join(lines)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return
+    name = argv[0]
+    if name not in COMMANDS:
+        print(f"Неизвестная команда: {name}\n\n{usage()}", file=sys.stderr)
+        sys.exit(2)
+
+    module = importlib.import_module(f'.{COMMANDS[name][0]}', __package__)
+    # Модули команд разбирают sys.argv сами; первый элемент — имя программы в справке argparse
+    sys.argv = [f'{PROG} {name}', *argv[1:]]
+    module.main()
@@ -0,0 +1,617 @@
+from . import catalog_db
+import json
+import argparse
+import numpy as np
+import os
+import sys
+from .sharded_index import ShardedIndex, load_manifest, save_manifest, manifest_path, shard_path
+from .embedding_store import (update_store, store_dimension, count_embeddings, iter_embeddings, sample_embeddings,
+                              range_condition, STORE_DTYPES, ENCODE_BATCH_SIZE)
+from . import metrics
+
+# faiss и sentence_transformers импортируются внутри функций: search_images импортирует
+# этот модуль и для поиска через сервер, которому эти библиотеки не нужны
+
+# Константы
+DB_PATH = 'images.db'
+INDEX_PATH = 'image_index.faiss'
+MODEL_NAME = 'all-MiniLM-L6-v2'  # Легкая модель для эмбеддингов
+TRAIN_SAMPLE_SIZE = 100000  # Максимальное количество векторов для обучения индекса
+CHUNK_SIZE = 10000  # Количество векторов, читаемых из хранилища и добавляемых в индекс за раз
+
+# Предустановленные типы индексов (строки для faiss.index_factory).
+# Любая другая строка передается в index_factory как есть.
+INDEX_TYPES = {
+    'flat': '{codec}',               # Точный поиск перебором
+    'ivf': 'IVF{nlist},{codec}',     # Инвертированные списки
+    'ivfpq': 'IVF{nlist},PQ{m}',     # Инвертированные списки, сжатые PQ векторы
+    'hnsw': 'HNSW32,{codec}',        # Граф HNSW
+}
+
+# Хранение векторов в индексе (подставляется в предустановленные типы вместо {codec}).
+# Байт на вектор размерности 384: flat — 1536, sqfp16 — 768, sq8 — 384.
+ENCODINGS = {
+    'flat': 'Flat',      # float32
+    'sqfp16': 'SQfp16',  # float16
+    'sq8': 'SQ8',        # скалярное квантование в 8 бит по измерению
+}
+
+# Метрики (имена констант faiss): cosine — векторы нормализуются по L2 и сравниваются
+# скалярным произведением, расстояние индекса — это косинусное сходство в [-1, 1]
+METRICS = {
+    'l2': 'METRIC_L2',
+    'cosine': 'METRIC_INNER_PRODUCT',
+}
+
+# Параметры построения индекса по умолчанию; параметры построенного индекса
+# сохраняются в таблице faiss_spec и используются при --incremental
+SPEC_DEFAULTS = {'index_type': 'flat', 'metric': 'l2', 'encoding': 'flat'}
+SPEC_FLAGS = {'index_type': '--index-type', 'metric': '--metric', 'encoding': '--encoding'}
+
+def faiss_metric(metric):
+    """Константа faiss для метрики из METRICS."""
+    import faiss
+    return getattr(faiss, METRICS[metric])
+
+def count_images(conn):
+    """Количество изображений в каталоге."""
+    return conn.execute('SELECT COUNT(*) FROM images').fetchone()[0]
+
+def shard_ranges(conn, n_shards):
+    """
+    Делит идентификаторы изображений на n_shards диапазонов примерно равного размера.
+
+    Returns:
+        list: Пары (min_id, max_id); у первого диапазона нет нижней границы,
+              у последнего — верхней, чтобы новые изображения попадали в последний шард
+    """
+    total = count_embeddings(conn)
+    starts = []
+    for shard_no in range(1, n_shards):
+        row = conn.execute('SELECT image_id FROM embeddings ORDER BY image_id LIMIT 1 OFFSET ?',
+                           (shard_no * total // n_shards,)).fetchone()
+        if row is not None and (not starts or row[0] > starts[-1]):
+            starts.append(row[0])
+    bounds = [None] + starts
+    ranges = [(bounds[i], bounds[i + 1] - 1 if i + 1 < len(bounds) else None) for i in range(len(bounds))]
+
+    # Пустой диапазон (векторов меньше, чем шардов) присоединяется к соседнему:
+    # обучаемому индексу не на чем обучаться, а диапазоны должны покрывать все id
+    merged = []
+    for min_id, max_id in ranges:
+        if merged and _range_empty(conn, *merged[-1]):
+            min_id = merged.pop()[0]
+        merged.append((min_id, max_id))
+    if len(merged) > 1 and _range_empty(conn, *merged[-1]):
+        merged.pop()
+        merged[-1] = (merged[-1][0], None)
+    return merged
+
+def _range_empty(conn, min_id, max_id):
+    """Нет ли векторов в диапазоне (поиск по первичному ключу, без подсчета)."""
+    where, params = range_condition(min_id, max_id)
+    return conn.execute(f'SELECT 1 FROM embeddings WHERE {where} LIMIT 1', params).fetchone() is None
+
+def init_state_table(conn):
+    """Создает таблицы с хешами описаний, уже добавленных в индекс, и с параметрами индекса."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS faiss_state (
+            image_id INTEGER PRIMARY KEY,
+            content_hash TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS faiss_spec (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    ''')
+    conn.commit()
+
+def load_spec(conn):
+    """Параметры построенного индекса (index_type, metric, encoding) или None."""
+    spec = dict(conn.execute('SELECT key, value FROM faiss_spec').fetchall())
+    return spec if set(spec) >= set(SPEC_DEFAULTS) else None
+
+def begin_state_update(conn):
+    """
+    Временные таблицы для изменений состояния. Изменения накапливаются
+    порциями и применяются только после сохранения индекса.
+    """
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS faiss_state_new (image_id INTEGER PRIMARY KEY, content_hash TEXT)')
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS faiss_state_removed (image_id INTEGER PRIMARY KEY)')
+    conn.execute('DELETE FROM faiss_state_new')
+    conn.execute('DELETE FROM faiss_state_removed')
+
+def commit_state_update(conn, replace=False, spec=None):
+    """
+    Применяет накопленные изменения состояния индекса одной транзакцией;
+    spec — параметры индекса, сохраняемые вместе с состоянием.
+    """
+    with conn:
+        if spec is not None:
+            conn.executemany('INSERT OR REPLACE INTO faiss_spec (key, value) VALUES (?, ?)',
+                             [(key, spec[key]) for key in SPEC_DEFAULTS])
+        if replace:
+            conn.execute('DELETE FROM faiss_state')
+        conn.execute('DELETE FROM faiss_state WHERE image_id IN (SELECT image_id FROM faiss_state_removed)')
+        conn.execute('INSERT OR REPLACE INTO faiss_state (image_id, content_hash) '
+                     'SELECT image_id, content_hash FROM faiss_state_new')
+
+def create_embeddings(descriptions, model=None, show_progress_bar=True):
+    """Создает эмбеддинги для описаний изображений."""
+    if model is None:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(MODEL_NAME)
+    texts = [desc or '' for _, desc in descriptions]
+    embeddings = model.encode(texts, show_progress_bar=show_progress_bar)
+    return embeddings
+
+def choose_nlist(n_vectors):
+    """Подбирает количество кластеров IVF: около 4*sqrt(N), но не больше N/39 для обучения."""
+    return max(1, min(int(4 * np.sqrt(max(n_vectors, 1))), n_vectors // 39))
+
+def choose_pq_m(dimension):
+    """Подбирает количество подквантователей PQ, на которое делится размерность."""
+    return next(m for m in (64, 48, 32, 24, 16, 12, 8, 4, 2, 1) if dimension % m == 0)
+
+def make_index(dimension, index_type='flat', n_vectors=0, metric='l2', encoding='flat'):
+    """
+    Создает пустой индекс по имени типа или строке faiss.index_factory.
+    
+    Индексы без собственной поддержки идентификаторов оборачиваются в IndexIDMap.
+    
+    Args:
+        dimension (int): Размерность векторов
+        index_type (str): Имя из INDEX_TYPES или строка faiss.index_factory
+        n_vectors (int): Ожидаемое количество векторов (для выбора числа кластеров IVF)
+        metric (str): Метрика из METRICS
+        encoding (str): Хранение векторов из ENCODINGS (только для предустановленных типов)
+    """
+    import faiss
+    spec = INDEX_TYPES.get(index_type, index_type)
+    spec = spec.format(nlist=choose_nlist(n_vectors), m=choose_pq_m(dimension), codec=ENCODINGS[encoding])
+    index = faiss.index_factory(dimension, spec, faiss_metric(metric))
+    if spec.startswith('IDMap') or 'IVF' in spec:
+        return index
+    return faiss.IndexIDMap(index)
+
+def train_index(index, embeddings, sample_size=TRAIN_SAMPLE_SIZE, seed=1234):
+    """Обучает индекс на случайной выборке векторов, если индекс требует обучения."""
+    if index.is_trained:
+        return
+    if len(embeddings) > sample_size:
+        rng = np.random.default_rng(seed)
+        sample = embeddings[np.sort(rng.choice(len(embeddings), sample_size, replace=False))]
+    else:
+        sample = embeddings
+    index.train(np.ascontiguousarray(sample, dtype=np.float32))
+
+def index_metric(index):
+    """Имя метрики индекса из METRICS."""
+    import faiss
+    return 'cosine' if index.metric_type == faiss.METRIC_INNER_PRODUCT else 'l2'
+
+def prepare_vectors(vectors, metric_type=None):
+    """
+    Приводит векторы к виду, в котором они хранятся в индексе: непрерывный float32,
+    для скалярного произведения — нормализованные по L2. Применяется и к добавляемым
+    векторам, и к запросам, поэтому хранилище эмбеддингов остается ненормализованным.
+    """
+    import faiss
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if metric_type == faiss.METRIC_INNER_PRODUCT:
+        vectors = vectors.copy()
+        faiss.normalize_L2(vectors)
+    return vectors
+
+def similarity(distance, metric_type=None):
+    """
+    Сходство результата в [-1, 1], сравнимое между запросами: для индекса
+    с косинусной метрикой это само расстояние FAISS. Для L2 по ненормализованным
+    векторам сходство не определено — None.
+    """
+    import faiss
+    if metric_type != faiss.METRIC_INNER_PRODUCT:
+        return None
+    return min(1.0, max(-1.0, float(distance)))
+
+def base_index(index):
+    """Возвращает индекс, обернутый в IndexIDMap, или сам индекс (для шардов — первого шарда)."""
+    import faiss
+    if isinstance(index, ShardedIndex):
+        index = index.shards[0]
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+
+def _sq_encoding(qtype):
+    """Хранение векторов из ENCODINGS по типу скалярного квантования faiss."""
+    import faiss
+    return {faiss.ScalarQuantizer.QT_fp16: 'sqfp16', faiss.ScalarQuantizer.QT_8bit: 'sq8'}.get(qtype)
+
+def index_spec(index):
+    """
+    Восстанавливает параметры, с которыми был построен индекс.
+
+    Returns:
+        tuple: (тип из INDEX_TYPES, метрика из METRICS, хранение из ENCODINGS)
+               или None, если индекс построен другой строкой index_factory
+    """
+    import faiss
+    base = base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        if base.hnsw.nb_neighbors(1) != 32:
+            return None
+        storage = faiss.downcast_index(base.storage)
+        index_type = 'hnsw'
+        if isinstance(storage, faiss.IndexFlat):
+            encoding = 'flat'
+        elif isinstance(storage, faiss.IndexScalarQuantizer):
+            encoding = _sq_encoding(storage.sq.qtype)
+        else:
+            encoding = None
+    elif isinstance(base, faiss.IndexIVFPQ):
+        index_type, encoding = 'ivfpq', 'flat'
+    elif isinstance(base, faiss.IndexIVFFlat):
+        index_type, encoding = 'ivf', 'flat'
+    elif isinstance(base, faiss.IndexIVFScalarQuantizer):
+        index_type, encoding = 'ivf', _sq_encoding(base.sq.qtype)
+    elif isinstance(base, faiss.IndexFlat):
+        index_type, encoding = 'flat', 'flat'
+    elif isinstance(base, faiss.IndexScalarQuantizer):
+        index_type, encoding = 'flat', _sq_encoding(base.sq.qtype)
+    else:
+        return None
+    if encoding is None:
+        return None
+    return index_type, index_metric(index), encoding
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """Настраивает параметры поиска: nprobe для IVF и efSearch для HNSW."""
+    import faiss
+    if isinstance(index, ShardedIndex):
+        for shard in index.shards:
+            set_search_params(shard, nprobe, ef_search)
+        return
+    base = base_index(index)
+    if nprobe is not None:
+        try:
+            faiss.extract_index_ivf(base).nprobe = nprobe
+        except RuntimeError:
+            pass  # Не IVF индекс
+    if ef_search is not None and hasattr(base, 'hnsw'):
+        base.hnsw.efSearch = ef_search
+
+def make_search_params(index, selector):
+    """
+    Создает параметры поиска с фильтром идентификаторов,
+    сохраняя текущие nprobe/efSearch индекса.
+    """
+    import faiss
+    base = base_index(index)
+    try:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=faiss.extract_index_ivf(base).nprobe)
+    except RuntimeError:
+        pass  # Не IVF индекс
+    if hasattr(base, 'hnsw'):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+def search_ids(index, x, k, ids):
+    """
+    Поиск только среди векторов с идентификаторами ids; фильтр применяется внутри FAISS.
+
+    IndexIDMap в faiss 1.7 не принимает параметры поиска, поэтому фильтр переводится
+    в позиции вложенного индекса, а найденные позиции — обратно в идентификаторы.
+    """
+    import faiss
+    ids = np.asarray(ids, dtype=np.int64)
+    if isinstance(index, ShardedIndex):
+        return index.map_search(lambda shard: search_ids(shard, x, k, ids), k)
+    if not isinstance(index, faiss.IndexIDMap):
+        return index.search(x, k, params=make_search_params(index, faiss.IDSelectorBatch(ids)))
+    id_map = faiss.rev_swig_ptr(index.id_map.data(), index.id_map.size())  # Без копирования
+    positions = np.flatnonzero(np.isin(id_map, ids)).astype(np.int64)
+    inner = faiss.downcast_index(index.index)
+    distances, labels = inner.search(x, k, params=make_search_params(inner, faiss.IDSelectorBatch(positions)))
+    return distances, np.where(labels >= 0, id_map[labels], -1)
+
+def create_faiss_index(embeddings, dimension, ids=None, index_type='flat', metric='l2', encoding='flat'):
+    """
+    Создает FAISS индекс.
+    
+    Векторы добавляются с явными идентификаторами (images.id),
+    поэтому результаты поиска можно напрямую сопоставить со строками базы.
+    """
+    embeddings = prepare_vectors(embeddings, faiss_metric(metric))
+    index = make_index(dimension, index_type, len(embeddings), metric, encoding)
+    train_index(index, embeddings)
+    if ids is None:
+        ids = np.arange(len(embeddings))
+    index.add_with_ids(embeddings, np.asarray(ids, dtype=np.int64))
+    return index
+
+def save_index(index, index_path):
+    """Атомарно сохраняет индекс в файл: сначала во временный, затем переименование."""
+    import faiss
+    tmp_path = f"{index_path}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, index_path)
+
+def load_existing_index(index_path):
+    """Загружает существующий индекс, если он подходит для инкрементального обновления."""
+    import faiss
+    if not os.path.exists(index_path):
+        return None
+    index = faiss.read_index(index_path)
+    if not isinstance(index, (faiss.IndexIDMap, faiss.IndexIVF)):
+        # Старый индекс без идентификаторов нельзя обновлять по images.id
+        return None
+    return index
+
+def build_shard(conn, dimension, index_type, min_id=None, max_id=None, chunk_size=CHUNK_SIZE,
+                metric='l2', encoding='flat'):
+    """
+    Строит индекс по диапазону идентификаторов из хранилища эмбеддингов.
+
+    Векторы читаются и добавляются в индекс по chunk_size штук, поэтому
+    все векторы диапазона никогда не находятся в памяти одновременно.
+    """
+    n_vectors = count_embeddings(conn, min_id, max_id)
+    index = make_index(dimension, index_type, n_vectors, metric, encoding)
+    if not index.is_trained:
+        sample = sample_embeddings(conn, TRAIN_SAMPLE_SIZE, min_id, max_id)
+        if sample is None:
+            raise ValueError(f"Нет векторов для обучения индекса {index_type} (id {min_id or '-'}..{max_id or '-'})")
+        print(f"  Обучение индекса на {len(sample)} векторах...")
+        train_index(index, prepare_vectors(sample, index.metric_type))
+    for ids, hashes, vectors in iter_embeddings(conn, chunk_size, min_id, max_id):
+        index.add_with_ids(prepare_vectors(vectors, index.metric_type), ids)
+        conn.executemany('INSERT OR REPLACE INTO faiss_state_new (image_id, content_hash) VALUES (?, ?)',
+                         zip(ids.tolist(), hashes))
+        print(f"  Добавлено векторов: {index.ntotal}/{n_vectors}")
+    return index
+
+def build_full(conn, index_type='flat', n_shards=1, chunk_size=CHUNK_SIZE, metric='l2', encoding='flat'):
+    """
+    Полностью перестраивает индекс по хранилищу эмбеддингов.
+
+    При n_shards > 1 изображения делятся на диапазоны идентификаторов, и каждый
+    диапазон сохраняется отдельным файлом. Шарды строятся по очереди, поэтому
+    в памяти находится только один из них.
+
+    Returns:
+        tuple: (размерность, количество векторов)
+    """
+    dimension = store_dimension(conn)
+    ranges = shard_ranges(conn, n_shards) if n_shards > 1 else [(None, None)]
+    old_shards = load_manifest(INDEX_PATH) or []
+    begin_state_update(conn)
+
+    shards = []
+    total = 0
+    for shard_no, (min_id, max_id) in enumerate(ranges):
+        path = shard_path(INDEX_PATH, shard_no) if len(ranges) > 1 else INDEX_PATH
+        if len(ranges) > 1:
+            print(f"Создание шарда {shard_no + 1}/{len(ranges)} (id {min_id or '-'}..{max_id or '-'})...")
+        index = build_shard(conn, dimension, index_type, min_id, max_id, chunk_size, metric, encoding)
+        total += index.ntotal
+        save_index(index, path)
+        del index
+        shards.append({"path": path, "min_id": min_id, "max_id": max_id})
+
+    # Описание шардов заменяется последним: до этого поиск видит предыдущую сборку
+    if len(shards) > 1:
+        save_manifest(INDEX_PATH, shards)
+        if os.path.exists(INDEX_PATH):
+            os.remove(INDEX_PATH)
+    elif os.path.exists(manifest_path(INDEX_PATH)):
+        os.remove(manifest_path(INDEX_PATH))
+    new_paths = {os.path.abspath(shard["path"]) for shard in shards}
+    for shard in old_shards:
+        if shard["path"] not in new_paths and os.path.exists(shard["path"]):
+            os.remove(shard["path"])
+
+    commit_state_update(conn, replace=True, spec={'index_type': index_type, 'metric': metric, 'encoding': encoding})
+    return dimension, total
+
+def update_shard(conn, index, min_id=None, max_id=None, chunk_size=CHUNK_SIZE):
+    """
+    Обновляет индекс по диапазону идентификаторов: удаляет векторы удаленных
+    изображений и заменяет векторы, хеш описания которых изменился.
+
+    Returns:
+        int: Количество изменений
+    """
+    where, params = range_condition(min_id, max_id)
+    c = conn.execute(f'''
+        SELECT image_id FROM faiss_state
+        WHERE {where} AND image_id NOT IN (SELECT image_id FROM embeddings)
+    ''', params)
+    removed = [row[0] for row in c.fetchall()]
+    if removed:
+        index.remove_ids(np.asarray(removed, dtype=np.int64))
+        conn.executemany('INSERT OR REPLACE INTO faiss_state_removed (image_id) VALUES (?)',
+                         [(image_id,) for image_id in removed])
+
+    changes = len(removed)
+    for ids, hashes, vectors in iter_embeddings(conn, chunk_size, min_id, max_id):
+        state = dict(conn.execute('SELECT image_id, content_hash FROM faiss_state WHERE image_id BETWEEN ? AND ?',
+                                  (int(ids[0]), int(ids[-1]))).fetchall())
+        changed = np.asarray([state.get(image_id) != h for image_id, h in zip(ids.tolist(), hashes)])
+        if not changed.any():
+            continue
+
+        # Измененные векторы удаляем и добавляем заново
+        stale = [image_id for image_id in ids[changed].tolist() if image_id in state]
+        if stale:
+            index.remove_ids(np.asarray(stale, dtype=np.int64))
+        index.add_with_ids(prepare_vectors(vectors[changed], index.metric_type), ids[changed])
+        conn.executemany('INSERT OR REPLACE INTO faiss_state_new (image_id, content_hash) VALUES (?, ?)',
+                         [(image_id, h) for image_id, h, flag in zip(ids.tolist(), hashes, changed) if flag])
+        changes += int(changed.sum())
+    return changes
+
+def existing_spec(conn, path):
+    """
+    Параметры существующего индекса: сохраненные при построении, а для индексов,
+    построенных до появления faiss_spec, — определенные по файлу (index_spec).
+
+    Returns:
+        dict: index_type, metric, encoding или None, если их не удается определить
+    """
+    spec = load_spec(conn)
+    if spec is not None:
+        return spec
+    import faiss
+    spec = index_spec(faiss.read_index(path))
+    return dict(zip(SPEC_DEFAULTS, spec)) if spec is not None else None
+
+def _rebuild_like(conn, spec, known, n_shards, chunk_size):
+    """
+    Полная перестройка вместо инкрементального обновления с параметрами существующего
+    индекса: иначе поиск молча перешел бы на другой тип индекса или метрику.
+    ValueError, если параметры существующего индекса не удалось определить (known=False).
+    """
+    if not known:
+        raise ValueError("Не удалось определить тип, метрику и хранение векторов существующего индекса; "
+                         "перестройте его без --incremental, указав --index-type, --metric и --encoding")
+    print(f"Параметры индекса: {spec['index_type']}, {spec['metric']}, {spec['encoding']}")
+    return build_full(conn, spec['index_type'], n_shards, chunk_size, spec['metric'], spec['encoding'])
+
+def build_incremental(conn, index_type=None, chunk_size=CHUNK_SIZE, metric=None, encoding=None):
+    """
+    Обновляет индекс: добавляет векторы новых и измененных описаний
+    и удаляет векторы удаленных изображений.
+
+    Шарды обновляются по очереди; новые изображения попадают в последний шард,
+    у диапазона которого нет верхней границы. Тип индекса, метрика и хранение
+    векторов берутся у существующего индекса, в том числе при полной перестройке;
+    index_type, metric и encoding (None — по умолчанию) применяются, только если
+    индекса еще нет. ValueError, если они расходятся с существующим индексом.
+
+    Returns:
+        tuple: (размерность, количество векторов)
+    """
+    manifest = load_manifest(INDEX_PATH)
+    shards = manifest or [{"path": INDEX_PATH, "min_id": None, "max_id": None}]
+    has_state = conn.execute('SELECT 1 FROM faiss_state LIMIT 1').fetchone() is not None
+    dimension = store_dimension(conn)
+
+    requested = {'index_type': index_type, 'metric': metric, 'encoding': encoding}
+    index_exists = os.path.exists(shards[0]["path"])
+    spec = existing_spec(conn, shards[0]["path"]) if index_exists else None
+    known = spec is not None or not index_exists
+    if spec is not None:
+        for key, value in requested.items():
+            if value is not None and value != spec[key]:
+                raise ValueError(f"Индекс построен с {SPEC_FLAGS[key]} {spec[key]}, передано {value}; "
+                                 f"чтобы изменить параметр, перестройте индекс без --incremental")
+    else:
+        spec = {key: value or SPEC_DEFAULTS[key] for key, value in requested.items()}
+    begin_state_update(conn)
+
+    total = 0
+    updated = False
+    for shard in shards:
+        index = load_existing_index(shard["path"])
+        if index is None or (not has_state and index.ntotal > 0):
+            print("Существующий индекс не подходит для обновления, выполняется полная перестройка")
+            return _rebuild_like(conn, spec, known, len(shards), chunk_size)
+        if dimension is not None and dimension != index.d:
+            print("Размерность эмбеддингов изменилась, выполняется полная перестройка")
+            return _rebuild_like(conn, spec, known, len(shards), chunk_size)
+        try:
+            changes = update_shard(conn, index, shard["min_id"], shard["max_id"], chunk_size)
+        except RuntimeError:
+            # Например, HNSW не поддерживает удаление векторов
+            print("Индекс не поддерживает удаление векторов, выполняется полная перестройка")
+            return _rebuild_like(conn, spec, known, len(shards), chunk_size)
+        print(f"Новых, измененных и удаленных в {os.path.basename(shard['path'])}: {changes}")
+        if changes:
+            save_index(index, shard["path"])
+            updated = True
+        dimension = index.d
+        total += index.ntotal
+        del index
+
+    if manifest and updated:
+        # Перезапись описания шардов меняет поколение индекса для кэша результатов
+        save_manifest(INDEX_PATH, shards)
+    # Параметры сохраняются и для индексов, построенных до появления faiss_spec
+    commit_state_update(conn, spec=spec if known else None)
+    return dimension, total
+
+def main():
+    parser = argparse.ArgumentParser(description='Создание FAISS индекса по описаниям изображений.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Обновить существующий индекс, пересчитав только новые и измененные описания')
+    parser.add_argument('--index-type',
+                        help=f'Тип индекса: {", ".join(INDEX_TYPES)} или строка faiss.index_factory (по умолчанию: flat; '
+                             f'при --incremental — тип существующего индекса)')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='Количество шардов по диапазонам id (по умолчанию: 1); '
+                             'при --incremental сохраняется разбиение существующего индекса')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f'Описаний и векторов, обрабатываемых за раз (по умолчанию: {CHUNK_SIZE})')
+    parser.add_argument('--encode-batch-size', type=int, default=ENCODE_BATCH_SIZE,
+                        help=f'Размер пачки кодирования модели (по умолчанию: {ENCODE_BATCH_SIZE})')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='Количество процессов кодирования описаний (по умолчанию: 1)')
+    parser.add_argument('--store-dtype', choices=list(STORE_DTYPES), default='float32',
+                        help='Тип хранения новых векторов в хранилище эмбеддингов (по умолчанию: float32)')
+    parser.add_argument('--metric', choices=list(METRICS),
+                        help='Метрика: l2 или cosine — нормализованные векторы и скалярное произведение, '
+                             'результаты со сходством в [-1, 1] (по умолчанию: l2; '
+                             'при --incremental — метрика существующего индекса)')
+    parser.add_argument('--encoding', choices=list(ENCODINGS),
+                        help='Хранение векторов в индексе: flat (float32), sqfp16 (float16) или '
+                             'sq8 (8 бит) — в 2 и 4 раза меньше памяти (по умолчанию: flat; '
+                             'при --incremental — как у существующего индекса)')
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    with metrics.from_args(args):
+        run(args)
+
+def run(args):
+    """Обновляет хранилище эмбеддингов и строит индекс с разобранными аргументами командной строки."""
+    conn = catalog_db.connect(DB_PATH)
+    init_state_table(conn)
+    try:
+        total = count_images(conn)
+        has_index = os.path.exists(INDEX_PATH) or os.path.exists(manifest_path(INDEX_PATH))
+        if not total and not (args.incremental and has_index):
+            print("В базе данных нет изображений!")
+            return
+        print(f"Найдено {total} изображений")
+
+        # Эмбеддинги вычисляются только для новых и измененных описаний; смена типа
+        # индекса или количества шардов использует уже сохраненные векторы
+        print("Обновление хранилища эмбеддингов...")
+        encoded, removed = update_store(conn, chunk_size=args.chunk_size, batch_size=args.encode_batch_size,
+                                        processes=args.processes, dtype=args.store_dtype)
+        print(f"Вычислено эмбеддингов: {encoded}, удалено: {removed}")
+        if not count_embeddings(conn) and not (args.incremental and has_index):
+            print("В базе данных нет изображений с описаниями!")
+            return
+
+        with metrics.timer('faiss_build'):
+            if args.incremental:
+                dimension, ntotal = build_incremental(conn, args.index_type, args.chunk_size, args.metric,
+                                                      args.encoding)
+            else:
+                dimension, ntotal = build_full(conn, args.index_type or SPEC_DEFAULTS['index_type'], args.shards,
+                                               args.chunk_size, args.metric or SPEC_DEFAULTS['metric'],
+                                               args.encoding or SPEC_DEFAULTS['encoding'])
+    except ValueError as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        conn.close()
+
+    print(f"Индекс успешно создан и сохранен в {INDEX_PATH}")
+    print(f"Размерность эмбеддингов: {dimension}")
+    print(f"Количество векторов в индексе: {ntotal}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import os
+import io
+import time
+import threading
+from PIL import Image, features
+from . import catalog_db
+
+# Константы
+CACHE_DIR = 'derivatives'                 # Каталог кэша уменьшенных копий
+MAX_CACHE_BYTES = 2 << 30                 # Предельный размер кэша (2 ГиБ)
+EVICT_RATIO = 0.9                         # После вытеснения кэш занимает не более 90% предела
+THUMBNAIL_SIZES = {'small': 256, 'medium': 768}
+THUMBNAIL_QUALITY = 80
+
+def thumbnail_format():
+    """Формат миниатюр: WebP, если Pillow собран с его поддержкой, иначе JPEG."""
+    return 'WEBP' if features.check('webp') else 'JPEG'
+
+def payload_name(max_size):
+    """Имя уменьшенной копии, отправляемой в LLM."""
+    return f'payload{max_size}.jpg'
+
+def thumbnail_name(size_name):
+    """Имя миниатюры: small.webp, medium.webp (или .jpg)."""
+    return f'{size_name}.{thumbnail_format().lower()}'
+
+def _encode(image, image_format, quality=THUMBNAIL_QUALITY):
+    """Кодирует изображение в байты указанного формата."""
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    elif image_format == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=quality)
+    return buffer.getvalue()
+
+def render_thumbnails(image):
+    """
+    Строит миниатюры из уже декодированного (обычно уменьшенного для LLM) изображения.
+
+    Returns:
+        dict: {имя миниатюры: байты}
+    """
+    image_format = thumbnail_format()
+    thumbnails = {}
+    for size_name, size in THUMBNAIL_SIZES.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail((size, size), Image.Resampling.LANCZOS)
+        thumbnails[thumbnail_name(size_name)] = _encode(thumbnail, image_format)
+    return thumbnails
+
+class DerivativeCache:
+    """
+    Кэш производных изображений на диске с адресацией по содержимому.
+
+    Ключ — SHA-256 исходного файла (content_hash из базы каталога) и имя копии,
+    поэтому переименованный или скопированный файл использует те же копии.
+    Размеры и время последнего обращения хранятся в index.db внутри каталога кэша;
+    при превышении max_bytes удаляются давно не использованные копии (LRU).
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = catalog_db.connect(os.path.join(cache_dir, 'index.db'), check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS derivatives (
+                content_hash TEXT NOT NULL,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (content_hash, name)
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_derivatives_accessed ON derivatives(accessed_at)')
+        self._conn.commit()
+        self.total_bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM derivatives').fetchone()[0]
+
+    def path(self, content_hash, name):
+        """Путь к файлу копии: <каталог>/ab/abcdef..._small.webp."""
+        return os.path.join(self.cache_dir, content_hash[:2], f'{content_hash}_{name}')
+
+    def get(self, content_hash, name):
+        """Возвращает байты копии или None; обращение обновляет время для LRU."""
+        try:
+            with open(self.path(content_hash, name), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                # Файл мог быть удален вручную: забываем запись
+                self._conn.execute('DELETE FROM derivatives WHERE content_hash = ? AND name = ?',
+                                   (content_hash, name))
+                self._conn.commit()
+            return None
+        with self._lock:
+            self._conn.execute('UPDATE derivatives SET accessed_at = ? WHERE content_hash = ? AND name = ?',
+                               (time.time(), content_hash, name))
+            self._conn.commit()
+        return data
+
+    def put_many(self, content_hash, items):
+        """
+        Сохраняет несколько копий одного файла.
+
+        Args:
+            content_hash (str): SHA-256 исходного файла
+            items (dict): {имя копии: байты}
+        """
+        os.makedirs(os.path.dirname(self.path(content_hash, '')), exist_ok=True)
+        for name, data in items.items():
+            # Запись через временный файл: читатель не увидит недописанную копию
+            path = self.path(content_hash, name)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        now = time.time()
+        with self._lock:
+            for name, data in items.items():
+                row = self._conn.execute('SELECT size FROM derivatives WHERE content_hash = ? AND name = ?',
+                                         (content_hash, name)).fetchone()
+                self.total_bytes += len(data) - (row[0] if row else 0)
+                self._conn.execute('''
+                    INSERT OR REPLACE INTO derivatives (content_hash, name, size, accessed_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (content_hash, name, len(data), now))
+            self._conn.commit()
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def put(self, content_hash, name, data):
+        """Сохраняет одну копию."""
+        self.put_many(content_hash, {name: data})
+
+    def _evict(self):
+        """Удаляет давно не использованные копии, пока кэш не уменьшится до EVICT_RATIO предела."""
+        target = self.max_bytes * EVICT_RATIO
+        # Размер пересчитывается: в кэш могли писать другие процессы
+        self.total_bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM derivatives').fetchone()[0]
+        while self.total_bytes > target:
+            rows = self._conn.execute(
+                'SELECT content_hash, name, size FROM derivatives ORDER BY accessed_at LIMIT 100').fetchall()
+            if not rows:
+                break
+            for content_hash, name, size in rows:
+                try:
+                    os.remove(self.path(content_hash, name))
+                except FileNotFoundError:
+                    pass
+                self._conn.execute('DELETE FROM derivatives WHERE content_hash = ? AND name = ?',
+                                   (content_hash, name))
+                self.total_bytes -= size
+                if self.total_bytes <= target:
+                    break
+            self._conn.commit()
+
+    def thumbnail(self, content_hash, size_name, file_path=None):
+        """
+        Возвращает миниатюру; если ее нет в кэше и указан исходный файл,
+        строит все миниатюры за одно декодирование (для JPEG — в draft-режиме).
+        """
+        name = thumbnail_name(size_name)
+        data = self.get(content_hash, name)
+        if data is not None or file_path is None:
+            return data
+        with Image.open(file_path) as image:
+            largest = max(THUMBNAIL_SIZES.values())
+            if image.format == 'JPEG':
+                image.draft('RGB', (largest, largest))
+            image.thumbnail((largest, largest), Image.Resampling.LANCZOS)
+            thumbnails = render_thumbnails(image)
+        self.put_many(content_hash, thumbnails)
+        return thumbnails[name]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,358 @@
+import requests
+import base64
+import sys
+import argparse
+from PIL import Image
+import io
+import json
+from datetime import datetime
+import logging
+import os
+import threading
+from .image_hashes import compute_hashes
+from .extract_exif import read_header_exif, exif_to_dict, exif_fields_from_image
+from .ollama_client import OllamaClient
+from .derivative_cache import payload_name, render_thumbnails
+from . import metrics
+
+# Каталог для логов и JSON с описаниями
+LOGS_DIR = 'logs'
+
+def setup_logging(logs_dir: str = LOGS_DIR):
+    """
+    Настраивает логирование в файл и на консоль.
+    
+    Вызывается из main, а не при импорте: импорт модуля не должен
+    создавать каталоги и менять настройки логирования вызывающей программы.
+    """
+    # Создаем каталог для логов, если его нет
+    os.makedirs(logs_dir, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(os.path.join(logs_dir, 'image_descriptions.log')),
+            logging.StreamHandler()
+        ]
+    )
+
+def _target_size(width: int, height: int, max_size: int) -> tuple:
+    """Размер с сохранением пропорций, большая сторона не более max_size."""
+    # Определяем, какая сторона больше
+    if width > height:
+        new_width = min(width, max_size)
+        new_height = int(height * (new_width / width))
+    else:
+        new_height = min(height, max_size)
+        new_width = int(width * (new_height / height))
+    return new_width, new_height
+
+def _resize_opened(img: Image.Image, max_size: int) -> Image.Image:
+    """
+    Уменьшает уже открытое, но еще не декодированное изображение.
+    
+    Для JPEG включается draft-режим: декодер масштабирует изображение в 2, 4 или 8 раз
+    прямо в DCT-области, так что полноразмерный растр не создается. Затем LANCZOS
+    доводит размер до точного значения.
+    """
+    # Получаем текущие размеры
+    width, height = img.size
+    new_width, new_height = _target_size(width, height, max_size)
+    
+    if img.format == 'JPEG':
+        img.draft('RGB', (new_width, new_height))
+    
+    # Изменяем размер
+    resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    logging.info(f"Изображение изменено с {width}x{height} на {new_width}x{new_height}")
+    return resized_img
+
+def resize_image(image_path: str, max_size: int = 1600) -> Image.Image:
+    """
+    Изменяет размер изображения, сохраняя пропорции.
+    Большая сторона будет не более max_size пикселей.
+    
+    Args:
+        image_path (str): Путь к файлу изображения
+        max_size (int): Максимальный размер большей стороны в пикселях
+        
+    Returns:
+        Image.Image: Изображение с измененным размером
+    """
+    try:
+        with Image.open(image_path) as img:
+            return _resize_opened(img, max_size)
+            
+    except Exception as e:
+        logging.error(f"Ошибка при изменении размера изображения {image_path}: {str(e)}")
+        raise
+
+def encode_image_to_base64(image_path: str, max_size: int = 1600, cache=None, content_hash: str = None) -> str:
+    """
+    Кодирует изображение в base64.
+    
+    Args:
+        image_path (str): Путь к файлу изображения
+        max_size (int): Максимальный размер большей стороны в пикселях
+        cache (DerivativeCache): Кэш уменьшенных копий; при попадании файл не декодируется
+        content_hash (str): SHA-256 файла — ключ в кэше
+        
+    Returns:
+        str: base64-encoded строка изображения
+    """
+    try:
+        if cache is not None and content_hash is not None:
+            payload = cache.get(content_hash, payload_name(max_size))
+            if payload is None:
+                payload = encode_resized_jpeg(resize_image(image_path, max_size))
+                cache.put(content_hash, payload_name(max_size), payload)
+            return base64.b64encode(payload).decode('utf-8')
+        # Изменяем размер изображения перед кодированием
+        resized_img = resize_image(image_path, max_size)
+        return encode_resized_image(resized_img)
+    except Exception as e:
+        logging.error(f"Ошибка при кодировании изображения {image_path}: {str(e)}")
+        raise
+
+# Буфер для кодирования переиспользуется между вызовами в пределах потока
+_buffers = threading.local()
+
+def _encode_to_buffer(resized_img: Image.Image) -> io.BytesIO:
+    """Кодирует уменьшенное изображение в JPEG в буфер потока."""
+    if resized_img.mode not in ('RGB', 'L'):
+        resized_img = resized_img.convert('RGB')
+    
+    # Сохраняем в буфер потока
+    buffer = getattr(_buffers, 'buffer', None)
+    if buffer is None:
+        buffer = _buffers.buffer = io.BytesIO()
+    buffer.seek(0)
+    buffer.truncate()
+    resized_img.save(buffer, format='JPEG')
+    return buffer
+
+def encode_resized_jpeg(resized_img: Image.Image) -> bytes:
+    """Кодирует уже уменьшенное изображение в JPEG (байты для кэша производных)."""
+    return _encode_to_buffer(resized_img).getvalue()
+
+def encode_resized_image(resized_img: Image.Image) -> str:
+    """
+    Кодирует уже уменьшенное изображение в JPEG и base64.
+    
+    Args:
+        resized_img (Image.Image): Изображение после resize_image
+        
+    Returns:
+        str: base64-encoded строка изображения
+    """
+    with _encode_to_buffer(resized_img).getbuffer() as view:
+        return base64.b64encode(view).decode('utf-8')
+
+def decode_image(image_path: str, max_size: int = 1600, cache=None, content_hash: str = None) -> dict:
+    """
+    Единый этап декодирования файла: изображение открывается один раз.
+    
+    Из одного открытия читаются метаданные и EXIF (разбирается один раз),
+    затем изображение декодируется в уменьшенном виде (draft-режим для JPEG),
+    по нему вычисляются перцептивные хеши и JPEG для Ollama.
+    
+    С кэшем производных (cache и content_hash) уменьшенная копия и миниатюры
+    сохраняются за тот же проход. Если копия уже есть в кэше, читается только
+    заголовок исходного файла, а хеши считаются по копии.
+    
+    Args:
+        image_path (str): Путь к файлу изображения
+        max_size (int): Максимальный размер большей стороны в пикселях
+        cache (DerivativeCache): Кэш уменьшенных копий и миниатюр
+        content_hash (str): SHA-256 файла — ключ в кэше
+        
+    Returns:
+        dict: image_info, exif_data, fields (типизированные EXIF-поля и хеши), base64_image
+    """
+    use_cache = cache is not None and content_hash is not None
+    payload = cache.get(content_hash, payload_name(max_size)) if use_cache else None
+    if use_cache:
+        metrics.inc('cache_hits' if payload is not None else 'cache_misses')
+    if metrics.is_enabled():
+        metrics.inc('bytes_read', os.path.getsize(image_path))
+    try:
+        with metrics.timer('open'):
+            img = Image.open(image_path)
+        with img:
+            image_info = {
+                "format": img.format,
+                "size": img.size,
+                "mode": img.mode
+            }
+            with metrics.timer('exif'):
+                exif = read_header_exif(img)
+                exif_data = exif_to_dict(exif)
+                fields = exif_fields_from_image(img, exif)
+            if payload is None:
+                with metrics.timer('decode_resize'):
+                    resized_img = _resize_opened(img, max_size)
+        if payload is not None:
+            # Полноразмерное изображение не декодируется
+            with metrics.timer('decode_resize'):
+                resized_img = Image.open(io.BytesIO(payload))
+                resized_img.load()
+    except Exception as e:
+        logging.error(f"Ошибка при открытии изображения {image_path}: {str(e)}")
+        raise
+    
+    try:
+        with metrics.timer('phash'):
+            hashes = compute_hashes(resized_img)
+        image_info.update(hashes)
+        fields.update(hashes)
+        if payload is None:
+            with metrics.timer('jpeg_encode'):
+                payload = encode_resized_jpeg(resized_img)
+            if use_cache:
+                with metrics.timer('cache_write'):
+                    cache.put_many(content_hash, {payload_name(max_size): payload, **render_thumbnails(resized_img)})
+        with metrics.timer('base64'):
+            base64_image = base64.b64encode(payload).decode('utf-8')
+    except Exception as e:
+        logging.error(f"Ошибка при кодировании изображения {image_path}: {str(e)}")
+        raise
+    
+    return {
+        "image_info": image_info,
+        "exif_data": exif_data,
+        "fields": fields,
+        "base64_image": base64_image,
+    }
+
+# Параметры Ollama API
+OLLAMA_URL = "http://localhost:11434"
+OLLAMA_MODEL = "llava"
+
+PROMPT = """Опиши подробно изображение, структурируя описание по следующим аспектам:
+    1. Основные объекты и их расположение
+    2. Цветовая гамма и освещение
+    3. Композиция и перспектива
+    4. Общее настроение и атмосфера
+    5. Технические особенности (если заметны)
+    
+    Будь конкретным и информативным, это описание будет использоваться для поиска изображения."""
+
+# Клиент по умолчанию создается при первом обращении
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def get_default_client() -> OllamaClient:
+    """Возвращает общий клиент Ollama с настройками по умолчанию."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = OllamaClient([OLLAMA_URL])
+        return _default_client
+
+def prepare_image(image_path: str, max_size: int = 1600) -> tuple:
+    """
+    Подготавливает изображение к отправке в Ollama: читает метаданные, кодирует в base64
+    и вычисляет перцептивные хеши (pHash, dHash) по уже уменьшенному изображению.
+    
+    Args:
+        image_path (str): Путь к файлу изображения
+        max_size (int): Максимальный размер большей стороны в пикселях
+        
+    Returns:
+        tuple: (image_info, base64_image)
+    """
+    decoded = decode_image(image_path, max_size)
+    return decoded["image_info"], decoded["base64_image"]
+
+def describe_prepared(image_path: str, image_info: dict, base64_image: str,
+                      max_size: int = 1600, client: OllamaClient = None) -> dict:
+    """
+    Получает описание уже подготовленного изображения через Ollama API.
+    
+    Args:
+        image_path (str): Путь к файлу изображения
+        image_info (dict): Метаданные изображения из prepare_image
+        base64_image (str): base64-encoded строка изображения
+        max_size (int): Максимальный размер большей стороны в пикселях
+        client (OllamaClient): Клиент Ollama (пул соединений, повторы, лимит запросов)
+        
+    Returns:
+        dict: Словарь с описанием изображения и метаданными
+    """
+    client = client or get_default_client()
+    
+    try:
+        description = client.generate(OLLAMA_MODEL, PROMPT, [base64_image])
+        
+        result = {
+            "timestamp": datetime.now().isoformat(),
+            "image_path": image_path,
+            "image_info": image_info,
+            "description": description,
+            "model": OLLAMA_MODEL,
+            "max_size": max_size
+        }
+        
+        # Сохраняем результат в JSON файл в каталоге logs
+        image_name = os.path.basename(image_path)
+        output_file = os.path.join(LOGS_DIR, f"{os.path.splitext(image_name)[0]}_description.json")
+        os.makedirs(LOGS_DIR, exist_ok=True)
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        
+        logging.info(f"Описание успешно сохранено в {output_file}")
+        return result
+        
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Ошибка при запросе к Ollama API: {str(e)}")
+        raise
+    except KeyError:
+        logging.error("Ошибка: неожиданный формат ответа от Ollama API")
+        raise
+    except Exception as e:
+        logging.error(f"Неожиданная ошибка: {str(e)}")
+        raise
+
+def describe_image(image_path: str, max_size: int = 1600, client: OllamaClient = None) -> dict:
+    """
+    Получает описание изображения через Ollama API.
+    
+    Args:
+        image_path (str): Путь к файлу изображения
+        max_size (int): Максимальный размер большей стороны в пикселях
+        client (OllamaClient): Клиент Ollama (пул соединений, повторы, лимит запросов)
+        
+    Returns:
+        dict: Словарь с описанием изображения и метаданными
+    """
+    image_info, base64_image = prepare_image(image_path, max_size)
+    return describe_prepared(image_path, image_info, base64_image, max_size, client)
+
+def main():
+    parser = argparse.ArgumentParser(description='Генерация описания изображения с помощью Ollama.')
+    parser.add_argument('image_path', help='Путь к изображению')
+    parser.add_argument('--max-size', type=int, default=1600,
+                      help='Максимальный размер большей стороны изображения в пикселях (по умолчанию: 1600)')
+    args = parser.parse_args()
+    setup_logging()
+
+    try:
+        result = describe_image(args.image_path, args.max_size)
+        print("\nОписание изображения:")
+        print("-" * 80)
+        print(result["description"])
+        print("-" * 80)
+        print(f"\nМетаданные:")
+        print(f"Формат: {result['image_info']['format']}")
+        print(f"Размер: {result['image_info']['size']}")
+        print(f"Цветовой режим: {result['image_info']['mode']}")
+        print(f"Модель: {result['model']}")
+        print(f"Максимальный размер: {result['max_size']}px")
+        print(f"Время создания: {result['timestamp']}")
+        
+    except Exception as e:
+        logging.error(f"Ошибка при обработке изображения: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main() 
\ No newline at end of file
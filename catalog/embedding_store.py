@@ -0,0 +1,230 @@
+import hashlib
+import numpy as np
+from . import metrics
+
+# Константы
+MODEL_NAME = 'all-MiniLM-L6-v2'  # Модель для эмбеддингов описаний
+CHUNK_SIZE = 10000               # Описаний, читаемых из базы и записываемых в хранилище за раз
+ENCODE_BATCH_SIZE = 64           # Размер пачки model.encode
+STORE_DTYPES = {'float32': 'f4', 'float16': 'f2'}
+SAMPLE_ATTEMPTS = 8              # Порций случайных id при выборке для обучения, затем добор по порядку
+SAMPLE_BATCH = 500               # Идентификаторов в одном запросе IN (...)
+
+def content_hash(description):
+    """Хеш содержимого, по которому определяется, нужно ли пересчитывать эмбеддинг."""
+    data = f"{MODEL_NAME}\0{description or ''}".encode('utf-8')
+    return hashlib.sha1(data).hexdigest()
+
+def init_store_table(conn):
+    """
+    Создает хранилище эмбеддингов: вектор описания каждого изображения
+    (BLOB в float32 или float16) вместе с хешем описания, по которому он вычислен.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS embeddings (
+            image_id INTEGER PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            dtype TEXT NOT NULL,
+            vector BLOB NOT NULL
+        )
+    ''')
+    conn.commit()
+
+def range_condition(min_id=None, max_id=None, column='image_id'):
+    """Условие WHERE для диапазона идентификаторов (границы включительно, None — без границы)."""
+    conditions = []
+    params = []
+    if min_id is not None:
+        conditions.append(f'{column} >= ?')
+        params.append(min_id)
+    if max_id is not None:
+        conditions.append(f'{column} <= ?')
+        params.append(max_id)
+    return ' AND '.join(conditions) or '1', params
+
+def _to_vectors(rows):
+    """Собирает BLOB-векторы в матрицу float32."""
+    return np.vstack([np.frombuffer(blob, dtype=dtype) for dtype, blob in rows]).astype(np.float32)
+
+def encode_texts(texts, model, batch_size=ENCODE_BATCH_SIZE, pool=None):
+    """
+    Вычисляет эмбеддинги текстов. Если передан пул процессов
+    (model.start_multi_process_pool), тексты кодируются параллельно на нескольких CPU.
+    """
+    metrics.inc('texts_embedded', len(texts))
+    with metrics.timer('embed'):
+        if pool is not None:
+            return model.encode_multi_process(texts, pool, batch_size=batch_size)
+        return model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+
+def _store_chunk(conn, pending, model, batch_size, pool, dtype):
+    """Кодирует и сохраняет пачку описаний одной транзакцией."""
+    embeddings = encode_texts([desc or '' for _, desc, _ in pending], model, batch_size, pool)
+    embeddings = np.asarray(embeddings, dtype=STORE_DTYPES[dtype])
+    with conn:
+        conn.executemany('''
+            INSERT OR REPLACE INTO embeddings (image_id, content_hash, dtype, vector) VALUES (?, ?, ?, ?)
+        ''', [(image_id, h, STORE_DTYPES[dtype], vector.tobytes())
+              for (image_id, _, h), vector in zip(pending, embeddings)])
+
+def update_store(conn, model=None, chunk_size=CHUNK_SIZE, batch_size=ENCODE_BATCH_SIZE, processes=1,
+                 dtype='float32'):
+    """
+    Приводит хранилище эмбеддингов в соответствие с таблицей images.
+
+    Описания читаются порциями по chunk_size (каждая порция — отдельный запрос
+    с продолжением от последнего id), эмбеддинги вычисляются только для новых
+    и измененных описаний и записываются по мере вычисления. Векторы удаленных
+    изображений удаляются.
+
+    Args:
+        conn (sqlite3.Connection): Соединение с базой данных
+        model (SentenceTransformer): Модель; загружается, только если есть что кодировать
+        chunk_size (int): Описаний в одной порции чтения и записи
+        batch_size (int): Размер пачки model.encode
+        processes (int): Количество процессов кодирования (больше 1 — пул sentence-transformers)
+        dtype (str): Тип хранения векторов: float32 или float16
+
+    Returns:
+        tuple: (количество вычисленных эмбеддингов, количество удаленных)
+    """
+    init_store_table(conn)
+    with conn:
+        # Записи без описания (проход только по метаданным) в индекс не попадают
+        removed = conn.execute('''
+            DELETE FROM embeddings WHERE image_id NOT IN (
+                SELECT id FROM images WHERE description IS NOT NULL AND description != ''
+            )
+        ''').rowcount
+
+    pool = None
+    encoded = 0
+    last_id = -1
+    try:
+        while True:
+            chunk = conn.execute('''
+                SELECT i.id, i.description, e.content_hash
+                FROM images i LEFT JOIN embeddings e ON e.image_id = i.id
+                WHERE i.id > ?
+                ORDER BY i.id
+                LIMIT ?
+            ''', (last_id, chunk_size)).fetchall()
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+            pending = []
+            for image_id, desc, stored_hash in chunk:
+                if not desc:
+                    continue
+                h = content_hash(desc)
+                if h != stored_hash:
+                    pending.append((image_id, desc, h))
+            if not pending:
+                continue
+            if model is None:
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(MODEL_NAME)
+            if processes > 1 and pool is None:
+                pool = model.start_multi_process_pool(['cpu'] * processes)
+            _store_chunk(conn, pending, model, batch_size, pool, dtype)
+            encoded += len(pending)
+            print(f"  Вычислено эмбеддингов: {encoded}")
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
+    return encoded, removed
+
+def store_dimension(conn):
+    """Размерность векторов в хранилище или None, если оно пустое."""
+    row = conn.execute('SELECT dtype, vector FROM embeddings LIMIT 1').fetchone()
+    return None if row is None else len(np.frombuffer(row[1], dtype=row[0]))
+
+def count_embeddings(conn, min_id=None, max_id=None):
+    """Количество векторов в диапазоне идентификаторов."""
+    where, params = range_condition(min_id, max_id)
+    return conn.execute(f'SELECT COUNT(*) FROM embeddings WHERE {where}', params).fetchone()[0]
+
+def iter_embeddings(conn, chunk_size=CHUNK_SIZE, min_id=None, max_id=None):
+    """
+    Читает векторы из хранилища порциями в порядке id.
+
+    Yields:
+        tuple: (ids, хеши описаний, матрица float32 векторов)
+    """
+    where, params = range_condition(min_id, max_id)
+    last_id = -1
+    while True:
+        rows = conn.execute(f'''
+            SELECT image_id, content_hash, dtype, vector FROM embeddings
+            WHERE {where} AND image_id > ?
+            ORDER BY image_id
+            LIMIT ?
+        ''', params + [last_id, chunk_size]).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        ids = np.asarray([row[0] for row in rows], dtype=np.int64)
+        yield ids, [row[1] for row in rows], _to_vectors([row[2:] for row in rows])
+
+def _fetch_vectors(conn, ids):
+    """Строки хранилища по списку id (поиск по первичному ключу): {id: (dtype, vector)}."""
+    rows = {}
+    for start in range(0, len(ids), SAMPLE_BATCH):
+        batch = ids[start:start + SAMPLE_BATCH]
+        for image_id, dtype, vector in conn.execute(
+                f'SELECT image_id, dtype, vector FROM embeddings WHERE image_id IN ({",".join("?" * len(batch))})',
+                batch):
+            rows[image_id] = (dtype, vector)
+    return rows
+
+def sample_embeddings(conn, sample_size, min_id=None, max_id=None, seed=None):
+    """
+    Случайная выборка векторов из хранилища (для обучения индекса).
+
+    Случайные id выбираются в пределах [MIN(id), MAX(id)] диапазона, и читаются только
+    эти строки, а не все векторы диапазона с сортировкой. Доля найденных id
+    (пропуски в нумерации) определяет размер следующей порции; если за SAMPLE_ATTEMPTS
+    порций выборка не набрана (или векторов в диапазоне немногим больше выборки),
+    недостающие строки добираются по порядку id.
+
+    Returns:
+        np.ndarray: Матрица float32 или None, если в диапазоне нет векторов
+    """
+    where, params = range_condition(min_id, max_id)
+    low, high = conn.execute(f'SELECT MIN(image_id), MAX(image_id) FROM embeddings WHERE {where}',
+                             params).fetchone()
+    if low is None:
+        return None
+    span = high - low + 1
+    if span <= sample_size:
+        # Все id диапазона помещаются в выборку
+        return _to_vectors(conn.execute(f'SELECT dtype, vector FROM embeddings WHERE {where}', params).fetchall())
+    rng = np.random.default_rng(seed)
+    rows = {}
+    tried = 0
+    for _ in range(SAMPLE_ATTEMPTS):
+        need = sample_size - len(rows)
+        if need <= 0 or tried >= span:
+            break
+        # Размер порции с поправкой на плотность id, найденную в предыдущих порциях
+        density = len(rows) / tried if tried and rows else 0.5
+        if tried and density * span <= 2 * sample_size:
+            break  # Векторов в диапазоне немногим больше выборки: дешевле прочитать подряд
+        size = min(span, int(need / density * 1.2) + 1)
+        candidates = np.unique(rng.integers(low, high + 1, size=size))
+        tried += len(candidates)
+        rows.update(_fetch_vectors(conn, [int(i) for i in candidates if int(i) not in rows]))
+    need = sample_size - len(rows)
+    if need > 0:
+        # Редкие id или маленький диапазон: добираем строки подряд
+        for image_id, dtype, vector in conn.execute(
+                f'SELECT image_id, dtype, vector FROM embeddings WHERE {where} ORDER BY image_id', params):
+            if image_id not in rows:
+                rows[image_id] = (dtype, vector)
+                need -= 1
+                if need == 0:
+                    break
+    chosen = list(rows.values())
+    if len(chosen) > sample_size:
+        chosen = [chosen[i] for i in np.sort(rng.choice(len(chosen), sample_size, replace=False))]
+    return _to_vectors(chosen)
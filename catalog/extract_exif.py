@@ -0,0 +1,217 @@
+import json
+from datetime import datetime
+from typing import Dict, Any
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from PIL.ExifTags import TAGS
+
+# Типизированные EXIF-поля, хранящиеся в отдельных индексируемых столбцах
+EXIF_COLUMNS = {
+    'taken_at': 'TEXT',        # Время съемки в формате ISO 8601
+    'camera_make': 'TEXT',
+    'camera_model': 'TEXT',
+    'lens_model': 'TEXT',
+    'gps_lat': 'REAL',
+    'gps_lon': 'REAL',
+    'width': 'INTEGER',
+    'height': 'INTEGER',
+    'format': 'TEXT',
+}
+
+# Идентификаторы EXIF-тегов и вложенных IFD
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+TAG_MAKE = 0x010F
+TAG_MODEL = 0x0110
+TAG_DATETIME = 0x0132
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_LENS_MODEL = 0xA434
+
+# Параметры параллельного чтения метаданных
+DEFAULT_PROCESSES = 4      # Процессы чтения заголовков
+EXIF_CHUNK_SIZE = 64       # Файлов, передаваемых процессу за раз
+
+def read_header_exif(image) -> Image.Exif:
+    """
+    Читает EXIF открытого изображения только из заголовка файла.
+    
+    Image.open разбирает лишь заголовок: для JPEG сегмент APP1 уже прочитан
+    в image.info, для TIFF и RAW теги взяты из IFD. Пиксельные данные не
+    декодируются (Image.getexif для PNG без eXIf до данных загрузил бы весь файл).
+    """
+    data = image.info.get('exif')
+    if data is None and image.format != 'PNG':
+        return image.getexif()
+    exif = Image.Exif()
+    if data:
+        exif.load(data)
+    return exif
+
+def exif_to_dict(exif) -> Dict[str, str]:
+    """
+    Преобразует EXIF, прочитанный Pillow (Image.getexif()), в словарь {тег: строка}.
+    
+    Теги основного IFD и Exif IFD объединяются, GPS-данные сохраняются как вложенный словарь.
+    """
+    exif_data = {}
+    if not exif:
+        return exif_data
+    for tag_id, data in {**exif, **exif.get_ifd(EXIF_IFD)}.items():
+        tag = TAGS.get(tag_id, tag_id)
+        if tag_id == GPS_IFD:
+            data = dict(exif.get_ifd(GPS_IFD))
+        if isinstance(data, bytes):
+            data = data.decode(errors='replace')
+        exif_data[tag] = str(data)
+    return exif_data
+
+def _exif_text(value):
+    """Нормализует текстовое значение EXIF."""
+    if isinstance(value, bytes):
+        value = value.decode(errors='replace')
+    if value is None:
+        return None
+    value = str(value).strip('\x00 ')
+    return value or None
+
+def _exif_datetime(value):
+    """Преобразует дату EXIF ('2021:05:01 12:00:00') в ISO 8601."""
+    value = _exif_text(value)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value[:19], '%Y:%m:%d %H:%M:%S').isoformat()
+    except ValueError:
+        return None
+
+def _gps_coordinate(value, ref):
+    """Преобразует координату EXIF (градусы, минуты, секунды) в десятичные градусы."""
+    try:
+        degrees, minutes, seconds = (float(part) for part in value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    coordinate = degrees + minutes / 60 + seconds / 3600
+    if _exif_text(ref) in ('S', 'W'):
+        coordinate = -coordinate
+    return coordinate
+
+def exif_fields_from_image(image, exif=None) -> Dict[str, Any]:
+    """
+    Извлекает типизированные EXIF-поля из уже открытого изображения.
+    
+    Args:
+        image (PIL.Image.Image): Открытое изображение
+        exif (PIL.Image.Exif): Уже прочитанный EXIF, чтобы не разбирать его повторно
+        
+    Returns:
+        Dict[str, Any]: Значения для столбцов EXIF_COLUMNS
+    """
+    fields = dict.fromkeys(EXIF_COLUMNS)
+    fields['width'], fields['height'] = image.size
+    fields['format'] = image.format
+    
+    if exif is None:
+        exif = read_header_exif(image)
+    if not exif:
+        return fields
+    exif_ifd = exif.get_ifd(EXIF_IFD)
+    gps_ifd = exif.get_ifd(GPS_IFD)
+    
+    fields['camera_make'] = _exif_text(exif.get(TAG_MAKE))
+    fields['camera_model'] = _exif_text(exif.get(TAG_MODEL))
+    fields['lens_model'] = _exif_text(exif_ifd.get(TAG_LENS_MODEL))
+    fields['taken_at'] = _exif_datetime(exif_ifd.get(TAG_DATETIME_ORIGINAL) or exif.get(TAG_DATETIME))
+    if gps_ifd:
+        fields['gps_lat'] = _gps_coordinate(gps_ifd.get(2), gps_ifd.get(1))
+        fields['gps_lon'] = _gps_coordinate(gps_ifd.get(4), gps_ifd.get(3))
+    return fields
+
+def read_metadata(image_path: str) -> Dict[str, Any]:
+    """
+    Читает метаданные изображения из заголовка файла за одно открытие.
+    
+    Args:
+        image_path (str): Путь к файлу изображения
+        
+    Returns:
+        Dict[str, Any]: exif_data (все теги строками) и fields (значения для EXIF_COLUMNS)
+    """
+    with Image.open(image_path) as image:
+        exif = read_header_exif(image)
+        return {
+            "exif_data": exif_to_dict(exif),
+            "fields": exif_fields_from_image(image, exif),
+        }
+
+def _read_metadata_safe(image_path):
+    """Обертка для процессов пула: ошибки возвращаются, а не выбрасываются."""
+    try:
+        return image_path, read_metadata(image_path), None
+    except Exception as e:
+        return image_path, None, str(e)
+
+def read_metadata_many(image_paths, processes=DEFAULT_PROCESSES, chunk_size=EXIF_CHUNK_SIZE):
+    """
+    Читает метаданные множества файлов в пуле процессов.
+    
+    Пути читаются из итератора порциями, поэтому список файлов каталога
+    не загружается в память целиком, а результаты возвращаются по мере готовности.
+    
+    Yields:
+        tuple: (путь, метаданные или None, текст ошибки или None) в порядке путей
+    """
+    if processes <= 1:
+        for image_path in image_paths:
+            yield _read_metadata_safe(image_path)
+        return
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        portion = []
+        for image_path in image_paths:
+            portion.append(image_path)
+            if len(portion) >= chunk_size * processes:
+                yield from executor.map(_read_metadata_safe, portion, chunksize=chunk_size)
+                portion = []
+        if portion:
+            yield from executor.map(_read_metadata_safe, portion, chunksize=chunk_size)
+
+def extract_exif_data(image_path: str) -> Dict[str, Any]:
+    """
+    Извлекает EXIF данные из изображения.
+    
+    Args:
+        image_path (str): Путь к файлу изображения
+        
+    Returns:
+        Dict[str, Any]: Словарь с EXIF данными
+    """
+    try:
+        exif_data = read_metadata(image_path)["exif_data"]
+    except Exception as e:
+        return {"error": f"Ошибка при обработке файла: {str(e)}"}
+    if not exif_data:
+        return {"error": "Изображение не содержит EXIF данных"}
+    return exif_data
+
+def main():
+    if len(sys.argv) < 2:
+        print("Использование: python -m catalog exif <путь_к_изображению> [<путь> ...]")
+        sys.exit(1)
+        
+    image_paths = sys.argv[1:]
+    if len(image_paths) == 1:
+        # Выводим данные в формате JSON с отступами
+        print(json.dumps(extract_exif_data(image_paths[0]), indent=2, ensure_ascii=False))
+        return
+    
+    # Для нескольких файлов — по одной строке JSON на файл, заголовки читаются параллельно
+    for image_path, metadata, error in read_metadata_many(image_paths):
+        result = {"file_path": image_path}
+        if error is not None:
+            result["error"] = error
+        else:
+            result.update(metadata)
+        print(json.dumps(result, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main() 
\ No newline at end of file
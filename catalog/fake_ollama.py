@@ -0,0 +1,92 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Параметры по умолчанию
+HOST = '127.0.0.1'
+PORT = 11435
+LATENCY = 1.0       # Средняя задержка ответа, секунды
+JITTER = 0.2        # Разброс задержки, доля от средней
+ERROR_RATE = 0.0    # Доля ответов с ошибкой 500
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Обработчик, имитирующий /api/generate сервера Ollama."""
+
+    def do_POST(self):
+        if self.path != '/api/generate':
+            self.send_error(404)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        config = self.server.config
+
+        delay = config['latency'] * random.uniform(1 - config['jitter'], 1 + config['jitter'])
+        time.sleep(max(0.0, delay))
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.images += len(payload.get('images', []))
+
+        if random.random() < config['error_rate']:
+            self.send_error(500, 'fake error')
+            return
+
+        text = f"Тестовое описание изображения ({len(payload.get('images', []))} шт.)"
+        body = json.dumps({
+            "model": payload.get("model"),
+            "response": text,
+            "done": True,
+            # Счетчики токенов, как у настоящей Ollama (грубо: по словам)
+            "prompt_eval_count": len(payload.get("prompt", "").split()),
+            "eval_count": len(text.split()),
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Не засоряем вывод логом каждого запроса
+
+def start_fake_ollama(host=HOST, port=0, latency=LATENCY, jitter=JITTER, error_rate=ERROR_RATE):
+    """
+    Запускает фейковый сервер Ollama в фоновом потоке.
+
+    Returns:
+        tuple: (server, url); сервер останавливается вызовом server.shutdown()
+    """
+    server = ThreadingHTTPServer((host, port), FakeOllamaHandler)
+    server.daemon_threads = True
+    server.config = {"latency": latency, "jitter": jitter, "error_rate": error_rate}
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.images = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description='Фейковый сервер Ollama для тестов и бенчмарков.')
+    parser.add_argument('--host', default=HOST, help=f'Адрес (по умолчанию: {HOST})')
+    parser.add_argument('--port', type=int, default=PORT, help=f'Порт (по умолчанию: {PORT})')
+    parser.add_argument('--latency', type=float, default=LATENCY,
+                        help=f'Средняя задержка ответа в секундах (по умолчанию: {LATENCY})')
+    parser.add_argument('--jitter', type=float, default=JITTER,
+                        help=f'Разброс задержки, доля от средней (по умолчанию: {JITTER})')
+    parser.add_argument('--error-rate', type=float, default=ERROR_RATE,
+                        help=f'Доля ответов с ошибкой 500 (по умолчанию: {ERROR_RATE})')
+    args = parser.parse_args()
+
+    server, url = start_fake_ollama(args.host, args.port, args.latency, args.jitter, args.error_rate)
+    print(f"Фейковый Ollama запущен: {url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import os
+import hashlib
+
+# Размер блока при потоковом хешировании файла
+HASH_CHUNK_SIZE = 1 << 20
+
+# Путей в одном запросе при загрузке сигнатур
+LOOKUP_CHUNK_SIZE = 500
+
+# Действия над файлом по результатам проверки
+ACTION_NEW = 'new'              # Новый файл: нужно описание
+ACTION_MODIFIED = 'modified'    # Файл изменился: нужно новое описание
+ACTION_MOVED = 'moved'          # Файл перемещен: переносим запись на новый путь
+ACTION_DUPLICATE = 'duplicate'  # Побайтовая копия уже описанного файла
+ACTION_TOUCH = 'touch'          # Содержимое не изменилось, обновляем только stat
+
+def file_stat(file_path):
+    """Быстрая сигнатура файла: (размер, mtime в наносекундах, inode)."""
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+def hash_file(file_path, chunk_size=HASH_CHUNK_SIZE):
+    """Потоковый SHA-256 содержимого файла."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_known_files(c, file_path=None):
+    """
+    Загружает сигнатуры проиндексированных файлов: {file_path: (id, size, mtime_ns, inode, hash)}.
+    Если указан file_path, загружается только его сигнатура.
+    """
+    query = 'SELECT file_path, id, file_size, file_mtime_ns, file_inode, content_hash FROM images'
+    if file_path is None:
+        c.execute(query)
+    else:
+        c.execute(query + ' WHERE file_path = ?', (file_path,))
+    return {row[0]: row[1:] for row in c.fetchall()}
+
+def load_known_paths(c, file_paths, chunk_size=LOOKUP_CHUNK_SIZE):
+    """
+    Загружает сигнатуры только указанных файлов (например, одного каталога),
+    не читая весь каталог изображений в память.
+    """
+    known = {}
+    query = 'SELECT file_path, id, file_size, file_mtime_ns, file_inode, content_hash FROM images'
+    for start in range(0, len(file_paths), chunk_size):
+        chunk = file_paths[start:start + chunk_size]
+        c.execute(f"{query} WHERE file_path IN ({', '.join('?' * len(chunk))})", chunk)
+        known.update((row[0], row[1:]) for row in c.fetchall())
+    return known
+
+def find_by_hash(c, content_hash):
+    """Находит записи с тем же содержимым: список (id, file_path)."""
+    c.execute('SELECT id, file_path FROM images WHERE content_hash = ? ORDER BY id', (content_hash,))
+    return c.fetchall()
+
+def plan_file(c, file_path, known, stat=None):
+    """
+    Определяет, что нужно сделать с файлом.
+
+    Сначала сравнивается (размер, mtime, inode); хеш содержимого считается
+    только если сигнатура изменилась или файл еще не встречался.
+    Сигнатуру, уже полученную при сканировании каталога, можно передать в stat.
+
+    Returns:
+        dict: Запись с полями action, file_path, stat, content_hash и
+              image_id/source_id для действий над существующими строками,
+              или None, если файл не изменился
+    """
+    if stat is None:
+        stat = file_stat(file_path)
+    entry = known.get(file_path)
+    if entry is not None:
+        image_id, size, mtime_ns, inode, stored_hash = entry
+        if (size, mtime_ns, inode) == stat:
+            return None
+        content_hash = hash_file(file_path)
+        # Для записей, созданных до появления хешей, сохраняем существующее описание
+        action = ACTION_TOUCH if stored_hash in (None, content_hash) else ACTION_MODIFIED
+        return {"action": action, "file_path": file_path, "stat": stat,
+                "content_hash": content_hash, "image_id": image_id}
+
+    content_hash = hash_file(file_path)
+    for source_id, source_path in find_by_hash(c, content_hash):
+        if not os.path.exists(source_path):
+            # Старый путь больше не существует: файл перемещен или переименован
+            return {"action": ACTION_MOVED, "file_path": file_path, "stat": stat,
+                    "content_hash": content_hash, "image_id": source_id}
+        return {"action": ACTION_DUPLICATE, "file_path": file_path, "stat": stat,
+                "content_hash": content_hash, "source_id": source_id}
+    return {"action": ACTION_NEW, "file_path": file_path, "stat": stat, "content_hash": content_hash}
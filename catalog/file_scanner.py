@@ -0,0 +1,202 @@
+import os
+import json
+import hashlib
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Поддерживаемые форматы изображений (единый набор для сканирования и проверки файлов)
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tif', '.tiff', '.webp',
+                    '.raw', '.cr2', '.nef', '.arw', '.pef'}
+
+# Параметры сканирования
+SCAN_WORKERS = 8    # Каталоги, читаемые одновременно
+
+def is_image_file(filename):
+    """Проверяет, является ли файл изображением."""
+    return os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+
+def init_journal_table(conn):
+    """
+    Создает журнал просмотренных каталогов: mtime каталога на момент просмотра
+    и список его подкаталогов.
+
+    mtime каталога меняется при создании, удалении и переименовании файлов
+    в нем, поэтому каталог с прежним mtime можно не читать повторно. Изменение
+    файла на месте mtime каталога не меняет: известные файлы такого каталога
+    проверяются по stat.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS scan_journal (
+            dir_path TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            subdirs TEXT NOT NULL,
+            options TEXT NOT NULL
+        )
+    ''')
+    conn.commit()
+
+def _matches(path, name, patterns):
+    """Совпадает ли путь (относительно корня) или имя хотя бы с одним шаблоном."""
+    return any(fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+def _list_directory(root, path, include, exclude, journal_entry):
+    """
+    Читает каталог через os.scandir (выполняется в потоке пула).
+
+    Для каталога с прежним mtime возвращаются только известные файлы, stat которых
+    отличается от сохраненной в базе сигнатуры (изменены на месте).
+
+    Returns:
+        tuple: (путь, mtime_ns, список (путь к файлу, stat), имена подкаталогов,
+               каталог не изменился) или None, если каталог исчез
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if journal_entry is not None and journal_entry[0] == mtime_ns:
+        _, subdirs, known_files = journal_entry
+        changed = []
+        for file_path, signature in known_files.items():
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue  # Удаление файла меняет mtime каталога; остальные ошибки — при полном чтении
+            current = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+            if current != signature:
+                changed.append((file_path, current))
+        return path, mtime_ns, sorted(changed), subdirs, True
+
+    files = []
+    subdirs = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            relative = os.path.relpath(entry.path, root).replace(os.sep, '/')
+            if exclude and _matches(relative, entry.name, exclude):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+            elif entry.is_file() and is_image_file(entry.name):
+                if include and not _matches(relative, entry.name, include):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                # Та же сигнатура, что у file_changes.file_stat
+                files.append((entry.path, (stat.st_size, stat.st_mtime_ns, stat.st_ino)))
+    return path, mtime_ns, sorted(files), sorted(subdirs), False
+
+class DirectoryScanner:
+    """
+    Параллельный обход каталогов.
+
+    Каталоги читаются в пуле потоков через os.scandir (несколько каталогов
+    одновременно, что особенно заметно на сетевых дисках), найденные файлы
+    возвращаются по одному каталогу, не дожидаясь окончания обхода.
+
+    С журналом (conn) каталоги, mtime которых не изменился с прошлого просмотра,
+    не читаются: обход продолжается по сохраненному списку подкаталогов, а из
+    их файлов возвращаются только записанные в базе и измененные на месте.
+    Запись журнала о каталоге делается после того, как его файлы обработаны
+    вызывающим кодом, и фиксируется вместе с его транзакцией.
+    """
+
+    def __init__(self, roots, recursive=False, include=None, exclude=None, workers=SCAN_WORKERS,
+                 conn=None, full_scan=False):
+        """
+        Args:
+            roots (list): Корневые каталоги (или один путь)
+            recursive (bool): Обходить подкаталоги
+            include (list): Шаблоны glob для файлов; если заданы, берутся только совпавшие
+            exclude (list): Шаблоны glob для исключаемых файлов и каталогов
+            workers (int): Количество каталогов, читаемых одновременно
+            conn (sqlite3.Connection): Соединение для журнала каталогов; None — без журнала
+            full_scan (bool): Прочитать все каталоги, не доверяя журналу (журнал обновляется)
+        """
+        self.roots = [roots] if isinstance(roots, str) else list(roots)
+        self.recursive = recursive
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.workers = workers
+        self.conn = conn
+        self.full_scan = full_scan
+        # Журнал действителен только для тех же фильтров
+        options = json.dumps([self.recursive, self.include, self.exclude, sorted(IMAGE_EXTENSIONS)])
+        self.options = hashlib.sha1(options.encode('utf-8')).hexdigest()
+        self.skipped_dirs = 0
+        self.scanned_dirs = 0
+
+    def _journal_entry(self, path):
+        if self.conn is None or self.full_scan:
+            return None
+        row = self.conn.execute('SELECT mtime_ns, subdirs, options FROM scan_journal WHERE dir_path = ?',
+                                (path,)).fetchone()
+        if row is None or row[2] != self.options:
+            return None
+        # Сигнатуры файлов, записанных в базе непосредственно в этом каталоге:
+        # диапазон по уникальному индексу file_path, без файлов подкаталогов
+        prefix = os.path.join(path, '')
+        known_files = self.conn.execute('''
+            SELECT file_path, file_size, file_mtime_ns, file_inode FROM images
+            WHERE file_path > ? AND file_path < ? AND instr(substr(file_path, ?), ?) = 0
+        ''', (prefix, prefix[:-1] + chr(ord(os.sep) + 1), len(prefix) + 1, os.sep)).fetchall()
+        return row[0], json.loads(row[1]), {file_path: tuple(signature) for file_path, *signature in known_files}
+
+    def _record(self, path, mtime_ns, subdirs):
+        if self.conn is not None:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO scan_journal (dir_path, mtime_ns, subdirs, options)
+                VALUES (?, ?, ?, ?)
+            ''', (path, mtime_ns, json.dumps(subdirs), self.options))
+
+    def _forget(self, path):
+        if self.conn is not None:
+            self.conn.execute('DELETE FROM scan_journal WHERE dir_path = ?', (path,))
+
+    def __iter__(self):
+        """
+        Yields:
+            tuple: (каталог, список (путь к файлу, (размер, mtime_ns, inode)))
+                   для каждого прочитанного каталога
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {}
+
+            def submit(root, path):
+                future = executor.submit(_list_directory, root, path, self.include, self.exclude,
+                                         self._journal_entry(path))
+                pending[future] = (root, path)
+
+            for root in self.roots:
+                submit(root, root)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    root, path = pending.pop(future)
+                    try:
+                        listing = future.result()
+                    except OSError as e:
+                        print(f"  Ошибка при чтении каталога {path}: {str(e)}")
+                        continue
+                    if listing is None:
+                        self._forget(path)
+                        continue
+                    _, mtime_ns, files, subdirs, unchanged = listing
+                    if self.recursive:
+                        for name in subdirs:
+                            submit(root, os.path.join(path, name))
+                    if unchanged:
+                        self.skipped_dirs += 1
+                    else:
+                        self.scanned_dirs += 1
+                    if files:
+                        yield path, files
+                    # Генератор продолжается после обработки файлов каталога вызывающим кодом
+                    if not unchanged:
+                        self._record(path, mtime_ns, subdirs)
+
+    def files(self):
+        """Генератор (путь к файлу, stat) по всем прочитанным каталогам."""
+        for _, files in self:
+            yield from files
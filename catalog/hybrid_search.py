@@ -0,0 +1,159 @@
+import argparse
+from . import catalog_db
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from .search_images import DB_PATH, MODEL_NAME, load_index, load_model, encode_queries, get_image_info
+from .query_cache import EmbeddingCache, EMBEDDING_CACHE_PATH
+from .create_faiss_index import prepare_vectors
+
+# Константы
+RRF_K = 60             # Сглаживающая константа reciprocal rank fusion
+FTS_WEIGHT = 1.0       # Вес полнотекстового поиска
+VECTOR_WEIGHT = 1.0    # Вес семантического поиска
+DEPTH_FACTOR = 2       # Во сколько раз глубже страницы запрашивать кандидатов у каждого поиска
+
+def fts_query(query):
+    """
+    Преобразует текст запроса в безопасный запрос FTS5.
+
+    Каждое слово берется в кавычки, чтобы спецсимволы FTS5 не ломали разбор,
+    а слова объединяются через OR, чтобы BM25 ранжировал частичные совпадения.
+    """
+    terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+    return ' OR '.join(terms)
+
+def fts_search(query, limit, db_path=DB_PATH, conn=None):
+    """
+    Полнотекстовый поиск: идентификаторы изображений в порядке BM25.
+
+    Без conn открывает и закрывает свое соединение только для чтения.
+    """
+    match = fts_query(query)
+    if not match:
+        return []
+    own_conn = conn is None
+    if own_conn:
+        conn = catalog_db.connect(db_path, readonly=True)
+    try:
+        c = conn.cursor()
+        c.execute('''
+            SELECT rowid FROM images_fts
+            WHERE images_fts MATCH ?
+            ORDER BY bm25(images_fts)
+            LIMIT ?
+        ''', (match, limit))
+        return [row[0] for row in c.fetchall()]
+    finally:
+        if own_conn:
+            conn.close()
+
+def vector_search(query, index, model, limit, cache=None):
+    """Семантический поиск: идентификаторы изображений в порядке близости."""
+    query_embedding = prepare_vectors(encode_queries([query], model, cache), index.metric_type)
+    _, indices = index.search(query_embedding, limit)
+    return [int(i) for i in indices[0] if i >= 0]
+
+def reciprocal_rank_fusion(rankings, weights, k=RRF_K):
+    """
+    Объединяет несколько ранжированных списков методом reciprocal rank fusion.
+
+    Args:
+        rankings (list): Списки идентификаторов, каждый в порядке убывания релевантности
+        weights (list): Вес каждого списка
+        k (int): Сглаживающая константа
+
+    Returns:
+        list: Пары (id, score) в порядке убывания score
+    """
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, image_id in enumerate(ranking, start=1):
+            scores[image_id] = scores.get(image_id, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+def hybrid_search(query, index, model, limit=10, offset=0, fts_weight=FTS_WEIGHT,
+                  vector_weight=VECTOR_WEIGHT, cache=None, db_path=DB_PATH, conn=None):
+    """
+    Гибридный поиск: полнотекстовый и семантический поиск выполняются параллельно,
+    результаты объединяются reciprocal rank fusion.
+
+    Каждый поиск возвращает только DEPTH_FACTOR * (offset + limit) кандидатов,
+    поэтому глубина поиска растет вместе с номером страницы, а не задается с запасом.
+
+    Полнотекстовый поиск и чтение строк страницы используют одно соединение: conn
+    (например, из пула сервера; полнотекстовый поиск идет в другом потоке, поэтому
+    соединение должно быть открыто с check_same_thread=False) или свое, только для чтения.
+
+    Returns:
+        list: Словари с id, file_path, description, score и рангами в обоих поисках
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = catalog_db.connect(db_path, readonly=True, check_same_thread=False)
+    try:
+        depth = DEPTH_FACTOR * (offset + limit)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            fts_future = executor.submit(fts_search, query, depth, db_path, conn)
+            vector_future = executor.submit(vector_search, query, index, model, depth, cache)
+            fts_ids = fts_future.result()
+            vector_ids = vector_future.result()
+
+        fused = reciprocal_rank_fusion([fts_ids, vector_ids], [fts_weight, vector_weight])
+        page = fused[offset:offset + limit]
+        if not page:
+            return []
+
+        rows = {row[0]: row for row in get_image_info([image_id for image_id, _ in page], conn)}
+    finally:
+        if own_conn:
+            conn.close()
+
+    fts_ranks = {image_id: rank for rank, image_id in enumerate(fts_ids, start=1)}
+    vector_ranks = {image_id: rank for rank, image_id in enumerate(vector_ids, start=1)}
+    return [
+        {
+            "id": image_id,
+            "file_path": rows[image_id][1],
+            "description": rows[image_id][2],
+            "score": score,
+            "fts_rank": fts_ranks.get(image_id),
+            "vector_rank": vector_ranks.get(image_id),
+        }
+        for image_id, score in page if image_id in rows
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description='Гибридный поиск изображений: полнотекстовый + семантический.')
+    parser.add_argument('query', nargs='+', help='Текстовый запрос')
+    parser.add_argument('--limit', type=int, default=10, help='Количество результатов на странице (по умолчанию: 10)')
+    parser.add_argument('--offset', type=int, default=0, help='Смещение для пагинации (по умолчанию: 0)')
+    parser.add_argument('--fts-weight', type=float, default=FTS_WEIGHT,
+                        help=f'Вес полнотекстового поиска (по умолчанию: {FTS_WEIGHT})')
+    parser.add_argument('--vector-weight', type=float, default=VECTOR_WEIGHT,
+                        help=f'Вес семантического поиска (по умолчанию: {VECTOR_WEIGHT})')
+    args = parser.parse_args()
+
+    query = ' '.join(args.query)
+
+    try:
+        index = load_index()
+        model = load_model()
+        cache = EmbeddingCache(MODEL_NAME, path=EMBEDDING_CACHE_PATH)
+        results = hybrid_search(query, index, model, args.limit, args.offset,
+                                args.fts_weight, args.vector_weight, cache)
+        cache.save()
+    except Exception as e:
+        print(f"Ошибка: {str(e)}")
+        sys.exit(1)
+
+    print(f"\nРезультаты гибридного поиска для запроса: '{query}'")
+    print("-" * 80)
+    for result in results:
+        print(f"\nОценка: {result['score']:.4f} (FTS: {result['fts_rank'] or '-'}, вектор: {result['vector_rank'] or '-'})")
+        print(f"ID: {result['id']}")
+        print(f"Путь: {result['file_path']}")
+        print(f"Описание: {result['description']}")
+        print("-" * 80)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+import argparse
+import json
+import os
+import sqlite3
+from . import catalog_db
+import sys
+import numpy as np
+from PIL import Image
+
+# Константы
+DB_PATH = 'images.db'
+HASH_SIZE = 8                 # Хеши 8x8 = 64 бита
+PHASH_IMAGE_SIZE = 32         # Размер изображения для DCT в pHash
+NEAR_DUPLICATE_DISTANCE = 6   # Порог расстояния Хэмминга для почти-дубликатов
+HASH_INDEX_PATH = '{column}_index.faiss'  # Сохраненный бинарный индекс хешей столбца
+
+# Триггеры счетчика изменений хешей: сохраненный бинарный индекс проверяется
+# по одному числу, а не чтением всех хешей
+HASH_TRIGGERS = {
+    'images_hash_ai': '''
+        CREATE TRIGGER IF NOT EXISTS images_hash_ai AFTER INSERT ON images
+        WHEN new.phash IS NOT NULL OR new.dhash IS NOT NULL BEGIN
+            UPDATE hash_version SET version = version + 1;
+        END
+    ''',
+    'images_hash_ad': '''
+        CREATE TRIGGER IF NOT EXISTS images_hash_ad AFTER DELETE ON images
+        WHEN old.phash IS NOT NULL OR old.dhash IS NOT NULL BEGIN
+            UPDATE hash_version SET version = version + 1;
+        END
+    ''',
+    'images_hash_au': '''
+        CREATE TRIGGER IF NOT EXISTS images_hash_au AFTER UPDATE OF phash, dhash ON images
+        WHEN old.phash IS NOT new.phash OR old.dhash IS NOT new.dhash BEGIN
+            UPDATE hash_version SET version = version + 1;
+        END
+    ''',
+}
+
+def _dct_matrix(n):
+    """Матрица DCT-II размера n x n."""
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return matrix * np.sqrt(2 / n)
+
+_DCT = _dct_matrix(PHASH_IMAGE_SIZE)
+
+def _bits_to_int(bits):
+    """Упаковывает 64 бита в знаковое 64-битное целое (формат INTEGER в SQLite)."""
+    value = 0
+    for bit in bits.flatten():
+        value = (value << 1) | int(bit)
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def _int_to_bytes(value):
+    """Переводит хеш в 8 байт для бинарного индекса FAISS."""
+    return (value & ((1 << 64) - 1)).to_bytes(8, 'big')
+
+def dhash(image):
+    """Разностный хеш: сравнение соседних пикселей по горизонтали."""
+    gray = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+def phash(image):
+    """Перцептивный хеш: знаки низкочастотных коэффициентов DCT относительно медианы."""
+    gray = image.convert('L').resize((PHASH_IMAGE_SIZE, PHASH_IMAGE_SIZE), Image.Resampling.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.float64)
+    dct = _DCT @ pixels @ _DCT.T
+    low = dct[:HASH_SIZE, :HASH_SIZE]
+    median = np.median(low.flatten()[1:])  # Без постоянной составляющей
+    return _bits_to_int(low > median)
+
+def compute_hashes(image):
+    """Вычисляет pHash и dHash по уже открытому (уменьшенному) изображению."""
+    return {"phash": phash(image), "dhash": dhash(image)}
+
+def init_hash_version(conn):
+    """Создает счетчик изменений хешей и поддерживающие его триггеры."""
+    c = conn.cursor()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS hash_version (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            version INTEGER NOT NULL
+        )
+    ''')
+    # Случайное начальное значение: индекс, сохраненный для удаленной и созданной
+    # заново базы, не совпадет с ней по версии
+    c.execute('INSERT OR IGNORE INTO hash_version (id, version) VALUES (0, abs(random() >> 1))')
+    for sql in HASH_TRIGGERS.values():
+        c.execute(sql)
+    conn.commit()
+
+def hash_version(conn):
+    """Текущая версия хешей или None, если база создана до появления счетчика."""
+    try:
+        row = conn.execute('SELECT version FROM hash_version WHERE id = 0').fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+def hamming_distance(a, b):
+    """Расстояние Хэмминга между двумя 64-битными хешами."""
+    return bin((a ^ b) & ((1 << 64) - 1)).count('1')
+
+class PerceptualIndex:
+    """
+    Индекс перцептивных хешей на основе бинарного индекса FAISS
+    (поиск по расстоянию Хэмминга).
+    """
+
+    def __init__(self, column='phash'):
+        import faiss
+        self.column = column
+        self.index = faiss.IndexBinaryIDMap(faiss.IndexBinaryFlat(HASH_SIZE * HASH_SIZE))
+
+    @classmethod
+    def from_db(cls, db_path=DB_PATH, column='phash', conn=None):
+        """Строит индекс по хешам из базы данных."""
+        instance = cls(column)
+        own_conn = conn is None
+        if own_conn:
+            conn = catalog_db.connect(db_path, readonly=True)
+        try:
+            c = conn.cursor()
+            c.execute(f'SELECT id, {column} FROM images WHERE {column} IS NOT NULL')
+            rows = c.fetchall()
+        finally:
+            if own_conn:
+                conn.close()
+        if rows:
+            ids = np.array([row[0] for row in rows], dtype=np.int64)
+            codes = np.frombuffer(b''.join(_int_to_bytes(row[1]) for row in rows), dtype=np.uint8)
+            instance.index.add_with_ids(codes.reshape(len(rows), -1), ids)
+        return instance
+
+    @classmethod
+    def load(cls, db_path=DB_PATH, column='phash', index_path=None):
+        """
+        Загружает сохраненный индекс, если хеши в базе не менялись с момента
+        его сохранения, иначе строит его заново и сохраняет.
+        """
+        import faiss
+        index_path = index_path or HASH_INDEX_PATH.format(column=column)
+        conn = catalog_db.connect(db_path, readonly=True)
+        try:
+            # Версия читается до хешей: изменение между чтениями даст лишнюю пересборку, а не устаревший индекс
+            version = hash_version(conn)
+            if version is not None and _saved_version(index_path, column) == version:
+                instance = cls(column)
+                instance.index = faiss.read_index_binary(index_path)
+                return instance
+            instance = cls.from_db(column=column, conn=conn)
+        finally:
+            conn.close()
+        if version is not None:
+            instance.save(index_path, version)
+        return instance
+
+    def save(self, index_path, version):
+        """Атомарно сохраняет индекс и версию хешей, по которой он построен."""
+        import faiss
+        faiss.write_index_binary(self.index, f"{index_path}.tmp")
+        os.replace(f"{index_path}.tmp", index_path)
+        # Версия пишется после индекса: при сбое между записями индекс просто пересоберется
+        with open(f"{index_path}.json.tmp", 'w', encoding='utf-8') as f:
+            json.dump({"column": self.column, "version": version}, f)
+        os.replace(f"{index_path}.json.tmp", f"{index_path}.json")
+
+    def search(self, hash_value, k=10):
+        """k ближайших хешей: список (id, расстояние)."""
+        query = np.frombuffer(_int_to_bytes(hash_value), dtype=np.uint8).reshape(1, -1)
+        distances, ids = self.index.search(query, k)
+        return [(int(i), int(d)) for i, d in zip(ids[0], distances[0]) if i >= 0]
+
+    def within(self, hash_value, max_distance=NEAR_DUPLICATE_DISTANCE):
+        """Все хеши на расстоянии не больше max_distance: список (id, расстояние)."""
+        query = np.frombuffer(_int_to_bytes(hash_value), dtype=np.uint8).reshape(1, -1)
+        limits, distances, ids = self.index.range_search(query, max_distance + 1)
+        pairs = [(int(i), int(d)) for i, d in zip(ids[limits[0]:limits[1]], distances[limits[0]:limits[1]])]
+        return sorted(pairs, key=lambda pair: pair[1])
+
+def _saved_version(index_path, column):
+    """Версия хешей сохраненного индекса или None, если его нет."""
+    try:
+        with open(f"{index_path}.json", encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("column") != column or not os.path.exists(index_path):
+        return None
+    return meta.get("version")
+
+def hash_image_file(image_path, max_size=1600):
+    """Вычисляет хеши файла изображения (для запросов по изображению)."""
+    with Image.open(image_path) as image:
+        image.draft('RGB', (max_size, max_size))
+        return compute_hashes(image)
+
+def find_similar_images(image_path, k=10, max_distance=None, db_path=DB_PATH, column='phash'):
+    """
+    Находит изображения, похожие на заданный файл.
+
+    Returns:
+        list: Кортежи (id, file_path, расстояние Хэмминга)
+    """
+    hashes = hash_image_file(image_path)
+    index = PerceptualIndex.load(db_path, column)
+    if max_distance is None:
+        matches = index.search(hashes[column], k)
+    else:
+        matches = index.within(hashes[column], max_distance)[:k]
+    if not matches:
+        return []
+    conn = catalog_db.connect(db_path, readonly=True)
+    try:
+        c = conn.cursor()
+        ids = [image_id for image_id, _ in matches]
+        c.execute(f'SELECT id, file_path FROM images WHERE id IN ({",".join("?" * len(ids))})', ids)
+        paths = dict(c.fetchall())
+    finally:
+        conn.close()
+    return [(image_id, paths[image_id], distance) for image_id, distance in matches if image_id in paths]
+
+def collapse_near_duplicates(results, max_distance=NEAR_DUPLICATE_DISTANCE, conn=None, column='phash'):
+    """
+    Убирает из результатов поиска почти-дубликаты (серии снимков, копии),
+    оставляя первое по рангу изображение каждой группы.
+
+    Args:
+        results (list): Результаты поиска, словари с ключом "id", в порядке ранга
+        max_distance (int): Порог расстояния Хэмминга
+        conn (sqlite3.Connection): Соединение; без него открывается свое, только для чтения
+    """
+    if not results:
+        return results
+    own_conn = conn is None
+    if own_conn:
+        conn = catalog_db.connect(DB_PATH, readonly=True)
+    c = conn.cursor()
+    ids = [result["id"] for result in results]
+    c.execute(f'SELECT id, {column} FROM images WHERE id IN ({",".join("?" * len(ids))})', ids)
+    hashes = dict(c.fetchall())
+    if own_conn:
+        conn.close()
+
+    kept = []
+    kept_hashes = []
+    for result in results:
+        value = hashes.get(result["id"])
+        if value is not None and any(hamming_distance(value, other) <= max_distance for other in kept_hashes):
+            continue
+        kept.append(result)
+        if value is not None:
+            kept_hashes.append(value)
+    return kept
+
+def backfill_hashes(db_path=DB_PATH):
+    """Вычисляет хеши для ранее проиндексированных изображений."""
+    conn = catalog_db.connect(db_path)
+    c = conn.cursor()
+    c.execute('SELECT id, file_path FROM images WHERE phash IS NULL')
+    rows = c.fetchall()
+    updated = 0
+    for image_id, file_path in rows:
+        try:
+            hashes = hash_image_file(file_path)
+        except Exception as e:
+            print(f"  Ошибка при вычислении хеша {file_path}: {str(e)}")
+            continue
+        c.execute('UPDATE images SET phash = ?, dhash = ? WHERE id = ?',
+                  (hashes["phash"], hashes["dhash"], image_id))
+        updated += 1
+    conn.commit()
+    conn.close()
+    print(f"Хеши вычислены для {updated} изображений")
+
+def main():
+    parser = argparse.ArgumentParser(description='Поиск похожих изображений по перцептивному хешу.')
+    parser.add_argument('image_path', nargs='?', help='Путь к изображению-образцу')
+    parser.add_argument('-k', type=int, default=10, help='Количество результатов (по умолчанию: 10)')
+    parser.add_argument('--max-distance', type=int,
+                        help='Максимальное расстояние Хэмминга (например, 6 для почти-дубликатов)')
+    parser.add_argument('--hash', choices=['phash', 'dhash'], default='phash', help='Тип хеша (по умолчанию: phash)')
+    parser.add_argument('--backfill', action='store_true', help='Вычислить хеши для уже проиндексированных изображений')
+    args = parser.parse_args()
+
+    if args.backfill:
+        backfill_hashes()
+        return
+    if not args.image_path:
+        parser.error('не указан путь к изображению')
+
+    try:
+        results = find_similar_images(args.image_path, args.k, args.max_distance, column=args.hash)
+    except Exception as e:
+        print(f"Ошибка: {str(e)}")
+        sys.exit(1)
+
+    if not results:
+        print("Похожие изображения не найдены.")
+        return
+    print(f"\nИзображения, похожие на {args.image_path}:")
+    print("-" * 80)
+    for image_id, file_path, distance in results:
+        print(f"{distance:3d}  [{image_id}] {file_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from .cli import COMMANDS, PROG
+
+# Параметры измерения
+REPEATS = 5              # Запусков интерпретатора на команду; берется самый быстрый
+TOLERANCE = 0.5          # Допустимый рост времени импорта относительно базовой линии (50%)
+MIN_REGRESSION_MS = 20   # Меньший рост — шум запуска, а не регрессия
+TOP_PACKAGES = 5         # Самых тяжелых сторонних пакетов в отчете
+
+def parse_importtime(stderr, package=__package__):
+    """
+    Разбирает вывод python -X importtime.
+
+    Returns:
+        tuple: (время импорта модулей пакета в мс,
+                {сторонний пакет верхнего уровня: время его импорта в мс})
+    """
+    total_us = 0
+    packages = {}
+    nested = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line.split('|', 2)
+        cumulative = int(cumulative)
+        name = name[1:]  # Один пробел после разделителя, дальше — отступ по глубине вложенности
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        if depth > 0:
+            # Вложенные импорты выводятся раньше импортировавшего их модуля
+            nested.append((name, cumulative))
+            continue
+        if name.split('.')[0] == package:
+            # Учитываются только пакеты, загруженные модулями пакета, а не при запуске интерпретатора
+            total_us += cumulative
+            for nested_name, nested_us in nested:
+                if '.' not in nested_name and nested_name != package:
+                    packages[nested_name] = max(packages.get(nested_name, 0), nested_us)
+        nested = []
+    return total_us / 1000, {name: us / 1000 for name, us in packages.items()}
+
+def measure_module(module, repeats=REPEATS):
+    """
+    Измеряет время импорта модуля пакета в новом интерпретаторе.
+
+    Каждый запуск — отдельный процесс без уже загруженных модулей, как при
+    запуске команды из оболочки; из repeats запусков берется самый быстрый.
+
+    Returns:
+        dict: import_ms и packages — самые тяжелые сторонние пакеты, [имя, мс]
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+    best = None
+    for _ in range(repeats):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {__package__}.{module}'],
+                                capture_output=True, text=True, env=env)
+        if result.returncode != 0:
+            raise RuntimeError(f"Не удалось импортировать {module}:\n{result.stderr.strip().splitlines()[-1]}")
+        total_ms, packages = parse_importtime(result.stderr)
+        if best is None or total_ms < best[0]:
+            best = (total_ms, packages)
+    total_ms, packages = best
+    heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:TOP_PACKAGES]
+    return {
+        "module": module,
+        "import_ms": round(total_ms, 1),
+        "packages": [[name, round(ms, 1)] for name, ms in heaviest],
+    }
+
+def measure_commands(names=None, repeats=REPEATS):
+    """Время импорта модулей команд: {команда: результат measure_module}."""
+    return {name: measure_module(COMMANDS[name][0], repeats) for name in names or COMMANDS}
+
+def find_regressions(results, baseline, tolerance=TOLERANCE, min_regression_ms=MIN_REGRESSION_MS):
+    """
+    Сравнивает с базовой линией (сохраненным отчетом --output).
+
+    Returns:
+        list: (команда, было мс, стало мс) для команд, импорт которых вырос
+              больше чем на tolerance и больше чем на min_regression_ms
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name, {}).get("import_ms")
+        if before is None:
+            continue
+        after = result["import_ms"]
+        if after > before * (1 + tolerance) and after - before > min_regression_ms:
+            regressions.append((name, before, after))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Время импорта модулей команд: python -X importtime в отдельном процессе на каждый запуск.')
+    parser.add_argument('commands', nargs='*', metavar='command',
+                        help=f'Команды (по умолчанию все): {", ".join(COMMANDS)}')
+    parser.add_argument('--repeats', type=int, default=REPEATS,
+                        help=f'Запусков на команду, берется самый быстрый (по умолчанию: {REPEATS})')
+    parser.add_argument('--output', help='Сохранить результаты в JSON-файл')
+    parser.add_argument('--baseline', help='JSON-файл предыдущего замера; при регрессии код выхода 1')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help=f'Допустимый относительный рост при сравнении с --baseline (по умолчанию: {TOLERANCE})')
+    args = parser.parse_args()
+    unknown = [name for name in args.commands if name not in COMMANDS]
+    if unknown:
+        parser.error(f"неизвестные команды: {', '.join(unknown)}")
+
+    results = measure_commands(args.commands, args.repeats)
+    for name, result in results.items():
+        packages = ', '.join(f'{package} {ms:.0f}' for package, ms in result["packages"])
+        print(f"{PROG} {name:<12} {result['import_ms']:8.1f} мс   {packages}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"python": sys.version.split()[0], "commands": results}, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)["commands"]
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f"Регрессия: {name} {before:.1f} -> {after:.1f} мс", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("Регрессий времени импорта нет")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,824 @@
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import queue
+import threading
+from .extract_exif import EXIF_COLUMNS, read_metadata_many
+from .describe_image import decode_image, describe_prepared, setup_logging, OLLAMA_URL
+from .ollama_client import OllamaClient, READ_TIMEOUT, MAX_RETRIES
+from .file_changes import (plan_file, load_known_files, load_known_paths, file_stat, hash_file, ACTION_NEW, ACTION_MODIFIED,
+                           ACTION_MOVED, ACTION_DUPLICATE, ACTION_TOUCH)
+from . import job_queue
+from . import catalog_db
+from .catalog_db import BatchWriter, COMMIT_INTERVAL
+from .derivative_cache import DerivativeCache, CACHE_DIR, MAX_CACHE_BYTES
+from .file_scanner import DirectoryScanner, IMAGE_EXTENSIONS, SCAN_WORKERS, is_image_file, init_journal_table
+from .image_hashes import init_hash_version
+from . import metrics
+
+DB_PATH = 'images.db'
+
+# Параметры конвейерной индексации
+DEFAULT_WORKERS = 4        # Потоки для декодирования, ресайза и EXIF
+DEFAULT_MAX_INFLIGHT = 2   # Одновременные запросы к Ollama
+DEFAULT_BATCH_SIZE = 50    # Количество записей в одной транзакции
+
+# Маркер завершения очереди
+_STOP = object()
+
+# Перцептивные хеши для поиска почти-дубликатов (64 бита в INTEGER)
+PHASH_COLUMNS = {
+    'phash': 'INTEGER',
+    'dhash': 'INTEGER',
+}
+
+# Поля изображения, сохраняемые вместе с описанием
+IMAGE_COLUMNS = {**EXIF_COLUMNS, **PHASH_COLUMNS}
+
+# Сигнатура файла для обнаружения изменений
+FILE_COLUMNS = {
+    'file_size': 'INTEGER',
+    'file_mtime_ns': 'INTEGER',
+    'file_inode': 'INTEGER',
+    'content_hash': 'TEXT',
+}
+
+# Триггеры, поддерживающие images_fts в актуальном состоянии
+FTS_TRIGGERS = {
+    'images_ai': '''
+        CREATE TRIGGER IF NOT EXISTS images_ai AFTER INSERT ON images BEGIN
+            INSERT INTO images_fts(rowid, file_path, description)
+            VALUES (new.id, new.file_path, new.description);
+        END
+    ''',
+    'images_ad': '''
+        CREATE TRIGGER IF NOT EXISTS images_ad AFTER DELETE ON images BEGIN
+            INSERT INTO images_fts(images_fts, rowid, file_path, description)
+            VALUES('delete', old.id, old.file_path, old.description);
+        END
+    ''',
+    'images_au': '''
+        CREATE TRIGGER IF NOT EXISTS images_au AFTER UPDATE ON images BEGIN
+            INSERT INTO images_fts(images_fts, rowid, file_path, description)
+            VALUES('delete', old.id, old.file_path, old.description);
+            INSERT INTO images_fts(rowid, file_path, description)
+            VALUES (new.id, new.file_path, new.description);
+        END
+    ''',
+}
+
+def fts_triggers_exist(c):
+    """Проверяет, что все триггеры FTS на месте."""
+    c.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (?, ?, ?)",
+              list(FTS_TRIGGERS))
+    return c.fetchone()[0] == len(FTS_TRIGGERS)
+
+def create_fts_triggers(c):
+    """Создает триггеры FTS."""
+    for sql in FTS_TRIGGERS.values():
+        c.execute(sql)
+
+def rebuild_fts(conn):
+    """Пересобирает полнотекстовый индекс из таблицы images и оптимизирует его."""
+    conn.execute("INSERT INTO images_fts(images_fts) VALUES('rebuild')")
+    conn.execute("INSERT INTO images_fts(images_fts) VALUES('optimize')")
+    conn.commit()
+
+def begin_bulk_load(conn):
+    """
+    Режим массовой загрузки: триггеры FTS удаляются, чтобы индекс не обновлялся
+    на каждую строку. Его заполняет end_bulk_load одной пересборкой.
+    """
+    for name in FTS_TRIGGERS:
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+    conn.commit()
+
+def end_bulk_load(conn):
+    """Восстанавливает триггеры FTS и пересобирает индекс."""
+    create_fts_triggers(conn.cursor())
+    print("Пересборка полнотекстового индекса...")
+    rebuild_fts(conn)
+
+def init_db():
+    """Инициализация базы данных и создание необходимых таблиц."""
+    conn = catalog_db.connect(DB_PATH)
+    c = conn.cursor()
+    
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'images'")
+    had_images = c.fetchone() is not None
+    
+    # Создаем основную таблицу для изображений
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS images (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_path TEXT UNIQUE,
+            exif_json TEXT,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Создаем таблицу для полнотекстового поиска
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS images_fts USING fts5(
+            file_path,
+            description,
+            content='images',
+            content_rowid='id'
+        )
+    ''')
+    
+    # Создаем триггеры для поддержания FTS таблицы в актуальном состоянии.
+    # Если таблица уже была, а триггеров нет, прерванная массовая загрузка
+    # оставила FTS неполной — пересобираем ее.
+    fts_stale = had_images and not fts_triggers_exist(c)
+    create_fts_triggers(c)
+    if fts_stale:
+        print("Триггеры FTS отсутствовали (прерванная массовая загрузка), пересборка индекса...")
+        rebuild_fts(conn)
+    
+    # Добавляем типизированные EXIF-столбцы в существующие базы
+    c.execute('PRAGMA table_info(images)')
+    existing_columns = {row[1] for row in c.fetchall()}
+    for column, column_type in {**IMAGE_COLUMNS, **FILE_COLUMNS}.items():
+        if column not in existing_columns:
+            c.execute(f'ALTER TABLE images ADD COLUMN {column} {column_type}')
+    
+    # Индексы для фильтрации по метаданным
+    c.execute('CREATE INDEX IF NOT EXISTS idx_images_taken_at ON images(taken_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_images_camera ON images(camera_make, camera_model)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_images_lens ON images(lens_model)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_images_gps ON images(gps_lat, gps_lon)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_images_format ON images(format)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_images_content_hash ON images(content_hash)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_images_phash ON images(phash)')
+    # Порядок списка изображений и постраничный вывод по курсору
+    c.execute('CREATE INDEX IF NOT EXISTS idx_images_created ON images(created_at, id)')
+    
+    conn.commit()
+    
+    # Очередь заданий на описание
+    job_queue.init_jobs_table(conn)
+    # Журнал просмотренных каталогов
+    init_journal_table(conn)
+    # Счетчик изменений хешей для сохраненного индекса похожих изображений
+    init_hash_version(conn)
+    return conn
+
+def insert_image(c, file_path, exif_data, description, fields, stat=None, content_hash=None):
+    """Добавляет запись об изображении вместе с типизированными EXIF-полями."""
+    columns = ['file_path', 'exif_json', 'description'] + list(IMAGE_COLUMNS) + list(FILE_COLUMNS)
+    values = ([file_path, json.dumps(exif_data), description]
+              + [fields.get(column) for column in IMAGE_COLUMNS]
+              + list(stat or (None, None, None)) + [content_hash])
+    c.execute(f'''
+        INSERT INTO images ({', '.join(columns)})
+        VALUES ({', '.join('?' * len(columns))})
+    ''', values)
+
+def save_record(c, record):
+    """
+    Сохраняет результат обработки файла в зависимости от действия:
+    вставка новой записи, обновление измененной, перенос перемещенной
+    или копия описания для дубликата.
+    """
+    action = record["action"]
+    stat = list(record["stat"])
+    if action == ACTION_NEW:
+        insert_image(c, record["file_path"], record["exif_data"], record["description"],
+                     record["fields"], record["stat"], record["content_hash"])
+    elif action == ACTION_MODIFIED:
+        assignments = ', '.join(f'{column} = ?' for column in ['exif_json', 'description', *IMAGE_COLUMNS, *FILE_COLUMNS])
+        c.execute(f'UPDATE images SET {assignments} WHERE id = ?',
+                  [json.dumps(record["exif_data"]), record["description"]]
+                  + [record["fields"].get(column) for column in IMAGE_COLUMNS]
+                  + stat + [record["content_hash"], record["image_id"]])
+    elif action == ACTION_MOVED:
+        c.execute('''
+            UPDATE images SET file_path = ?, file_size = ?, file_mtime_ns = ?, file_inode = ?, content_hash = ?
+            WHERE id = ?
+        ''', [record["file_path"]] + stat + [record["content_hash"], record["image_id"]])
+    elif action == ACTION_DUPLICATE:
+        # Побайтовая копия получает то же описание и EXIF без обращения к LLM
+        copied = ', '.join(['exif_json', 'description', *IMAGE_COLUMNS])
+        c.execute(f'''
+            INSERT INTO images (file_path, {copied}, {', '.join(FILE_COLUMNS)})
+            SELECT ?, {copied}, ?, ?, ?, ? FROM images WHERE id = ?
+        ''', [record["file_path"]] + stat + [record["content_hash"], record["source_id"]])
+    elif action == ACTION_TOUCH:
+        c.execute('''
+            UPDATE images SET file_size = ?, file_mtime_ns = ?, file_inode = ?, content_hash = ?
+            WHERE id = ?
+        ''', stat + [record["content_hash"], record["image_id"]])
+
+def needs_description(record):
+    """Нужно ли для записи получать описание от LLM."""
+    return record["action"] in (ACTION_NEW, ACTION_MODIFIED)
+
+def backfill_exif_fields(processes=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE):
+    """Заполняет типизированные EXIF-поля для ранее проиндексированных изображений."""
+    conn = init_db()
+    c = conn.cursor()
+    c.execute('SELECT id, file_path FROM images WHERE width IS NULL')
+    ids = {file_path: image_id for image_id, file_path in c.fetchall()}
+    assignments = ', '.join(f'{column} = ?' for column in EXIF_COLUMNS)
+    
+    def write(conn, batch):
+        conn.executemany(f'UPDATE images SET {assignments} WHERE id = ?',
+                         [[fields[column] for column in EXIF_COLUMNS] + [ids[file_path]]
+                          for file_path, fields in batch])
+    
+    writer = BatchWriter(conn, write, batch_size)
+    existing = (file_path for file_path in ids if os.path.exists(file_path))
+    try:
+        # Заголовки читаются в пуле процессов
+        for file_path, metadata, error in read_metadata_many(existing, processes):
+            if error is not None:
+                print(f"  Ошибка при извлечении EXIF-полей {file_path}: {error}")
+                continue
+            writer.add((file_path, metadata["fields"]))
+    finally:
+        writer.flush()
+        conn.close()
+    print(f"EXIF-поля обновлены для {len(ids)} изображений")
+
+def _write_metadata_batch(conn, batch):
+    """Сохраняет пачку метаданных без описаний (фиксацию выполняет BatchWriter)."""
+    c = conn.cursor()
+    assignments = ', '.join(f'{column} = ?' for column in ['exif_json', *EXIF_COLUMNS])
+    for file_path, stat, metadata, image_id in batch:
+        if image_id is None:
+            insert_image(c, file_path, metadata["exif_data"], None, metadata["fields"], stat)
+        else:
+            # Сигнатура не обновляется: изменение содержимого обнаружит следующее сканирование
+            c.execute(f'UPDATE images SET {assignments} WHERE id = ?',
+                      [json.dumps(metadata["exif_data"])]
+                      + [metadata["fields"].get(column) for column in EXIF_COLUMNS] + [image_id])
+
+def index_metadata_only(directory, recursive=False, processes=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE,
+                        commit_interval=COMMIT_INTERVAL, bulk_load=False, scan_options=None):
+    """
+    Быстрый проход только по метаданным: EXIF и размеры читаются из заголовков
+    файлов в пуле процессов, записи сохраняются без описания и без хеша содержимого.
+    
+    Файлы с неизмененной сигнатурой (размер, mtime, inode) пропускаются.
+    Записи без описания ставятся в очередь при следующем сканировании каталога.
+    
+    Returns:
+        int: Количество сохраненных записей
+    """
+    conn = init_db()
+    c = conn.cursor()
+    if bulk_load:
+        begin_bulk_load(conn)
+    changed = {}
+    
+    def changed_files():
+        for _, files in DirectoryScanner(directory, recursive, **(scan_options or {})):
+            known_files = load_known_paths(c, [file_path for file_path, _ in files])
+            for file_path, stat in files:
+                entry = known_files.get(file_path)
+                if entry is None or tuple(entry[1:4]) != stat:
+                    changed[file_path] = (stat, entry[0] if entry else None)
+                    yield file_path
+    
+    writer = BatchWriter(conn, _write_metadata_batch, batch_size, commit_interval)
+    saved = 0
+    try:
+        for file_path, metadata, error in read_metadata_many(changed_files(), processes):
+            stat, image_id = changed.pop(file_path)
+            if error is not None:
+                print(f"  Ошибка при извлечении EXIF {file_path}: {error}")
+                continue
+            writer.add((file_path, stat, metadata, image_id))
+            saved += 1
+            if saved % 1000 == 0:
+                print(f"  Прочитаны метаданные {saved} файлов")
+    finally:
+        writer.flush()
+        if bulk_load:
+            end_bulk_load(conn)
+        conn.close()
+    print(f"Метаданные сохранены для {saved} файлов")
+    return saved
+
+def find_image_files(directory, recursive=False, **scan_options):
+    """Генератор путей к изображениям в указанной директории (без журнала каталогов)."""
+    for file_path, _ in DirectoryScanner(directory, recursive, **scan_options).files():
+        yield file_path
+
+def scan_directory(conn, directory, recursive=False, batch_size=DEFAULT_BATCH_SIZE, scan_options=None):
+    """
+    Сканирует директорию и ставит в очередь файлы, которым нужно описание.
+    
+    Перемещения, дубликаты и файлы с неизмененным содержимым не требуют LLM
+    и сохраняются сразу; новые и измененные файлы становятся заданиями
+    в таблице index_jobs. Сигнатуры известных файлов загружаются по одному
+    каталогу, а каталоги, не изменившиеся с прошлого сканирования, не читаются:
+    для них проверяется только stat уже известных файлов.
+    
+    Args:
+        conn (sqlite3.Connection): Соединение с базой данных
+        directory (str | list): Каталог или список каталогов
+        recursive (bool): Рекурсивный обход поддиректорий
+        batch_size (int): Файлов между фиксациями транзакции
+        scan_options (dict): Параметры DirectoryScanner: include, exclude, workers, full_scan
+    
+    Returns:
+        int: Количество поставленных в очередь файлов
+    """
+    c = conn.cursor()
+    scanner = DirectoryScanner(directory, recursive, conn=conn, **(scan_options or {}))
+    queued = 0
+    planned = 0
+    for _, files in scanner:
+        known_files = load_known_paths(c, [file_path for file_path, _ in files])
+        for file_path, stat in files:
+            try:
+                record = plan_file(c, file_path, known_files, stat)
+            except OSError as e:
+                print(f"  Ошибка при чтении файла {file_path}: {str(e)}")
+                continue
+            if record is None:
+                continue
+            if needs_description(record):
+                job_queue.enqueue(conn, file_path)
+                queued += 1
+            else:
+                # Перемещение, дубликат или неизмененное содержимое: LLM не нужна
+                try:
+                    save_record(c, record)
+                    print(f"  Файл проиндексирован без описания ({record['action']}): {file_path}")
+                except sqlite3.IntegrityError:
+                    print(f"  Ошибка: файл уже существует в базе данных: {file_path}")
+            planned += 1
+            if planned % batch_size == 0:
+                conn.commit()
+    conn.commit()
+    queued += enqueue_missing_descriptions(conn)
+    print(f"Сканирование завершено: прочитано каталогов {scanner.scanned_dirs}, "
+          f"без изменений {scanner.skipped_dirs}, в очереди на описание {queued} файлов")
+    return queued
+
+def enqueue_empty_descriptions(conn):
+    """
+    Ставит в очередь записи с пустым описанием: так сохранялись ошибки
+    генерации до появления очереди заданий.
+    """
+    c = conn.cursor()
+    c.execute("SELECT file_path FROM images WHERE description IS NULL OR description = ''")
+    rows = c.fetchall()
+    for (file_path,) in rows:
+        job_queue.enqueue(conn, file_path)
+    conn.commit()
+    return len(rows)
+
+def enqueue_missing_descriptions(conn):
+    """
+    Ставит в очередь записи, сохраненные проходом только по метаданным
+    (описание NULL), если для них еще нет активного или проваленного задания.
+    """
+    c = conn.cursor()
+    c.execute('''
+        SELECT i.file_path FROM images i
+        LEFT JOIN index_jobs j ON j.file_path = i.file_path
+        WHERE i.description IS NULL AND (j.state IS NULL OR j.state = ?)
+    ''', (job_queue.STATE_DONE,))
+    rows = c.fetchall()
+    for (file_path,) in rows:
+        job_queue.enqueue(conn, file_path)
+    conn.commit()
+    return len(rows)
+
+def plan_job(c, file_path):
+    """
+    Определяет действие для задания по текущему состоянию файла и базы.
+    
+    План строится заново при выполнении: за время ожидания в очереди файл
+    мог измениться, а его копия — получить описание.
+    """
+    record = plan_file(c, file_path, load_known_files(c, file_path))
+    if record is None:
+        c.execute('SELECT id, description, content_hash FROM images WHERE file_path = ?', (file_path,))
+        row = c.fetchone()
+        if row is not None and not row[1]:
+            # Запись есть, но описание не было получено: описываем заново
+            record = {"action": ACTION_MODIFIED, "file_path": file_path, "stat": file_stat(file_path),
+                      "content_hash": row[2] or hash_file(file_path), "image_id": row[0]}
+    return record
+
+def _finish_job(conn, job_id, record=None, error=None):
+    """Сохраняет результат задания и его состояние (без фиксации транзакции)."""
+    file_path = record["file_path"] if record else None
+    if error is None and record is not None:
+        try:
+            save_record(conn.cursor(), record)
+            print(f"  Файл успешно проиндексирован: {file_path}")
+        except sqlite3.IntegrityError:
+            print(f"  Ошибка: файл уже существует в базе данных: {file_path}")
+        except Exception as e:
+            error = f"Ошибка при сохранении в базу данных: {str(e)}"
+            print(f"  {error}")
+    if error is None:
+        job_queue.complete(conn, job_id)
+        metrics.inc('jobs_done')
+    else:
+        job_queue.fail(conn, job_id, error)
+        metrics.inc('jobs_failed')
+
+def index_images_in_directory(directory=None, recursive=False, client=None,
+                              batch_size=DEFAULT_BATCH_SIZE, commit_interval=COMMIT_INTERVAL, bulk_load=False,
+                              scan_options=None, cache=None):
+    """
+    Индексация изображений: сканирование директории (если указана)
+    и выполнение заданий из очереди по одному.
+    
+    Результаты записываются пачками: транзакция фиксируется после batch_size
+    заданий или через commit_interval секунд, а не после каждого файла.
+    В режиме bulk_load полнотекстовый индекс пересобирается один раз в конце.
+    Если передан кэш производных (cache), уменьшенные копии и миниатюры
+    сохраняются в него за тот же проход декодирования.
+    """
+    conn = init_db()
+    c = conn.cursor()
+    if bulk_load:
+        begin_bulk_load(conn)
+    
+    writer = BatchWriter(conn, _write_batch, batch_size, commit_interval)
+    owner = job_queue.worker_id()
+    try:
+        if directory is not None:
+            scan_directory(conn, directory, recursive, batch_size, scan_options)
+        
+        while True:
+            jobs = job_queue.lease(conn, owner)
+            if not jobs:
+                break
+            job_id, file_path = jobs[0]
+            
+            try:
+                record = plan_job(c, file_path)
+                if record is not None and _hash_pending(writer.batch, record["content_hash"]):
+                    # Оригинал с тем же содержимым еще не записан: записываем и планируем заново
+                    writer.flush()
+                    record = plan_job(c, file_path)
+            except OSError as e:
+                print(f"  Ошибка при чтении файла {file_path}: {str(e)}")
+                writer.add((job_id, None, str(e)))
+                continue
+            if record is None:
+                print(f"  Файл уже проиндексирован: {file_path}")
+                writer.add((job_id, None, None))
+                continue
+            
+            print(f"Обработка {file_path} ({record['action']})...")
+            
+            error = None
+            if needs_description(record):
+                # Декодируем изображение и извлекаем EXIF за одно открытие файла
+                print("  Декодирование и извлечение EXIF...")
+                try:
+                    decoded = decode_image(file_path, cache=cache, content_hash=record["content_hash"])
+                    record["exif_data"] = decoded["exif_data"]
+                    record["fields"] = decoded["fields"]
+                    
+                    # Получаем описание
+                    print("  Генерация описания...")
+                    description_data = describe_prepared(file_path, decoded["image_info"], decoded["base64_image"],
+                                                         client=client)
+                    record["description"] = description_data["description"]  # Берем только текстовое описание
+                except Exception as e:
+                    print(f"  Ошибка при генерации описания: {str(e)}")
+                    error = str(e)
+            
+            # Результат и состояние задания сохраняются в одной транзакции
+            writer.add((job_id, record, error))
+    finally:
+        writer.flush()
+        if bulk_load:
+            end_bulk_load(conn)
+        conn.close()
+
+def _hash_pending(batch, content_hash):
+    """Есть ли в еще не записанной пачке файл с тем же содержимым."""
+    return any(record is not None and record.get("content_hash") == content_hash
+               for _, record, _ in batch)
+
+def _write_batch(conn, batch):
+    """Сохраняет пачку результатов заданий (фиксацию выполняет BatchWriter)."""
+    for job_id, record, error in batch:
+        _finish_job(conn, job_id, record, error)
+
+def index_images_pipelined(directory=None, recursive=False, workers=DEFAULT_WORKERS,
+                           max_inflight=DEFAULT_MAX_INFLIGHT, batch_size=DEFAULT_BATCH_SIZE,
+                           max_size=1600, client=None, commit_interval=COMMIT_INTERVAL, bulk_load=False,
+                           scan_options=None, cache=None):
+    """
+    Конвейерная индексация изображений.
+    
+    Директория (если указана) сканируется в очередь заданий в отдельном потоке,
+    и задания начинают выполняться, не дожидаясь конца сканирования. Задания
+    забираются с арендой и проходят стадии, связанные ограниченными очередями:
+    1. workers потоков декодируют, уменьшают изображения и извлекают EXIF
+    2. до max_inflight потоков отправляют запросы к Ollama; фактическое число
+       одновременных запросов подбирает адаптивный лимит клиента
+    3. один поток записи сохраняет результаты и состояния заданий пачками по batch_size
+       (или каждые commit_interval секунд, если результаты поступают медленно)
+    
+    Args:
+        directory (str): Путь к директории с изображениями; None — только выполнить очередь
+        recursive (bool): Рекурсивный обход поддиректорий
+        workers (int): Количество потоков подготовки изображений
+        max_inflight (int): Максимальное количество одновременных запросов к Ollama
+        batch_size (int): Количество записей в одной транзакции
+        max_size (int): Максимальный размер большей стороны в пикселях
+        client (OllamaClient): Клиент Ollama; по умолчанию создается для локального сервера
+        commit_interval (float): Максимальное время между фиксациями транзакций, секунды
+        bulk_load (bool): Не обновлять FTS-индекс на каждую строку, пересобрать его в конце
+        scan_options (dict): Параметры DirectoryScanner: include, exclude, workers, full_scan
+        cache (DerivativeCache): Кэш уменьшенных копий и миниатюр, заполняемый при декодировании
+    """
+    conn = init_db()
+    c = conn.cursor()
+    if bulk_load:
+        # Если процесс прервется, init_db при следующем запуске восстановит триггеры и индекс
+        begin_bulk_load(conn)
+    
+    def scan_worker():
+        scan_conn = catalog_db.connect(DB_PATH)
+        try:
+            scan_directory(scan_conn, directory, recursive, batch_size, scan_options)
+        finally:
+            scan_conn.close()
+    
+    scan_thread = None
+    if directory is not None:
+        scan_thread = threading.Thread(target=scan_worker, name='scan')
+        scan_thread.start()
+    
+    own_client = client is None
+    if own_client:
+        client = OllamaClient([OLLAMA_URL], max_concurrency=max_inflight)
+    
+    # Ограниченные очереди дают обратное давление между стадиями
+    paths = queue.Queue(maxsize=workers * 2)
+    prepared = queue.Queue(maxsize=max_inflight * 2)
+    results = queue.Queue(maxsize=batch_size * 2)
+    
+    def prepare_worker():
+        while True:
+            item = paths.get()
+            if item is _STOP:
+                break
+            job_id, record = item
+            file_path = record["file_path"]
+            print(f"Обработка {file_path} ({record['action']})...")
+            try:
+                decoded = decode_image(file_path, max_size, cache, record["content_hash"])
+            except Exception as e:
+                print(f"  Ошибка при подготовке изображения {file_path}: {str(e)}")
+                results.put((job_id, record, str(e)))
+                continue
+            record["exif_data"] = decoded["exif_data"]
+            record["fields"] = decoded["fields"]
+            prepared.put((job_id, record, decoded["image_info"], decoded["base64_image"]))
+    
+    def describe_worker():
+        while True:
+            item = prepared.get()
+            if item is _STOP:
+                break
+            job_id, record, image_info, base64_image = item
+            file_path = record["file_path"]
+            try:
+                description_data = describe_prepared(file_path, image_info, base64_image, max_size, client)
+                record["description"] = description_data["description"]
+                results.put((job_id, record, None))
+            except Exception as e:
+                print(f"  Ошибка при генерации описания {file_path}: {str(e)}")
+                results.put((job_id, record, str(e)))
+    
+    def writer():
+        # Соединение SQLite создается в том же потоке, где используется
+        writer_conn = catalog_db.connect(DB_PATH)
+        batch_writer = BatchWriter(writer_conn, _write_batch, batch_size, commit_interval)
+        while True:
+            try:
+                item = results.get(timeout=commit_interval)
+            except queue.Empty:
+                # Поток результатов иссяк: фиксируем накопленное, не дожидаясь полной пачки
+                batch_writer.flush()
+                continue
+            if item is _STOP:
+                break
+            batch_writer.add(item)
+        batch_writer.flush()
+        writer_conn.close()
+    
+    prepare_threads = [threading.Thread(target=prepare_worker, name=f'prepare-{i}') for i in range(workers)]
+    describe_threads = [threading.Thread(target=describe_worker, name=f'describe-{i}') for i in range(max_inflight)]
+    writer_thread = threading.Thread(target=writer, name='writer')
+    for t in prepare_threads + describe_threads + [writer_thread]:
+        t.start()
+    
+    # Хеши файлов, отправленных на описание в этом запуске. Их копии откладываются
+    # до конца запуска, когда описание оригинала уже будет в базе.
+    pending_hashes = set()
+    deferred = []
+    owner = job_queue.worker_id()
+    
+    try:
+        while True:
+            scan_finished = scan_thread is None or not scan_thread.is_alive()
+            jobs = job_queue.lease(conn, owner, limit=workers)
+            if not jobs:
+                if scan_finished:
+                    break
+                # Очередь пуста, но сканирование еще добавляет задания
+                scan_thread.join(timeout=0.5)
+                continue
+            for job_id, file_path in jobs:
+                try:
+                    record = plan_job(c, file_path)
+                except OSError as e:
+                    print(f"  Ошибка при чтении файла {file_path}: {str(e)}")
+                    results.put((job_id, {"file_path": file_path}, str(e)))
+                    continue
+                if record is None:
+                    print(f"  Файл уже проиндексирован: {file_path}")
+                    results.put((job_id, None, None))
+                elif record["content_hash"] in pending_hashes:
+                    deferred.append((job_id, file_path))
+                elif needs_description(record):
+                    pending_hashes.add(record["content_hash"])
+                    paths.put((job_id, record))
+                else:
+                    results.put((job_id, record, None))
+    finally:
+        if scan_thread is not None:
+            scan_thread.join()
+        # Останавливаем стадии по очереди, чтобы каждая успела дообработать свои данные
+        for _ in prepare_threads:
+            paths.put(_STOP)
+        for t in prepare_threads:
+            t.join()
+        for _ in describe_threads:
+            prepared.put(_STOP)
+        for t in describe_threads:
+            t.join()
+        results.put(_STOP)
+        writer_thread.join()
+        if own_client:
+            client.close()
+    
+    # Копии файлов, описанных в этом запуске, получают готовое описание.
+    # Если оригинал описать не удалось, копия возвращается в очередь.
+    for job_id, file_path in deferred:
+        try:
+            record = plan_job(c, file_path)
+        except OSError as e:
+            _finish_job(conn, job_id, error=str(e))
+            continue
+        if record is not None and needs_description(record):
+            job_queue.release(conn, job_id)
+        else:
+            _finish_job(conn, job_id, record)
+    conn.commit()
+    if bulk_load:
+        end_bulk_load(conn)
+    conn.close()
+
+def print_job_summary():
+    """Выводит количество заданий в каждом состоянии."""
+    conn = init_db()
+    counts = job_queue.counts(conn)
+    conn.close()
+    states = [job_queue.STATE_PENDING, job_queue.STATE_RUNNING, job_queue.STATE_DONE, job_queue.STATE_FAILED]
+    print('Задания: ' + ', '.join(f'{state} {counts.get(state, 0)}' for state in states))
+
+def main():
+    parser = argparse.ArgumentParser(description='Индексация изображений в указанной директории.')
+    parser.add_argument('directory', nargs='*', help='Пути к директориям с изображениями')
+    parser.add_argument('-r', '--recursive', action='store_true', help='Рекурсивный обход поддиректорий')
+    parser.add_argument('--include', action='append',
+                        help='Шаблон glob для файлов (путь относительно каталога или имя); можно указать несколько')
+    parser.add_argument('--exclude', action='append',
+                        help='Шаблон glob для исключаемых файлов и каталогов; можно указать несколько')
+    parser.add_argument('--scan-workers', type=int, default=SCAN_WORKERS,
+                        help=f'Каталогов, читаемых одновременно при сканировании (по умолчанию: {SCAN_WORKERS})')
+    parser.add_argument('--full-scan', action='store_true',
+                        help='Прочитать все каталоги, даже если их mtime не изменился с прошлого сканирования')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Конвейерная индексация: параллельная подготовка, запросы к Ollama и пакетная запись')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Потоки подготовки изображений; для --exif-only и --backfill-exif — процессы чтения EXIF '
+                             f'(по умолчанию: {DEFAULT_WORKERS})')
+    parser.add_argument('--max-inflight', type=int, default=DEFAULT_MAX_INFLIGHT,
+                        help=f'Максимум одновременных запросов к одному серверу Ollama (по умолчанию: {DEFAULT_MAX_INFLIGHT})')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'Записей в одной транзакции (по умолчанию: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--ollama-url', action='append', dest='ollama_urls',
+                        help=f'Адрес сервера Ollama; можно указать несколько для распределения нагрузки (по умолчанию: {OLLAMA_URL})')
+    parser.add_argument('--timeout', type=float, default=READ_TIMEOUT,
+                        help=f'Таймаут ответа Ollama в секундах (по умолчанию: {READ_TIMEOUT})')
+    parser.add_argument('--retries', type=int, default=MAX_RETRIES,
+                        help=f'Количество повторов запроса к Ollama (по умолчанию: {MAX_RETRIES})')
+    parser.add_argument('--commit-interval', type=float, default=COMMIT_INTERVAL,
+                        help=f'Максимальное время между фиксациями транзакций в секундах (по умолчанию: {COMMIT_INTERVAL})')
+    parser.add_argument('--synchronous', choices=['OFF', 'NORMAL', 'FULL'],
+                        help=f"PRAGMA synchronous (по умолчанию: {catalog_db.PRAGMAS['synchronous']})")
+    parser.add_argument('--cache-size', type=int,
+                        help=f"Размер кэша страниц SQLite в КиБ (по умолчанию: {-catalog_db.PRAGMAS['cache_size']})")
+    parser.add_argument('--mmap-size', type=int,
+                        help=f"Размер отображения файла базы в память в МиБ (по умолчанию: {catalog_db.PRAGMAS['mmap_size'] >> 20})")
+    parser.add_argument('--bulk-load', action='store_true',
+                        help='Массовая загрузка: FTS-индекс не обновляется на каждую строку и пересобирается в конце')
+    parser.add_argument('--resume', action='store_true',
+                        help='Продолжить выполнение очереди заданий без повторного сканирования')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='Вернуть в очередь проваленные задания и записи с пустым описанием')
+    parser.add_argument('--derivative-cache', default=CACHE_DIR,
+                        help=f'Каталог кэша уменьшенных копий и миниатюр (по умолчанию: {CACHE_DIR})')
+    parser.add_argument('--derivative-cache-mb', type=int, default=MAX_CACHE_BYTES >> 20,
+                        help=f'Предельный размер кэша копий в МиБ (по умолчанию: {MAX_CACHE_BYTES >> 20})')
+    parser.add_argument('--no-derivative-cache', action='store_true',
+                        help='Не сохранять уменьшенные копии и миниатюры')
+    parser.add_argument('--backfill-exif', action='store_true',
+                        help='Заполнить типизированные EXIF-поля для уже проиндексированных изображений')
+    parser.add_argument('--exif-only', action='store_true',
+                        help='Только метаданные: прочитать EXIF из заголовков файлов в --workers процессах, '
+                             'без описаний; описания будут получены при следующем запуске без этого флага')
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    setup_logging()
+    
+    with metrics.from_args(args):
+        run(args)
+
+def run(args):
+    """Выполняет индексацию с разобранными аргументами командной строки."""
+    catalog_db.configure(
+        synchronous=args.synchronous,
+        cache_size=-args.cache_size if args.cache_size else None,
+        mmap_size=args.mmap_size << 20 if args.mmap_size is not None else None,
+    )
+    
+    if args.backfill_exif:
+        backfill_exif_fields(args.workers, args.batch_size)
+        return
+    
+    if args.retry_failed:
+        conn = init_db()
+        retried = job_queue.retry_failed(conn) + enqueue_empty_descriptions(conn)
+        conn.close()
+        print(f"Возвращено в очередь: {retried}")
+    
+    # С --resume или --retry-failed без директории выполняется только очередь
+    directory = None if args.resume or not args.directory else args.directory
+    if directory is None and not (args.resume or args.retry_failed):
+        print('Не указан каталог с изображениями!')
+        sys.exit(1)
+    if directory is not None and not all(os.path.isdir(path) for path in directory):
+        print('Указанный путь не является каталогом!')
+        sys.exit(1)
+    scan_options = {"include": args.include, "exclude": args.exclude, "workers": args.scan_workers,
+                    "full_scan": args.full_scan}
+    
+    if args.exif_only:
+        if directory is None:
+            print('Не указан каталог с изображениями!')
+            sys.exit(1)
+        index_metadata_only(directory, args.recursive, args.workers, args.batch_size, args.commit_interval,
+                            args.bulk_load, scan_options)
+        return
+    
+    try:
+        client = OllamaClient(args.ollama_urls or [OLLAMA_URL], max_concurrency=args.max_inflight,
+                              read_timeout=args.timeout, max_retries=args.retries)
+    except ValueError as e:
+        print(f"Ошибка: {str(e)}")
+        sys.exit(1)
+    cache = None
+    if not args.no_derivative_cache:
+        cache = DerivativeCache(args.derivative_cache, args.derivative_cache_mb << 20)
+    try:
+        if args.pipeline:
+            # Потоков описания столько, сколько слотов на всех серверах вместе
+            index_images_pipelined(directory, args.recursive, args.workers,
+                                   args.max_inflight * len(client.endpoints), args.batch_size,
+                                   client=client, commit_interval=args.commit_interval, bulk_load=args.bulk_load,
+                                   scan_options=scan_options, cache=cache)
+        else:
+            index_images_in_directory(directory, args.recursive, client, args.batch_size, args.commit_interval,
+                                      args.bulk_load, scan_options, cache)
+    finally:
+        client.close()
+        if cache is not None:
+            cache.close()
+    print_job_summary()
+    print('Индексация завершена.')
+
+if __name__ == "__main__":
+    main() 
\ No newline at end of file
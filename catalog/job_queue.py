@@ -0,0 +1,131 @@
+import os
+import socket
+import time
+
+# Состояния задания
+STATE_PENDING = 'pending'
+STATE_RUNNING = 'running'
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+
+LEASE_SECONDS = 900   # Сколько задание принадлежит исполнителю без завершения
+MAX_ATTEMPTS = 3      # После стольких неудач задание считается окончательно проваленным
+
+def worker_id():
+    """Идентификатор текущего процесса-исполнителя."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def init_jobs_table(conn):
+    """Создает таблицу заданий индексации."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS index_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_path TEXT UNIQUE NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            lease_owner TEXT,
+            lease_expires REAL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_index_jobs_state ON index_jobs(state, lease_expires)')
+    conn.commit()
+
+def enqueue(conn, file_path):
+    """
+    Ставит файл в очередь на описание.
+
+    Новое задание создается в состоянии pending; выполненное задание
+    возвращается в очередь (файл изменился). Проваленные задания не трогаются —
+    их возвращает только retry_failed.
+    """
+    conn.execute('''
+        INSERT INTO index_jobs (file_path, state) VALUES (?, 'pending')
+        ON CONFLICT(file_path) DO UPDATE SET
+            state = 'pending', attempts = 0, error = NULL, updated_at = CURRENT_TIMESTAMP
+        WHERE index_jobs.state = 'done'
+    ''', (file_path,))
+
+def lease(conn, owner, limit=1, lease_seconds=LEASE_SECONDS):
+    """
+    Забирает до limit заданий: ожидающие и те, чья аренда истекла
+    (исполнитель упал). Задания с меньшим числом попыток идут первыми,
+    поэтому повтор неудачного задания не блокирует остальные. Выполняется в транзакции BEGIN IMMEDIATE, поэтому
+    несколько процессов не получат одно и то же задание.
+
+    Returns:
+        list: Пары (job_id, file_path)
+    """
+    now = time.time()
+    in_transaction = conn.in_transaction
+    if not in_transaction:
+        conn.execute('BEGIN IMMEDIATE')
+    try:
+        c = conn.cursor()
+        c.execute('''
+            SELECT id, file_path FROM index_jobs
+            WHERE state = 'pending' OR (state = 'running' AND lease_expires < ?)
+            ORDER BY attempts, id
+            LIMIT ?
+        ''', (now, limit))
+        jobs = c.fetchall()
+        c.executemany('''
+            UPDATE index_jobs
+            SET state = 'running', lease_owner = ?, lease_expires = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', [(owner, now + lease_seconds, job_id) for job_id, _ in jobs])
+        if not in_transaction:
+            conn.commit()
+        return jobs
+    except Exception:
+        if not in_transaction:
+            conn.rollback()
+        raise
+
+def complete(conn, job_id):
+    """Отмечает задание выполненным (без фиксации транзакции)."""
+    conn.execute('''
+        UPDATE index_jobs
+        SET state = 'done', error = NULL, lease_owner = NULL, lease_expires = NULL,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', (job_id,))
+
+def fail(conn, job_id, error, max_attempts=MAX_ATTEMPTS):
+    """
+    Записывает неудачную попытку (без фиксации транзакции). Пока попытки
+    не исчерпаны, задание возвращается в очередь.
+    """
+    conn.execute('''
+        UPDATE index_jobs
+        SET attempts = attempts + 1,
+            error = ?,
+            state = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END,
+            lease_owner = NULL, lease_expires = NULL, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', (error, max_attempts, job_id))
+
+def release(conn, job_id):
+    """Возвращает задание в очередь без учета попытки (без фиксации транзакции)."""
+    conn.execute('''
+        UPDATE index_jobs
+        SET state = 'pending', lease_owner = NULL, lease_expires = NULL, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND state = 'running'
+    ''', (job_id,))
+
+def retry_failed(conn):
+    """Возвращает проваленные задания в очередь. Возвращает их количество."""
+    c = conn.execute('''
+        UPDATE index_jobs
+        SET state = 'pending', attempts = 0, error = NULL, updated_at = CURRENT_TIMESTAMP
+        WHERE state = 'failed'
+    ''')
+    conn.commit()
+    return c.rowcount
+
+def counts(conn):
+    """Количество заданий в каждом состоянии."""
+    c = conn.cursor()
+    c.execute('SELECT state, COUNT(*) FROM index_jobs GROUP BY state')
+    return dict(c.fetchall())
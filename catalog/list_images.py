@@ -0,0 +1,214 @@
+import sqlite3
+from . import catalog_db
+import argparse
+import base64
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from .extract_exif import EXIF_COLUMNS
+
+# Столбцы, которые можно выбрать через --columns
+LIST_COLUMNS = ('id', 'file_path', 'description', 'created_at', *EXIF_COLUMNS, 'file_size', 'content_hash')
+DEFAULT_COLUMNS = ('file_path', 'description', 'created_at')
+
+# Параметры вывода
+FETCH_SIZE = 256          # Строк, читаемых из базы и проверяемых на диске за раз
+EXISTS_WORKERS = 16       # Параллельные проверки существования файлов
+SNIPPET_TOKENS = 16       # Длина фрагмента описания в словах
+
+def encode_cursor(created_at, image_id):
+    """Курсор страницы: позиция последней выведенной строки в порядке (created_at, id)."""
+    return base64.urlsafe_b64encode(json.dumps([created_at, image_id]).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Разбирает курсор страницы; ValueError, если курсор поврежден."""
+    try:
+        created_at, image_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError(f"Некорректный курсор: {cursor}")
+    return created_at, image_id
+
+def query_images(conn, limit=None, offset=0, search=None, after=None, columns=DEFAULT_COLUMNS, text_mode=None):
+    """
+    Генератор записей каталога от новых к старым.
+
+    Порядок (created_at, id) поддерживается индексом idx_images_created, поэтому
+    страница по курсору after читается с той же скоростью, что и первая:
+    база не сортирует таблицу и не пропускает offset строк.
+
+    Args:
+        conn (sqlite3.Connection): Соединение с базой данных
+        limit (int): Максимальное количество записей
+        offset (int): Смещение (для совместимости; для больших каталогов используйте after)
+        search (str): Запрос FTS5 для фильтрации
+        after (str): Курсор последней строки предыдущей страницы
+        columns (tuple): Выбираемые столбцы из LIST_COLUMNS
+        text_mode (str): 'snippet' или 'highlight' — вместо полного описания фрагмент
+                         с выделенными совпадениями (только вместе с search)
+
+    Yields:
+        dict: Значения столбцов и cursor строки
+    """
+    unknown = [column for column in columns if column not in LIST_COLUMNS]
+    if unknown:
+        raise ValueError(f"Неизвестные столбцы: {', '.join(unknown)}")
+
+    # created_at и id нужны для курсора, даже если не выводятся
+    select = [f'i.{column}' for column in columns if column != 'description']
+    select += ['i.created_at AS _created_at', 'i.id AS _id']
+    if 'description' in columns:
+        if search and text_mode == 'snippet':
+            select.append(f"snippet(images_fts, 1, '[', ']', '…', {SNIPPET_TOKENS}) AS description")
+        elif search and text_mode == 'highlight':
+            select.append("highlight(images_fts, 1, '[', ']') AS description")
+        else:
+            select.append('i.description')
+
+    query = f"SELECT {', '.join(select)} FROM images i"
+    conditions = []
+    params = []
+    if search:
+        query += ' JOIN images_fts ON i.id = images_fts.rowid'
+        conditions.append('images_fts MATCH ?')
+        params.append(search)
+    if after:
+        conditions.append('(i.created_at, i.id) < (?, ?)')
+        params.extend(decode_cursor(after))
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY i.created_at DESC, i.id DESC LIMIT ? OFFSET ?'
+    params.extend([limit if limit else -1, offset])
+
+    c = conn.cursor()
+    c.execute(query, params)
+    while True:
+        rows = c.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        for row in rows:
+            record = {column: row[column] for column in columns}
+            record['cursor'] = encode_cursor(row['_created_at'], row['_id'])
+            yield record
+
+def _with_existence(records, executor):
+    """Добавляет поле exists, проверяя файлы пачками по FETCH_SIZE параллельно."""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= FETCH_SIZE:
+            yield from _check_batch(batch, executor)
+            batch = []
+    yield from _check_batch(batch, executor)
+
+def _check_batch(batch, executor):
+    for record, exists in zip(batch, executor.map(os.path.exists, [r['file_path'] for r in batch])):
+        record['exists'] = exists
+        yield record
+
+def _print_text(record, columns):
+    """Выводит запись в человекочитаемом виде."""
+    status = {True: "✓ ", False: "✗ ", None: ""}[record.get('exists')]
+    print(f"\n{status}{record.get('file_path', '')}")
+    if 'created_at' in columns and record['created_at']:
+        created_at = datetime.fromisoformat(record['created_at'])
+        print(f"Дата индексации: {created_at.strftime('%Y-%m-%d %H:%M:%S')}")
+    for column in columns:
+        if column not in ('file_path', 'created_at', 'description') and record[column] is not None:
+            print(f"{column}: {record[column]}")
+    if 'description' in columns:
+        print("-" * 40)
+        print(record['description'])
+    print("-" * 80)
+
+def list_images(db_path='images.db', limit=None, offset=0, search=None, after=None, columns=DEFAULT_COLUMNS,
+                text_mode=None, check_exists=False, output_format='text'):
+    """
+    Выводит список изображений и их описаний из базы данных.
+
+    Args:
+        db_path (str): Путь к файлу базы данных
+        limit (int): Максимальное количество записей для вывода
+        offset (int): Смещение для пагинации
+        search (str): Поисковый запрос для фильтрации описаний
+        after (str): Курсор: вывести записи после строки, которой он выдан
+        columns (tuple): Выводимые столбцы
+        text_mode (str): 'snippet' или 'highlight' для описаний найденных записей
+        check_exists (bool): Проверить наличие файлов на диске (пачками, параллельно)
+        output_format (str): 'text' или 'jsonl' (одна JSON-запись на строку)
+    """
+    executor = None
+    try:
+        conn = catalog_db.connect(db_path, readonly=True)
+        conn.row_factory = sqlite3.Row
+
+        # Путь нужен для проверки существования, даже если не выводится
+        query_columns = tuple(columns) if not check_exists or 'file_path' in columns else (*columns, 'file_path')
+        records = query_images(conn, limit, offset, search, after, query_columns, text_mode)
+        if check_exists:
+            executor = ThreadPoolExecutor(max_workers=EXISTS_WORKERS)
+            records = _with_existence(records, executor)
+
+        count = 0
+        last_cursor = None
+        for record in records:
+            if 'file_path' not in columns:
+                record.pop('file_path', None)
+            if output_format == 'jsonl':
+                print(json.dumps(record, ensure_ascii=False))
+            else:
+                if count == 0:
+                    print("-" * 80)
+                _print_text(record, columns)
+            count += 1
+            last_cursor = record['cursor']
+
+        if output_format == 'jsonl':
+            return
+        if not count:
+            print("Изображения не найдены.")
+            return
+        print(f"\nВыведено изображений: {count}")
+        if limit and count == limit:
+            print(f"Следующая страница: --after {last_cursor}")
+
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+    except sqlite3.Error as e:
+        print(f"Ошибка базы данных: {str(e)}", file=sys.stderr)
+    except Exception as e:
+        print(f"Неожиданная ошибка: {str(e)}", file=sys.stderr)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if 'conn' in locals():
+            conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Вывод списка изображений из базы данных.')
+    parser.add_argument('--db', default='images.db', help='Путь к файлу базы данных (по умолчанию: images.db)')
+    parser.add_argument('--limit', type=int, help='Максимальное количество записей для вывода')
+    parser.add_argument('--offset', type=int, default=0, help='Смещение для пагинации (по умолчанию: 0)')
+    parser.add_argument('--after', help='Курсор следующей страницы (выводится после страницы с --limit)')
+    parser.add_argument('--search', help='Поисковый запрос для фильтрации описаний')
+    parser.add_argument('--columns', default=','.join(DEFAULT_COLUMNS),
+                        help=f'Выводимые столбцы через запятую из: {", ".join(LIST_COLUMNS)} '
+                             f'(по умолчанию: {",".join(DEFAULT_COLUMNS)})')
+    text_group = parser.add_mutually_exclusive_group()
+    text_group.add_argument('--snippet', dest='text_mode', action='store_const', const='snippet',
+                            help='Вместо полного описания вывести фрагмент с совпадениями (с --search)')
+    text_group.add_argument('--highlight', dest='text_mode', action='store_const', const='highlight',
+                            help='Выделить совпадения в описании (с --search)')
+    parser.add_argument('--check-exists', action='store_true',
+                        help='Проверить наличие файлов на диске (✓/✗, поле exists в JSON)')
+    parser.add_argument('--format', choices=['text', 'jsonl'], default='text', dest='output_format',
+                        help='Формат вывода: text или jsonl — одна JSON-запись на строку (по умолчанию: text)')
+    args = parser.parse_args()
+
+    columns = tuple(column.strip() for column in args.columns.split(',') if column.strip())
+    list_images(args.db, args.limit, args.offset, args.search, args.after, columns, args.text_mode,
+                args.check_exists, args.output_format)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import json
+import time
+import bisect
+import threading
+import cProfile
+from contextlib import contextmanager, nullcontext
+
+# Границы корзин гистограммы длительности этапов, секунды
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+PREFIX = 'catalog'
+
+# Пока сбор выключен, timer() возвращает один и тот же пустой контекст,
+# а inc() и observe() сразу выходят: накладные расходы — одна проверка флага
+_enabled = False
+_lock = threading.Lock()
+_NULL_TIMER = nullcontext()
+
+class Histogram:
+    """Гистограмма длительностей этапа: корзины BUCKETS, сумма, количество и максимум."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Оценка квантиля по корзинам (верхняя граница корзины)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS + (self.max,), self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+_histograms = {}
+_counters = {}
+
+def enable():
+    """Включает сбор метрик."""
+    global _enabled
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    return _enabled
+
+def reset():
+    """Сбрасывает накопленные значения."""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+def observe(stage, seconds):
+    """Добавляет длительность этапа в его гистограмму."""
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = Histogram()
+        histogram.observe(seconds)
+
+def inc(name, value=1):
+    """Увеличивает счетчик (байты, токены, ошибки и т. п.)."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+@contextmanager
+def _timer(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+def timer(stage):
+    """
+    Контекстный менеджер, измеряющий длительность этапа:
+
+        with metrics.timer('decode'):
+            ...
+    """
+    return _timer(stage) if _enabled else _NULL_TIMER
+
+def summary():
+    """
+    Сводка в виде словаря (для JSON): по каждому этапу количество, суммарное,
+    среднее и максимальное время и оценки p50/p95, и значения счетчиков.
+    """
+    with _lock:
+        stages = {
+            stage: {
+                "count": h.count,
+                "total_seconds": round(h.sum, 6),
+                "mean_seconds": round(h.sum / h.count, 6) if h.count else None,
+                "p50_seconds": h.quantile(0.5),
+                "p95_seconds": h.quantile(0.95),
+                "max_seconds": round(h.max, 6),
+            }
+            for stage, h in sorted(_histograms.items())
+        }
+        return {"stages": stages, "counters": dict(sorted(_counters.items()))}
+
+def to_prometheus():
+    """Метрики в текстовом формате Prometheus."""
+    lines = []
+    with _lock:
+        name = f'{PREFIX}_stage_seconds'
+        lines.append(f'# HELP {name} Длительность этапов обработки')
+        lines.append(f'# TYPE {name} histogram')
+        for stage, h in sorted(_histograms.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, h.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {h.sum}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+        for counter, value in sorted(_counters.items()):
+            lines.append(f'# TYPE {PREFIX}_{counter}_total counter')
+            lines.append(f'{PREFIX}_{counter}_total {value}')
+    return '\n'.join(lines) + '\n'
+
+def write_report(json_path=None, prometheus_path=None):
+    """Сохраняет накопленные метрики в JSON и/или в формате Prometheus."""
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(summary(), f, ensure_ascii=False, indent=2)
+    if prometheus_path:
+        with open(prometheus_path, 'w', encoding='utf-8') as f:
+            f.write(to_prometheus())
+
+def print_summary():
+    """Выводит таблицу этапов: количество, суммарное и среднее время, p95."""
+    data = summary()
+    if not data["stages"] and not data["counters"]:
+        return
+    print("\nМетрики:")
+    for stage, s in data["stages"].items():
+        print(f"  {stage:<20} n={s['count']:<8} всего {s['total_seconds']:.3f} с, "
+              f"среднее {s['mean_seconds'] * 1000:.1f} мс, p95 ≤ {s['p95_seconds'] * 1000:.1f} мс")
+    for counter, value in data["counters"].items():
+        print(f"  {counter:<20} {value}")
+
+def add_arguments(parser):
+    """Добавляет в argparse флаги сбора метрик и профилирования."""
+    parser.add_argument('--metrics', action='store_true',
+                        help='Собирать время этапов и счетчики и вывести сводку в конце')
+    parser.add_argument('--metrics-json', help='Сохранить метрики в JSON-файл (включает --metrics)')
+    parser.add_argument('--metrics-prom', help='Сохранить метрики в формате Prometheus (включает --metrics)')
+    parser.add_argument('--profile', help='Профилировать запуск через cProfile и сохранить статистику в файл')
+
+@contextmanager
+def from_args(args):
+    """
+    Включает метрики и профилировщик по флагам add_arguments и сохраняет
+    результаты по выходе из блока (в том числе при ошибке или Ctrl+C).
+    """
+    if args.metrics or args.metrics_json or args.metrics_prom:
+        enable()
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"Профиль сохранен в {args.profile} (python -m pstats {args.profile})")
+        if _enabled:
+            print_summary()
+            write_report(args.metrics_json, args.metrics_prom)
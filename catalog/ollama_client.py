@@ -0,0 +1,211 @@
+import time
+import json
+import random
+import logging
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from . import metrics
+
+# Параметры по умолчанию
+OLLAMA_URL = "http://localhost:11434"
+CONNECT_TIMEOUT = 5          # Таймаут подключения, секунды
+READ_TIMEOUT = 300           # Таймаут ожидания ответа, секунды
+MAX_RETRIES = 3              # Количество повторов после ошибки
+BACKOFF_BASE = 1.0           # Базовая задержка экспоненциального повтора, секунды
+BACKOFF_MAX = 30.0           # Максимальная задержка между повторами, секунды
+MIN_CONCURRENCY = 1          # Нижняя граница лимита одновременных запросов
+MAX_CONCURRENCY = 8          # Верхняя граница лимита одновременных запросов
+LATENCY_TOLERANCE = 2.0      # Во сколько раз задержка может превысить лучшую до снижения лимита
+
+def create_session(pool_size: int = 4) -> requests.Session:
+    """
+    Создает HTTP-сессию с пулом keep-alive соединений к Ollama.
+
+    Args:
+        pool_size (int): Максимальное количество одновременных соединений
+
+    Returns:
+        requests.Session: Сессия для повторного использования между запросами
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+class AdaptiveLimiter:
+    """
+    Адаптивный лимит одновременных запросов (AIMD).
+
+    Каждый успешный запрос увеличивает лимит примерно на 1 за "окно" из limit
+    запросов (аддитивный рост). Ошибка, таймаут или задержка, заметно превышающая
+    лучшую наблюдавшуюся, уменьшает лимит вдвое (мультипликативное снижение).
+    """
+
+    def __init__(self, initial=MIN_CONCURRENCY, min_limit=MIN_CONCURRENCY, max_limit=MAX_CONCURRENCY,
+                 latency_tolerance=LATENCY_TOLERANCE):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.in_flight = 0
+        self.best_latency = None
+        self._cond = threading.Condition()
+
+    def try_acquire(self):
+        with self._cond:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency=None, error=False):
+        with self._cond:
+            self.in_flight -= 1
+            if error:
+                self.limit = max(self.min_limit, self.limit / 2)
+            elif latency is not None:
+                if self.best_latency is None or latency < self.best_latency:
+                    self.best_latency = latency
+                if latency > self.best_latency * self.latency_tolerance:
+                    self.limit = max(self.min_limit, self.limit / 2)
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    @property
+    def free(self):
+        return int(self.limit) - self.in_flight
+
+class OllamaEndpoint:
+    """Один сервер Ollama со своим пулом соединений и лимитом."""
+
+    def __init__(self, url, max_concurrency=MAX_CONCURRENCY):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.netloc:
+            raise ValueError(f"Некорректный адрес Ollama: {url} (ожидается http://хост:порт)")
+        self.url = url.rstrip('/')
+        self.session = create_session(pool_size=max_concurrency)
+        self.limiter = AdaptiveLimiter(max_limit=max_concurrency)
+        self.requests = 0
+        self.errors = 0
+
+    def close(self):
+        self.session.close()
+
+class OllamaClient:
+    """
+    Клиент Ollama API: keep-alive соединения, таймауты, повторы с экспоненциальной
+    задержкой и адаптивный лимит одновременных запросов на каждый сервер.
+
+    Запросы распределяются между несколькими серверами: выбирается тот,
+    у которого больше свободных слотов.
+    """
+
+    def __init__(self, urls=None, max_concurrency=MAX_CONCURRENCY, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE):
+        self.endpoints = [OllamaEndpoint(url, max_concurrency) for url in (urls or [OLLAMA_URL])]
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._cond = threading.Condition()
+
+    def _acquire_endpoint(self, exclude=None):
+        """Ждет свободный слот и возвращает сервер с наибольшим запасом."""
+        with self._cond:
+            while True:
+                candidates = [e for e in self.endpoints if e is not exclude] or self.endpoints
+                for endpoint in sorted(candidates, key=lambda e: e.limiter.free, reverse=True):
+                    if endpoint.limiter.try_acquire():
+                        return endpoint
+                self._cond.wait(timeout=0.1)
+
+    def _release_endpoint(self, endpoint, latency=None, error=False):
+        endpoint.limiter.release(latency, error)
+        with self._cond:
+            self._cond.notify_all()
+
+    def _backoff(self, attempt):
+        """Экспоненциальная задержка со случайным разбросом."""
+        delay = min(BACKOFF_MAX, self.backoff_base * (2 ** attempt))
+        time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def post(self, path, payload):
+        """
+        Отправляет запрос к Ollama с повторами.
+
+        Ошибки соединения, таймауты и ответы 5xx/429 повторяются на другом сервере
+        (если он есть); остальные ошибки пробрасываются сразу. Слот лимита
+        освобождается при любой ошибке.
+        """
+        last_endpoint = None
+        # Размер тела считается отдельной сериализацией, поэтому только при включенных метриках
+        payload_bytes = len(json.dumps(payload)) if metrics.is_enabled() else 0
+        for attempt in range(self.max_retries + 1):
+            endpoint = self._acquire_endpoint(exclude=last_endpoint)
+            started = time.monotonic()
+            try:
+                endpoint.requests += 1
+                metrics.inc('ollama_requests')
+                metrics.inc('ollama_bytes_sent', payload_bytes)
+                response = endpoint.session.post(f"{endpoint.url}{path}", json=payload, timeout=self.timeout)
+                if response.status_code == 429 or response.status_code >= 500:
+                    response.raise_for_status()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.HTTPError) as e:
+                endpoint.errors += 1
+                metrics.inc('ollama_errors')
+                self._release_endpoint(endpoint, error=True)
+                last_endpoint = endpoint
+                if attempt == self.max_retries:
+                    raise
+                logging.warning(f"Ошибка запроса к {endpoint.url} (попытка {attempt + 1}): {str(e)}")
+                metrics.inc('ollama_retries')
+                self._backoff(attempt)
+                continue
+            except Exception:
+                # Неповторяемые ошибки (неверный URL, оборванный ответ): без освобождения
+                # слота лимит 1 заблокировал бы все следующие запросы к серверу
+                endpoint.errors += 1
+                metrics.inc('ollama_errors')
+                self._release_endpoint(endpoint, error=True)
+                raise
+            latency = time.monotonic() - started
+            self._release_endpoint(endpoint, latency=latency)
+            metrics.observe('ollama_request', latency)
+            response.raise_for_status()
+            return response.json()
+
+    def generate(self, model, prompt, images=None):
+        """Генерация ответа через /api/generate без потоковой передачи."""
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": False
+        }
+        if images:
+            payload["images"] = images
+        result = self.post("/api/generate", payload)
+        # Ollama сообщает количество токенов запроса и ответа
+        metrics.inc('prompt_tokens', result.get("prompt_eval_count", 0))
+        metrics.inc('tokens_generated', result.get("eval_count", 0))
+        return result["response"]
+
+    def stats(self):
+        """Текущее состояние серверов: лимит, запросы в работе, счетчики."""
+        return [
+            {
+                "url": endpoint.url,
+                "limit": endpoint.limiter.limit,
+                "in_flight": endpoint.limiter.in_flight,
+                "requests": endpoint.requests,
+                "errors": endpoint.errors,
+            }
+            for endpoint in self.endpoints
+        ]
+
+    def close(self):
+        for endpoint in self.endpoints:
+            endpoint.close()
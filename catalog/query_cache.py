@@ -0,0 +1,146 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from .sharded_index import MANIFEST_SUFFIX
+
+# Константы
+EMBEDDING_CACHE_SIZE = 10000             # Максимальное количество эмбеддингов запросов в памяти
+EMBEDDING_CACHE_PATH = 'query_cache.npz'  # Файл для сохранения кэша между запусками
+RESULT_CACHE_SIZE = 1000                 # Максимальное количество закэшированных результатов
+RESULT_CACHE_TTL = 60                    # Время жизни результата в секундах
+
+def normalize_query(query):
+    """Нормализует текст запроса: регистр и лишние пробелы не влияют на ключ кэша."""
+    return ' '.join(query.lower().split())
+
+def index_generation(index_path):
+    """
+    Поколение файла индекса: меняется при каждой перезаписи файла.
+    Для шардированного индекса берется файл описания шардов, который
+    перезаписывается последним.
+    """
+    manifest = index_path + MANIFEST_SUFFIX
+    if os.path.exists(manifest):
+        index_path = manifest
+    try:
+        stat = os.stat(index_path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+class EmbeddingCache:
+    """
+    LRU-кэш эмбеддингов запросов с ключом (модель, нормализованный текст).
+
+    Может сохраняться на диск, чтобы повторные запросы из командной строки
+    не требовали прогона модели.
+    """
+
+    def __init__(self, model_name, maxsize=EMBEDDING_CACHE_SIZE, path=None):
+        self.model_name = model_name
+        self.maxsize = maxsize
+        self.path = path
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        if path and os.path.exists(path):
+            self.load()
+
+    def get(self, query):
+        key = (self.model_name, normalize_query(query))
+        with self._lock:
+            embedding = self._data.get(key)
+            if embedding is not None:
+                self._data.move_to_end(key)
+            return embedding
+
+    def put(self, query, embedding):
+        key = (self.model_name, normalize_query(query))
+        with self._lock:
+            self._data[key] = np.asarray(embedding, dtype=np.float32)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            self._dirty = True
+
+    def encode(self, queries, model):
+        """Возвращает эмбеддинги запросов, прогоняя через модель только отсутствующие в кэше."""
+        embeddings = [self.get(query) for query in queries]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            encoded = model.encode([queries[i] for i in missing])
+            for i, embedding in zip(missing, encoded):
+                self.put(queries[i], embedding)
+                embeddings[i] = np.asarray(embedding, dtype=np.float32)
+        return np.vstack(embeddings)
+
+    def load(self):
+        """Загружает кэш из файла, пропуская записи другой модели."""
+        with np.load(self.path, allow_pickle=False) as data:
+            models, texts, vectors = data['models'], data['texts'], data['vectors']
+        with self._lock:
+            for model_name, text, vector in zip(models, texts, vectors):
+                if model_name == self.model_name:
+                    self._data[(str(model_name), str(text))] = vector
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def save(self):
+        """Атомарно сохраняет кэш в файл, если он изменился."""
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            if not self._data:
+                return
+            keys = list(self._data)
+            vectors = np.vstack(list(self._data.values()))
+            self._dirty = False
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez(tmp_path,
+                 models=np.array([model_name for model_name, _ in keys]),
+                 texts=np.array([text for _, text in keys]),
+                 vectors=vectors)
+        os.replace(tmp_path, self.path)
+
+class ResultCache:
+    """
+    Кэш результатов поиска с коротким временем жизни.
+
+    Владелец индекса вызывает clear() при его подмене: проверка файла индекса
+    здесь не помогла бы — пока индекс в памяти не перезагружен, кэш заполнялся
+    бы результатами старого индекса уже под новым поколением файла.
+    """
+
+    def __init__(self, ttl=RESULT_CACHE_TTL, maxsize=RESULT_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Сбрасывает все записи (индекс заменен)."""
+        with self._lock:
+            self._data.clear()
+
+    def get(self, query, k):
+        key = (normalize_query(query), k)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            stored_at, result = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return result
+
+    def put(self, query, k, result):
+        key = (normalize_query(query), k)
+        with self._lock:
+            self._data[key] = (time.monotonic(), result)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
@@ -0,0 +1,202 @@
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from . import metrics
+from .query_cache import normalize_query
+
+# Константы
+CROSS_ENCODER_MODEL = 'cross-encoder/mmarco-mMiniLMv2-L12-H384-v1'  # Многоязычный: описания на русском
+CANDIDATES = 200             # Кандидатов первого этапа для переранжирования
+RERANK_BATCH_SIZE = 32       # Пар (запрос, описание) в одном вызове модели
+TIME_BUDGET_MS = 500         # Бюджет времени переранжирования на запрос
+SCORE_CACHE_SIZE = 100000    # Оценок (запрос, изображение) в памяти
+CHUNK_CACHE_SIZE = 20000     # Описаний с эмбеддингами фрагментов в памяти
+MAX_CHUNK_CHARS = 400        # Максимальная длина фрагмента описания для maxsim
+
+RERANKERS = ('cross-encoder', 'maxsim')
+
+def description_hash(description):
+    """Хеш описания: оценка из кэша действительна, пока описание не изменилось."""
+    return hashlib.sha1((description or '').encode('utf-8')).hexdigest()
+
+def split_chunks(description, max_chars=MAX_CHUNK_CHARS):
+    """
+    Делит описание на фрагменты по строкам и предложениям.
+
+    Описания LLM структурированы по аспектам (объекты, цвет, композиция...),
+    и каждый аспект оценивается отдельно, а не растворяется в одном векторе.
+    Короткие соседние предложения объединяются до max_chars символов.
+    """
+    sentences = []
+    for line in (description or '').splitlines():
+        sentences.extend(part.strip() for part in re.split(r'(?<=[.!?])\s+', line) if part.strip())
+    chunks = []
+    for sentence in sentences:
+        if chunks and len(chunks[-1]) + len(sentence) + 1 <= max_chars:
+            chunks[-1] += ' ' + sentence
+        else:
+            chunks.append(sentence[:max_chars])
+    return chunks or ['']
+
+class _LRU:
+    """Потокобезопасный LRU-словарь."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+class ScoreCache(_LRU):
+    """
+    LRU-кэш оценок переранжирования с ключом (модель, нормализованный запрос,
+    изображение, хеш описания).
+    """
+
+    def __init__(self, maxsize=SCORE_CACHE_SIZE):
+        super().__init__(maxsize)
+
+    def get_score(self, scorer_name, query, image_id, desc_hash):
+        return self.get((scorer_name, normalize_query(query), image_id, desc_hash))
+
+    def put_score(self, scorer_name, query, image_id, desc_hash, score):
+        self.put((scorer_name, normalize_query(query), image_id, desc_hash), score)
+
+class CrossEncoderScorer:
+    """Оценка пар (запрос, описание) кросс-энкодером: модель видит запрос и текст вместе."""
+
+    def __init__(self, model_name=CROSS_ENCODER_MODEL):
+        # Импорт здесь: кросс-энкодер нужен только при переранжировании
+        from sentence_transformers import CrossEncoder
+        self.name = f'cross-encoder:{model_name}'
+        self.model = CrossEncoder(model_name)
+
+    def score(self, query, descriptions):
+        return self.model.predict([(query, description) for description in descriptions],
+                                  batch_size=len(descriptions), show_progress_bar=False)
+
+class ChunkMaxSimScorer:
+    """
+    Оценка по фрагментам: описание делится на фрагменты, каждый кодируется
+    той же моделью, что и индекс, и оценка — наибольшее косинусное сходство
+    запроса с фрагментом. Эмбеддинги фрагментов кэшируются по хешу описания,
+    поэтому повторно кодируются только новые кандидаты.
+    """
+
+    def __init__(self, model, model_name, cache_size=CHUNK_CACHE_SIZE):
+        self.name = f'maxsim:{model_name}'
+        self.model = model
+        self._chunks = _LRU(cache_size)
+
+    def _normalized(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def score(self, query, descriptions):
+        hashes = [description_hash(description) for description in descriptions]
+        chunk_vectors = {}
+        missing = {}
+        for h, description in zip(hashes, descriptions):
+            if h in chunk_vectors or h in missing:
+                continue
+            cached = self._chunks.get(h)
+            if cached is not None:
+                chunk_vectors[h] = cached
+            else:
+                missing[h] = split_chunks(description)
+        if missing:
+            # Фрагменты всех новых описаний пачки — одним вызовом модели
+            texts = [chunk for chunks in missing.values() for chunk in chunks]
+            vectors = self._normalized(self.model.encode(texts, show_progress_bar=False))
+            start = 0
+            for h, chunks in missing.items():
+                chunk_vectors[h] = vectors[start:start + len(chunks)]
+                self._chunks.put(h, chunk_vectors[h])
+                start += len(chunks)
+        query_vector = self._normalized(self.model.encode([query], show_progress_bar=False))[0]
+        return [float(np.max(chunk_vectors[h] @ query_vector)) for h in hashes]
+
+def make_scorer(kind, model=None, model_name=None, cross_encoder_model=CROSS_ENCODER_MODEL):
+    """
+    Создает оценщик второго этапа.
+
+    Args:
+        kind (str): 'cross-encoder' или 'maxsim'
+        model: Модель эмбеддингов первого этапа (для maxsim)
+        model_name (str): Имя модели эмбеддингов (для ключа кэша)
+        cross_encoder_model (str): Имя модели кросс-энкодера
+    """
+    if kind == 'cross-encoder':
+        return CrossEncoderScorer(cross_encoder_model)
+    if kind == 'maxsim':
+        return ChunkMaxSimScorer(model, model_name)
+    raise ValueError(f"Неизвестный способ переранжирования: {kind}")
+
+def rerank(query, candidates, scorer, time_budget_ms=TIME_BUDGET_MS, batch_size=RERANK_BATCH_SIZE, cache=None):
+    """
+    Переранжирует кандидатов первого этапа.
+
+    Оценки берутся из кэша, остальные вычисляются пачками по batch_size в порядке
+    первого этапа. Перед каждой пачкой проверяется бюджет: если следующая пачка
+    (по времени предыдущей) в него не укладывается, возвращается порядок первого
+    этапа. Уже вычисленные оценки остаются в кэше, и повтор запроса уложится в бюджет.
+
+    Args:
+        query (str): Текст запроса
+        candidates (list): Словари с id и description в порядке первого этапа
+        scorer: Оценщик с атрибутом name и методом score(query, descriptions)
+        time_budget_ms (float): Бюджет времени, миллисекунды
+        batch_size (int): Размер пачки модели
+        cache (ScoreCache): Кэш оценок
+
+    Returns:
+        list: Кандидаты (копии) с полем rerank_score, по убыванию оценки;
+              при превышении бюджета — в исходном порядке с rerank_score None
+    """
+    deadline = time.perf_counter() + time_budget_ms / 1000
+    hashes = [description_hash(candidate['description']) for candidate in candidates]
+    scores = {}
+    pending = []
+    for i, candidate in enumerate(candidates):
+        cached = cache.get_score(scorer.name, query, candidate['id'], hashes[i]) if cache is not None else None
+        if cached is not None:
+            scores[i] = cached
+        else:
+            pending.append(i)
+    metrics.inc('rerank_cache_hits', len(scores))
+
+    last_batch = 0.0
+    for start in range(0, len(pending), batch_size):
+        started = time.perf_counter()
+        if started + last_batch > deadline:
+            metrics.inc('rerank_timeouts')
+            return [dict(candidate, rerank_score=None) for candidate in candidates]
+        batch = pending[start:start + batch_size]
+        with metrics.timer('rerank_batch'):
+            batch_scores = scorer.score(query, [candidates[i]['description'] or '' for i in batch])
+        last_batch = time.perf_counter() - started
+        for i, score in zip(batch, batch_scores):
+            scores[i] = float(score)
+            if cache is not None:
+                cache.put_score(scorer.name, query, candidates[i]['id'], hashes[i], scores[i])
+        metrics.inc('rerank_pairs_scored', len(batch))
+
+    order = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)
+    return [dict(candidates[i], rerank_score=scores[i]) for i in order]
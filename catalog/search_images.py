@@ -0,0 +1,328 @@
+from . import catalog_db
+import sys
+import os
+import argparse
+import requests
+from .create_faiss_index import set_search_params, search_ids, prepare_vectors, similarity
+from .sharded_index import ShardedIndex, open_index, manifest_path
+from .query_cache import EmbeddingCache, EMBEDDING_CACHE_PATH
+from .image_hashes import collapse_near_duplicates, NEAR_DUPLICATE_DISTANCE
+from .rerank import rerank, make_scorer, RERANKERS, CANDIDATES, TIME_BUDGET_MS, CROSS_ENCODER_MODEL
+from . import metrics
+
+# faiss и sentence_transformers импортируются внутри функций: поиску через сервер
+# (search_remote) они не нужны, а одна загрузка torch занимает несколько секунд
+
+# Константы
+DB_PATH = 'images.db'
+INDEX_PATH = 'image_index.faiss'
+MODEL_NAME = 'all-MiniLM-L6-v2'
+SERVER_URL = 'http://127.0.0.1:8765'  # Адрес сервера поиска (python -m catalog serve)
+COLLAPSE_FACTOR = 3  # Во сколько раз больше результатов запрашивать при схлопывании почти-дубликатов
+LOOKUP_CHUNK_SIZE = 500  # Идентификаторов в одном запросе WHERE id IN (...)
+
+def load_index(mmap=False):
+    """
+    Загружает FAISS индекс (шардированный, если он был построен с --shards).
+    
+    С mmap=True индекс отображается в память из файла, а не читается целиком.
+    """
+    if not os.path.exists(INDEX_PATH) and not os.path.exists(manifest_path(INDEX_PATH)):
+        raise FileNotFoundError(f"Индекс не найден: {INDEX_PATH}")
+    index = open_index(INDEX_PATH, mmap)
+    check_id_mapping(index)
+    return index
+
+def check_id_mapping(index):
+    """
+    Проверяет, что индекс хранит векторы под идентификаторами images.id.
+    
+    Старые индексы без IndexIDMap возвращают позиции 0..N-1, которые не совпадают
+    с images.id (нумерация с 1, пропуски после удалений); такие результаты
+    были бы сопоставлены не тем изображениям, поэтому индекс отвергается.
+    """
+    import faiss
+    shards = index.shards if isinstance(index, ShardedIndex) else [index]
+    for shard in shards:
+        if not isinstance(shard, (faiss.IndexIDMap, faiss.IndexIVF)):
+            raise ValueError("Индекс построен без идентификаторов изображений, "
+                             "перестройте его: python -m catalog build-index")
+
+def load_model():
+    """Загружает модель для создания эмбеддингов."""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(MODEL_NAME)
+
+def encode_queries(queries, model, cache=None):
+    """Создает эмбеддинги запросов, используя кэш, если он передан."""
+    with metrics.timer('query_embed'):
+        if cache is not None:
+            return cache.encode(list(queries), model)
+        return model.encode(list(queries))
+
+def search_similar(query, index, model, k=5, cache=None, ids=None):
+    """
+    Ищет похожие изображения по текстовому запросу.
+    
+    Если передан список ids, поиск ведется только среди этих изображений:
+    фильтр применяется внутри FAISS, поэтому возвращается полный top-k.
+    """
+    # Создаем эмбеддинг для запроса
+    query_embedding = prepare_vectors(encode_queries([query], model, cache), index.metric_type)
+    
+    # Ищем ближайших соседей
+    with metrics.timer('faiss_search'):
+        if ids is None:
+            distances, indices = index.search(query_embedding, k)
+        else:
+            distances, indices = search_ids(index, query_embedding, k, ids)
+    
+    return distances[0], indices[0]
+
+def find_ids_by_metadata(date_from=None, date_to=None, camera=None, lens=None,
+                         bbox=None, image_format=None, conn=None):
+    """
+    Находит изображения, подходящие под фильтры по метаданным, используя индексы SQLite.
+    
+    Args:
+        date_from (str): Начало периода съемки (ISO 8601, например 2021-01-01)
+        date_to (str): Конец периода съемки (ISO 8601, включительно)
+        camera (str): Подстрока производителя или модели камеры
+        lens (str): Подстрока модели объектива
+        bbox (tuple): Область (мин. широта, мин. долгота, макс. широта, макс. долгота)
+        image_format (str): Формат файла (JPEG, PNG, ...)
+        conn (sqlite3.Connection): Соединение с базой данных
+        
+    Returns:
+        list: Идентификаторы изображений или None, если ни один фильтр не задан
+    """
+    conditions = []
+    params = []
+    if date_from:
+        conditions.append('taken_at >= ?')
+        params.append(date_from)
+    if date_to:
+        # Дата без времени включает весь день
+        conditions.append('taken_at <= ?')
+        params.append(date_to if 'T' in date_to else f'{date_to}T23:59:59')
+    if camera:
+        conditions.append("(camera_make LIKE ? OR camera_model LIKE ? OR camera_make || ' ' || camera_model LIKE ?)")
+        params.extend([f'%{camera}%'] * 3)
+    if lens:
+        conditions.append('lens_model LIKE ?')
+        params.append(f'%{lens}%')
+    if bbox:
+        min_lat, min_lon, max_lat, max_lon = bbox
+        conditions.append('gps_lat BETWEEN ? AND ? AND gps_lon BETWEEN ? AND ?')
+        params.extend([min_lat, max_lat, min_lon, max_lon])
+    if image_format:
+        conditions.append('format = ?')
+        params.append(image_format.upper())
+    if not conditions:
+        return None
+    
+    own_conn = conn is None
+    if own_conn:
+        conn = catalog_db.connect(DB_PATH, readonly=True)
+    c = conn.cursor()
+    c.execute(f'SELECT id FROM images WHERE {" AND ".join(conditions)}', params)
+    ids = [row[0] for row in c.fetchall()]
+    if own_conn:
+        conn.close()
+    return ids
+
+def search_batch(queries, index, model, k=5, cache=None):
+    """Ищет похожие изображения сразу для нескольких запросов одним вызовом модели и индекса."""
+    query_embeddings = prepare_vectors(encode_queries(queries, model, cache), index.metric_type)
+    with metrics.timer('faiss_search'):
+        return index.search(query_embeddings, k)
+
+def get_image_info(image_ids, conn=None):
+    """
+    Получает информацию об изображениях из базы данных.
+    
+    Строки возвращаются в порядке image_ids (WHERE id IN (...) порядок не сохраняет).
+    Отрицательные идентификаторы — заполнение FAISS, когда k больше числа векторов, —
+    и изображения, удаленные из базы после построения индекса, пропускаются.
+    
+    Returns:
+        list: Кортежи (id, file_path, description)
+    """
+    ids = [int(image_id) for image_id in image_ids if image_id >= 0]
+    unique_ids = list(dict.fromkeys(ids))
+    
+    own_conn = conn is None
+    if own_conn:
+        conn = catalog_db.connect(DB_PATH, readonly=True)
+    c = conn.cursor()
+    
+    rows = {}
+    for start in range(0, len(unique_ids), LOOKUP_CHUNK_SIZE):
+        chunk = unique_ids[start:start + LOOKUP_CHUNK_SIZE]
+        placeholders = ','.join('?' * len(chunk))
+        c.execute(f'SELECT id, file_path, description FROM images WHERE id IN ({placeholders})', chunk)
+        rows.update((row[0], row) for row in c.fetchall())
+    if own_conn:
+        conn.close()
+    
+    return [rows[image_id] for image_id in ids if image_id in rows]
+
+def rank_results(distances, indices, lookup=get_image_info, metric_type=None):
+    """
+    Сопоставляет результаты FAISS со строками базы в порядке ранга.
+    
+    Args:
+        distances: Расстояния одного запроса
+        indices: Идентификаторы одного запроса (-1 для пустых позиций)
+        lookup (callable): Функция получения строк по списку id
+        metric_type (int): Метрика индекса; для косинусной добавляется сходство
+        
+    Returns:
+        list: Словари с distance, similarity (None для L2), id, file_path и description
+    """
+    pairs = [(float(distance), int(image_id)) for distance, image_id in zip(distances, indices) if image_id >= 0]
+    rows = {row[0]: row for row in lookup([image_id for _, image_id in pairs])}
+    return [
+        {"distance": distance, "similarity": similarity(distance, metric_type), "id": image_id,
+         "file_path": rows[image_id][1], "description": rows[image_id][2]}
+        for distance, image_id in pairs if image_id in rows
+    ]
+
+def search_remote(query, k=5, server_url=SERVER_URL, filters=None, rerank_params=None):
+    """
+    Выполняет поиск через запущенный сервер поиска.
+    
+    Returns:
+        list: Результаты в виде словарей или None, если сервер недоступен
+    """
+    params = {"q": query, "k": k, **(rerank_params or {})}
+    for name, value in (filters or {}).items():
+        if value is not None:
+            params[name] = ','.join(map(str, value)) if name == 'bbox' else value
+    try:
+        response = requests.get(f"{server_url}/search", params=params, timeout=(0.2, 30))
+    except requests.exceptions.ConnectionError:
+        return None
+    response.raise_for_status()
+    return response.json()["results"]
+
+def search_local(query, k=5, nprobe=None, ef_search=None, use_cache=True, filters=None, mmap=False,
+                 reranker=None, candidates=CANDIDATES, rerank_budget_ms=TIME_BUDGET_MS,
+                 cross_encoder_model=CROSS_ENCODER_MODEL):
+    """
+    Выполняет поиск в текущем процессе, загружая индекс и модель.
+    
+    С reranker ('cross-encoder' или 'maxsim') поиск двухэтапный: из индекса берется
+    candidates кандидатов, и они переранжируются за rerank_budget_ms миллисекунд
+    (при превышении бюджета остается порядок индекса).
+    """
+    ids = find_ids_by_metadata(**(filters or {}))
+    if ids is not None and not ids:
+        return []
+    
+    print("Загрузка индекса...")
+    index = load_index(mmap)
+    set_search_params(index, nprobe, ef_search)
+    
+    cache = EmbeddingCache(MODEL_NAME, path=EMBEDDING_CACHE_PATH) if use_cache else None
+    
+    # Модель нужна только если эмбеддинга запроса нет в кэше или она оценивает фрагменты описаний
+    model = None
+    if cache is None or cache.get(query) is None or reranker == 'maxsim':
+        print("Загрузка модели...")
+        model = load_model()
+    
+    stage_k = max(k, candidates) if reranker else k
+    distances, indices = search_similar(query, index, model, stage_k, cache, ids)
+    if cache is not None:
+        cache.save()
+    results = rank_results(distances, indices, metric_type=index.metric_type)
+    if reranker:
+        scorer = make_scorer(reranker, model, MODEL_NAME, cross_encoder_model)
+        results = rerank(query, results, scorer, rerank_budget_ms)[:k]
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Семантический поиск изображений по текстовому запросу.')
+    parser.add_argument('query', nargs='+', help='Текстовый запрос')
+    parser.add_argument('-k', type=int, default=5, help='Количество результатов (по умолчанию: 5)')
+    parser.add_argument('--nprobe', type=int, help='Количество просматриваемых кластеров для IVF индексов')
+    parser.add_argument('--ef-search', type=int, help='Параметр efSearch для HNSW индексов')
+    parser.add_argument('--server', default=SERVER_URL, help=f'Адрес сервера поиска (по умолчанию: {SERVER_URL})')
+    parser.add_argument('--local', action='store_true', help='Не обращаться к серверу, искать в текущем процессе')
+    parser.add_argument('--no-cache', action='store_true', help='Не использовать кэш эмбеддингов запросов')
+    parser.add_argument('--mmap', action='store_true', help='Отображать индекс в память вместо полной загрузки')
+    parser.add_argument('--date-from', help='Снято не раньше даты (ГГГГ-ММ-ДД)')
+    parser.add_argument('--date-to', help='Снято не позже даты (ГГГГ-ММ-ДД)')
+    parser.add_argument('--camera', help='Производитель или модель камеры (подстрока)')
+    parser.add_argument('--lens', help='Модель объектива (подстрока)')
+    parser.add_argument('--bbox', type=float, nargs=4, metavar=('MIN_LAT', 'MIN_LON', 'MAX_LAT', 'MAX_LON'),
+                        help='Область съемки по GPS-координатам')
+    parser.add_argument('--format', help='Формат файла (JPEG, PNG, ...)')
+    parser.add_argument('--collapse-duplicates', type=int, nargs='?', const=NEAR_DUPLICATE_DISTANCE,
+                        metavar='DISTANCE',
+                        help=f'Схлопывать почти-дубликаты (порог расстояния Хэмминга, по умолчанию: {NEAR_DUPLICATE_DISTANCE})')
+    parser.add_argument('--rerank', choices=RERANKERS,
+                        help='Двухэтапный поиск: переранжировать кандидатов кросс-энкодером (cross-encoder) '
+                             'или по лучшему фрагменту описания (maxsim)')
+    parser.add_argument('--candidates', type=int, default=CANDIDATES,
+                        help=f'Кандидатов первого этапа для переранжирования (по умолчанию: {CANDIDATES})')
+    parser.add_argument('--rerank-budget-ms', type=float, default=TIME_BUDGET_MS,
+                        help=f'Бюджет времени переранжирования в мс; при превышении остается порядок '
+                             f'первого этапа (по умолчанию: {TIME_BUDGET_MS})')
+    parser.add_argument('--cross-encoder-model', default=CROSS_ENCODER_MODEL,
+                        help=f'Модель кросс-энкодера (по умолчанию: {CROSS_ENCODER_MODEL})')
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    
+    query = ' '.join(args.query)
+    filters = {
+        "date_from": args.date_from,
+        "date_to": args.date_to,
+        "camera": args.camera,
+        "lens": args.lens,
+        "bbox": args.bbox,
+        "image_format": args.format,
+    }
+    
+    try:
+        with metrics.from_args(args):
+            print(f"Поиск похожих изображений для запроса: '{query}'")
+            # При схлопывании почти-дубликатов запрашиваем больше результатов, чтобы после него осталось k
+            k = args.k * COLLAPSE_FACTOR if args.collapse_duplicates is not None else args.k
+            rerank_params = None
+            if args.rerank:
+                rerank_params = {"rerank": args.rerank, "candidates": args.candidates,
+                                 "budget_ms": args.rerank_budget_ms}
+            results = None
+            if not args.local:
+                results = search_remote(query, k, args.server, filters, rerank_params)
+            if results is None:
+                results = search_local(query, k, args.nprobe, args.ef_search, not args.no_cache, filters, args.mmap,
+                                       args.rerank, args.candidates, args.rerank_budget_ms, args.cross_encoder_model)
+            if args.collapse_duplicates is not None:
+                results = collapse_near_duplicates(results, args.collapse_duplicates)[:args.k]
+        
+            print("\nРезультаты поиска:")
+            if args.rerank and results and results[0].get('rerank_score') is None:
+                print("Переранжирование не уложилось в бюджет времени, порядок первого этапа")
+            print("-" * 80)
+        
+            for result in results:
+                if result.get('similarity') is not None:
+                    print(f"\nСходство: {result['similarity']:.4f}")
+                else:
+                    print(f"\nРасстояние: {result['distance']:.4f}")
+                if result.get('rerank_score') is not None:
+                    print(f"Оценка переранжирования: {result['rerank_score']:.4f}")
+                print(f"ID: {result['id']}")
+                print(f"Путь: {result['file_path']}")
+                print(f"Описание: {result['description']}")  # Выводим полное описание
+                print("-" * 80)
+            
+    except Exception as e:
+        print(f"Ошибка: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main() 
\ No newline at end of file
@@ -0,0 +1,412 @@
+import argparse
+import asyncio
+import math
+import queue
+import re
+from datetime import datetime
+from . import catalog_db
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query, HTTPException, Response
+from fastapi.responses import PlainTextResponse
+from PIL import Image
+import uvicorn
+from .search_images import (DB_PATH, INDEX_PATH, MODEL_NAME, load_index, load_model, search_batch,
+                            search_similar, get_image_info, find_ids_by_metadata, rank_results)
+from .create_faiss_index import set_search_params
+from .query_cache import EmbeddingCache, ResultCache, EMBEDDING_CACHE_PATH, RESULT_CACHE_TTL, index_generation
+from .hybrid_search import hybrid_search, FTS_WEIGHT, VECTOR_WEIGHT
+from .derivative_cache import DerivativeCache, CACHE_DIR, MAX_CACHE_BYTES, THUMBNAIL_SIZES, thumbnail_format
+from .rerank import rerank, make_scorer, ScoreCache, RERANKERS, CANDIDATES, TIME_BUDGET_MS, CROSS_ENCODER_MODEL
+from . import metrics
+
+# Константы
+HOST = '127.0.0.1'
+PORT = 8765
+MAX_BATCH_SIZE = 32     # Максимальное количество запросов в одном вызове модели
+MAX_WAIT_MS = 5         # Сколько ждать остальные запросы пачки после первого
+DB_POOL_SIZE = 4        # Количество соединений с базой данных
+RELOAD_INTERVAL = 5     # Как часто проверять, не перезаписан ли файл индекса, секунды
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}(T\d{2}:\d{2}(:\d{2})?)?$')  # Формат дат фильтров
+
+class ConnectionPool:
+    """Пул соединений SQLite только для чтения."""
+
+    def __init__(self, db_path=DB_PATH, size=DB_POOL_SIZE):
+        self._pool = queue.Queue()
+        for _ in range(size):
+            conn = catalog_db.connect(db_path, readonly=True, check_same_thread=False)
+            self._pool.put(conn)
+
+    def get_image_info(self, image_ids):
+        conn = self._pool.get()
+        try:
+            return get_image_info(image_ids, conn)
+        finally:
+            self._pool.put(conn)
+
+    def find_ids_by_metadata(self, **filters):
+        conn = self._pool.get()
+        try:
+            return find_ids_by_metadata(conn=conn, **filters)
+        finally:
+            self._pool.put(conn)
+
+    def hybrid_search(self, query, index, model, **kwargs):
+        """Гибридный поиск на соединении из пула вместо новых соединений на каждый запрос."""
+        conn = self._pool.get()
+        try:
+            return hybrid_search(query, index, model, conn=conn, **kwargs)
+        finally:
+            self._pool.put(conn)
+
+    def get_file(self, image_id):
+        """Путь и хеш содержимого изображения или None."""
+        conn = self._pool.get()
+        try:
+            return conn.execute('SELECT file_path, content_hash FROM images WHERE id = ?', (image_id,)).fetchone()
+        finally:
+            self._pool.put(conn)
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get().close()
+
+class SearchService:
+    """
+    Держит модель и индекс в памяти и объединяет одновременные запросы
+    в пачки: один вызов model.encode и index.search на всю пачку.
+
+    Индекс перезагружается, когда create_faiss_index перезаписывает его файл
+    (в том числе при --incremental): новый индекс читается в фоне, а подменяется
+    в потоке модели между пачками, поэтому запрос всегда видит один индекс целиком.
+    """
+
+    def __init__(self, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS,
+                 nprobe=None, ef_search=None, cache_path=EMBEDDING_CACHE_PATH, result_ttl=RESULT_CACHE_TTL,
+                 mmap=False, derivative_cache=None, cross_encoder_model=CROSS_ENCODER_MODEL,
+                 reload_interval=RELOAD_INTERVAL):
+        self.mmap = mmap
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.reload_interval = reload_interval
+        print("Загрузка индекса...")
+        self.generation = index_generation(INDEX_PATH)
+        self.index = self._load_index()
+        print("Загрузка модели...")
+        self.model = load_model()
+        self.db = ConnectionPool()
+        self.embedding_cache = EmbeddingCache(MODEL_NAME, path=cache_path)
+        self.result_cache = ResultCache(ttl=result_ttl)
+        self.derivative_cache = derivative_cache
+        self.cross_encoder_model = cross_encoder_model
+        self.score_cache = ScoreCache()
+        self._scorers = {}
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        # Модель и индекс используются из одного потока, чтобы пачки не конкурировали за CPU
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._queue = None
+        self._worker = None
+        self._watcher = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+        if self.reload_interval > 0:
+            self._watcher = asyncio.create_task(self._watch_index())
+
+    async def stop(self):
+        self._worker.cancel()
+        if self._watcher is not None:
+            self._watcher.cancel()
+        self._executor.shutdown()
+        self.embedding_cache.save()
+        self.db.close()
+        if self.derivative_cache is not None:
+            self.derivative_cache.close()
+
+    def _load_index(self):
+        index = load_index(self.mmap)
+        set_search_params(index, self.nprobe, self.ef_search)
+        return index
+
+    async def _watch_index(self):
+        """Проверяет поколение файла индекса и перезагружает индекс после перестройки."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            generation = index_generation(INDEX_PATH)
+            if generation is None or generation == self.generation:
+                continue
+            try:
+                # Чтение не в потоке модели: пока новый индекс загружается, поиск идет по старому
+                index = await loop.run_in_executor(None, self._load_index)
+            except Exception as e:
+                # Например, перестройка шардов еще не закончена; повтор на следующей проверке
+                print(f"Не удалось перезагрузить индекс: {e}")
+                continue
+            await loop.run_in_executor(self._executor, self._swap_index, index, generation)
+
+    def _swap_index(self, index, generation):
+        """Подменяет индекс; выполняется в потоке модели, между пачками поиска."""
+        self.index = index
+        self.generation = generation
+        # Результаты кэшируются в этом же потоке (_search_batch), поэтому после сброса
+        # в кэш попадают только результаты нового индекса
+        self.result_cache.clear()
+        metrics.inc('index_reloads')
+        print(f"Индекс перезагружен: {index.ntotal} векторов")
+
+    async def search(self, query, k=5):
+        """Ставит запрос в очередь и ждет результата пачки."""
+        cached = self.result_cache.get(query, k)
+        if cached is not None:
+            return cached
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, k, future))
+        return await future
+
+    async def search_filtered(self, query, k, filters):
+        """Поиск с фильтром по метаданным: выполняется вне пачек, со своим набором допустимых id."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._search_filtered, query, k, filters)
+
+    def _search_filtered(self, query, k, filters):
+        ids = self.db.find_ids_by_metadata(**filters)
+        if not ids:
+            return []
+        distances, indices = search_similar(query, self.index, self.model, k, self.embedding_cache, ids)
+        return self._rows(distances, indices)
+
+    def _rows(self, distances, indices):
+        """Сопоставляет результаты FAISS со строками базы, сохраняя порядок."""
+        return rank_results(distances, indices, self.db.get_image_info, self.index.metric_type)
+
+    async def thumbnail(self, image_id, size_name):
+        """Миниатюра изображения из кэша производных; строится из файла, если ее там нет."""
+        loop = asyncio.get_running_loop()
+        # Не в потоке модели: миниатюры не должны задерживать пачки поиска
+        return await loop.run_in_executor(None, self._thumbnail, image_id, size_name)
+
+    def _thumbnail(self, image_id, size_name):
+        row = self.db.get_file(image_id)
+        if row is None or self.derivative_cache is None:
+            return None
+        file_path, content_hash = row
+        if content_hash is None:
+            return None
+        try:
+            return self.derivative_cache.thumbnail(content_hash, size_name, file_path)
+        except OSError:
+            return None
+
+    async def hybrid(self, query, limit=10, offset=0, fts_weight=FTS_WEIGHT, vector_weight=VECTOR_WEIGHT):
+        """Гибридный поиск на уже загруженных модели и индексе."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, lambda: self.db.hybrid_search(query, self.index, self.model, limit=limit, offset=offset,
+                                                          fts_weight=fts_weight, vector_weight=vector_weight,
+                                                          cache=self.embedding_cache))
+
+    async def rerank(self, query, results, kind, budget_ms=TIME_BUDGET_MS):
+        """
+        Переранжирует кандидатов первого этапа в потоке модели. Оценки кэшируются
+        по (запрос, изображение) между запросами; при превышении бюджета
+        возвращается порядок первого этапа.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._rerank, query, results, kind, budget_ms)
+
+    def _rerank(self, query, results, kind, budget_ms):
+        scorer = self._scorers.get(kind)
+        if scorer is None:
+            # Кросс-энкодер загружается при первом запросе с переранжированием
+            scorer = self._scorers[kind] = make_scorer(kind, self.model, MODEL_NAME, self.cross_encoder_model)
+        return rerank(query, results, scorer, budget_ms, cache=self.score_cache)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                results = await loop.run_in_executor(self._executor, self._search_batch, batch)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def _search_batch(self, batch):
+        queries = [query for query, _, _ in batch]
+        max_k = max(k for _, k, _ in batch)
+        distances, indices = search_batch(queries, self.index, self.model, max_k, self.embedding_cache)
+        results = []
+        for (query, k, _), row_distances, row_ids in zip(batch, distances, indices):
+            result = self._rows(row_distances[:k], row_ids[:k])
+            self.result_cache.put(query, k, result)
+            results.append(result)
+        return results
+
+def parse_date(value, name):
+    """Проверяет дату фильтра: ГГГГ-ММ-ДД или ГГГГ-ММ-ДДTЧЧ:ММ[:СС], как taken_at в базе."""
+    if not value:
+        return None
+    try:
+        if not DATE_PATTERN.match(value):
+            raise ValueError
+        datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f'{name}: ожидается дата ГГГГ-ММ-ДД или ГГГГ-ММ-ДДTЧЧ:ММ:СС')
+    return value
+
+def parse_bbox(value):
+    """Разбирает bbox=мин_широта,мин_долгота,макс_широта,макс_долгота."""
+    if not value:
+        return None
+    try:
+        bbox = tuple(float(part) for part in value.split(','))
+    except ValueError:
+        bbox = ()
+    if len(bbox) != 4 or not all(math.isfinite(part) for part in bbox):
+        raise HTTPException(status_code=400, detail='bbox: ожидается четыре числа: мин. широта, мин. долгота, '
+                                                    'макс. широта, макс. долгота')
+    min_lat, min_lon, max_lat, max_lon = bbox
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+        raise HTTPException(status_code=400, detail='bbox: широта в [-90, 90], долгота в [-180, 180], минимум не больше максимума')
+    return bbox
+
+def parse_image_format(value):
+    """Проверяет формат файла по списку форматов PIL (в базе хранится image.format)."""
+    if not value:
+        return None
+    formats = set(Image.registered_extensions().values())
+    if value.upper() not in formats:
+        raise HTTPException(status_code=400, detail=f'image_format: неизвестный формат {value}')
+    return value
+
+def create_app(service):
+    """Создает FastAPI приложение поверх сервиса поиска."""
+
+    @asynccontextmanager
+    async def lifespan(app):
+        await service.start()
+        yield
+        await service.stop()
+
+    app = FastAPI(title='Image catalog search', lifespan=lifespan)
+
+    @app.get('/health')
+    async def health():
+        return {"status": "ok", "vectors": service.index.ntotal}
+
+    rerank_pattern = '^(' + '|'.join(RERANKERS) + ')$'
+
+    @app.get('/search')
+    async def search(q: str, k: int = Query(5, ge=1, le=1000), date_from: str = None, date_to: str = None,
+                     camera: str = None, lens: str = None, bbox: str = None, image_format: str = None,
+                     rerank: str = Query(None, pattern=rerank_pattern),
+                     candidates: int = Query(CANDIDATES, ge=1, le=1000),
+                     budget_ms: float = Query(TIME_BUDGET_MS, ge=0)):
+        # С переранжированием первый этап возвращает candidates кандидатов
+        stage_k = max(k, candidates) if rerank else k
+        filters = {
+            "date_from": parse_date(date_from, 'date_from'),
+            "date_to": parse_date(date_to, 'date_to'),
+            "camera": camera,
+            "lens": lens,
+            "bbox": parse_bbox(bbox),
+            "image_format": parse_image_format(image_format),
+        }
+        if any(value is not None for value in filters.values()):
+            results = await service.search_filtered(q, stage_k, filters)
+        else:
+            results = await service.search(q, stage_k)
+        if rerank:
+            results = (await service.rerank(q, results, rerank, budget_ms))[:k]
+        return {"query": q, "results": results}
+
+    @app.get('/hybrid')
+    async def hybrid(q: str, limit: int = Query(10, ge=1, le=1000), offset: int = Query(0, ge=0),
+                     fts_weight: float = FTS_WEIGHT, vector_weight: float = VECTOR_WEIGHT,
+                     rerank: str = Query(None, pattern=rerank_pattern),
+                     candidates: int = Query(CANDIDATES, ge=1, le=1000),
+                     budget_ms: float = Query(TIME_BUDGET_MS, ge=0)):
+        if not rerank:
+            results = await service.hybrid(q, limit, offset, fts_weight, vector_weight)
+            return {"query": q, "limit": limit, "offset": offset, "results": results}
+        # Кандидаты объединенного полнотекстового и векторного поиска переранжируются, затем берется страница
+        results = await service.hybrid(q, max(candidates, offset + limit), 0, fts_weight, vector_weight)
+        results = await service.rerank(q, results, rerank, budget_ms)
+        return {"query": q, "limit": limit, "offset": offset, "results": results[offset:offset + limit]}
+
+    @app.get('/thumbnail/{image_id}')
+    async def thumbnail(image_id: int, size: str = Query('small', pattern='^(' + '|'.join(THUMBNAIL_SIZES) + ')$')):
+        data = await service.thumbnail(image_id, size)
+        if data is None:
+            raise HTTPException(status_code=404, detail='Миниатюра недоступна')
+        return Response(content=data, media_type=f'image/{thumbnail_format().lower()}')
+
+    @app.get('/metrics', response_class=PlainTextResponse)
+    async def metrics_endpoint():
+        # Формат Prometheus; без --metrics сбор выключен и список пуст
+        return metrics.to_prometheus()
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description='Сервер семантического поиска изображений.')
+    parser.add_argument('--host', default=HOST, help=f'Адрес (по умолчанию: {HOST})')
+    parser.add_argument('--port', type=int, default=PORT, help=f'Порт (по умолчанию: {PORT})')
+    parser.add_argument('--uds', help='Путь к Unix-сокету вместо TCP')
+    parser.add_argument('--max-batch-size', type=int, default=MAX_BATCH_SIZE,
+                        help=f'Максимальный размер пачки запросов (по умолчанию: {MAX_BATCH_SIZE})')
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS,
+                        help=f'Время набора пачки в миллисекундах (по умолчанию: {MAX_WAIT_MS})')
+    parser.add_argument('--nprobe', type=int, help='Количество просматриваемых кластеров для IVF индексов')
+    parser.add_argument('--ef-search', type=int, help='Параметр efSearch для HNSW индексов')
+    parser.add_argument('--cache-path', default=EMBEDDING_CACHE_PATH,
+                        help=f'Файл кэша эмбеддингов запросов (по умолчанию: {EMBEDDING_CACHE_PATH})')
+    parser.add_argument('--result-ttl', type=float, default=RESULT_CACHE_TTL,
+                        help=f'Время жизни закэшированных результатов в секундах (по умолчанию: {RESULT_CACHE_TTL})')
+    parser.add_argument('--mmap', action='store_true',
+                        help='Отображать индекс в память вместо полной загрузки (для индексов больше RAM)')
+    parser.add_argument('--derivative-cache', default=CACHE_DIR,
+                        help=f'Каталог кэша миниатюр (по умолчанию: {CACHE_DIR})')
+    parser.add_argument('--derivative-cache-mb', type=int, default=MAX_CACHE_BYTES >> 20,
+                        help=f'Предельный размер кэша миниатюр в МиБ (по умолчанию: {MAX_CACHE_BYTES >> 20})')
+    parser.add_argument('--cross-encoder-model', default=CROSS_ENCODER_MODEL,
+                        help=f'Модель кросс-энкодера для rerank=cross-encoder (по умолчанию: {CROSS_ENCODER_MODEL})')
+    parser.add_argument('--reload-interval', type=float, default=RELOAD_INTERVAL,
+                        help=f'Как часто проверять, не перестроен ли индекс, в секундах; 0 — не перезагружать '
+                             f'(по умолчанию: {RELOAD_INTERVAL})')
+    parser.add_argument('--metrics', action='store_true',
+                        help='Собирать время этапов и счетчики и отдавать их на /metrics')
+    args = parser.parse_args()
+
+    if args.metrics:
+        metrics.enable()
+    derivative_cache = DerivativeCache(args.derivative_cache, args.derivative_cache_mb << 20)
+    service = SearchService(args.max_batch_size, args.max_wait_ms, args.nprobe, args.ef_search,
+                            args.cache_path, args.result_ttl, args.mmap, derivative_cache, args.cross_encoder_model,
+                            args.reload_interval)
+    app = create_app(service)
+    if args.uds:
+        uvicorn.run(app, uds=args.uds)
+    else:
+        uvicorn.run(app, host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
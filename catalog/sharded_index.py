@@ -0,0 +1,124 @@
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Описание шардов хранится рядом с индексом: image_index.faiss.shards.json
+MANIFEST_SUFFIX = '.shards.json'
+
+def manifest_path(index_path):
+    """Путь к описанию шардов индекса."""
+    return index_path + MANIFEST_SUFFIX
+
+def shard_path(index_path, shard_no):
+    """Путь к файлу шарда: image_index.shard0.faiss, image_index.shard1.faiss, ..."""
+    root, ext = os.path.splitext(index_path)
+    return f"{root}.shard{shard_no}{ext}"
+
+def load_manifest(index_path):
+    """
+    Загружает описание шардов.
+
+    Returns:
+        list: Шарды — словари с path (абсолютный путь), min_id и max_id
+              (границы диапазона, None — без границы), или None для индекса без шардов
+    """
+    path = manifest_path(index_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        shards = json.load(f)["shards"]
+    base_dir = os.path.dirname(os.path.abspath(path))
+    for shard in shards:
+        shard["path"] = os.path.join(base_dir, shard["path"])
+    return shards
+
+def save_manifest(index_path, shards):
+    """Атомарно сохраняет описание шардов; пути к файлам хранятся относительно него."""
+    path = manifest_path(index_path)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    data = {"shards": [dict(shard, path=os.path.relpath(os.path.abspath(shard["path"]), base_dir))
+                       for shard in shards]}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def read_index(path, mmap=False):
+    """
+    Загружает индекс из файла.
+
+    С mmap=True данные индекса не копируются в память, а отображаются из файла:
+    для IVF-индексов инвертированные списки читаются с диска по мере обращения,
+    и потребление памяти ограничено страничным кэшем, а не размером каталога.
+    """
+    import faiss
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    return faiss.read_index(path, flags)
+
+def merge_results(distances, labels, k, metric_type=None):
+    """
+    Объединяет результаты поиска по шардам в общий top-k.
+
+    Args:
+        distances (list): Массивы расстояний (nq, k) каждого шарда
+        labels (list): Массивы идентификаторов (nq, k) каждого шарда
+        k (int): Количество результатов
+        metric_type (int): Метрика индекса; для скалярного произведения больше — лучше
+
+    Returns:
+        tuple: (distances, labels) формы (nq, k); недостающие позиции заполнены -1
+    """
+    import faiss
+    all_distances = np.hstack(distances)
+    all_labels = np.hstack(labels)
+    keys = -all_distances if metric_type == faiss.METRIC_INNER_PRODUCT else all_distances.copy()
+    keys[all_labels < 0] = np.inf
+    order = np.argsort(keys, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(all_distances, order, 1), np.take_along_axis(all_labels, order, 1)
+
+class ShardedIndex:
+    """
+    Индекс из нескольких шардов по диапазонам идентификаторов.
+
+    Поиск выполняется во всех шардах параллельно (FAISS отпускает GIL),
+    результаты объединяются в общий top-k. Поддерживает тот же вызов
+    search(x, k, params=...), что и обычный индекс FAISS.
+    """
+
+    def __init__(self, shards):
+        self.shards = shards
+        self.d = shards[0].d
+        self.metric_type = shards[0].metric_type
+        self._executor = ThreadPoolExecutor(max_workers=len(shards))
+
+    @property
+    def ntotal(self):
+        return sum(shard.ntotal for shard in self.shards)
+
+    @property
+    def is_trained(self):
+        return all(shard.is_trained for shard in self.shards)
+
+    def search(self, x, k, params=None):
+        def search_shard(shard):
+            if params is None:
+                return shard.search(x, k)
+            return shard.search(x, k, params=params)
+
+        return self.map_search(search_shard, k)
+
+    def map_search(self, search_shard, k):
+        """Выполняет search_shard(шард) во всех шардах параллельно и объединяет top-k."""
+        results = list(self._executor.map(search_shard, self.shards))
+        return merge_results([d for d, _ in results], [i for _, i in results], k, self.metric_type)
+
+def open_index(index_path, mmap=False):
+    """
+    Загружает индекс: шардированный, если рядом есть описание шардов,
+    иначе обычный файл индекса.
+    """
+    shards = load_manifest(index_path)
+    if shards is None:
+        return read_index(index_path, mmap)
+    return ShardedIndex([read_index(shard["path"], mmap) for shard in shards])
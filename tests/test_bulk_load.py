@@ -0,0 +1,66 @@
+import sqlite3
+import pytest
+from catalog.catalog_db import BatchWriter
+from catalog.index_images import begin_bulk_load, end_bulk_load, fts_triggers_exist, init_db
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    conn = init_db()
+    yield conn
+    conn.close()
+
+def insert(conn, n, description):
+    conn.execute('INSERT INTO images (file_path, description) VALUES (?, ?)', (f'img{n}.jpg', description))
+
+def fts_ids(conn, query):
+    return sorted(row[0] for row in conn.execute('SELECT rowid FROM images_fts WHERE images_fts MATCH ?', (query,)))
+
+def test_triggers_keep_fts_in_sync(conn):
+    insert(conn, 1, 'горы и озеро')
+    conn.commit()
+    assert fts_ids(conn, 'озеро') == [1]
+    conn.execute("UPDATE images SET description = 'море' WHERE id = 1")
+    assert fts_ids(conn, 'озеро') == [] and fts_ids(conn, 'море') == [1]
+    conn.execute('DELETE FROM images WHERE id = 1')
+    assert fts_ids(conn, 'море') == []
+
+def test_bulk_load_defers_fts_until_end(conn):
+    begin_bulk_load(conn)
+    assert not fts_triggers_exist(conn.cursor())
+    for n in range(1, 4):
+        insert(conn, n, f'закат {n}')
+    conn.commit()
+    assert fts_ids(conn, 'закат') == []
+    end_bulk_load(conn)
+    assert fts_triggers_exist(conn.cursor())
+    assert fts_ids(conn, 'закат') == [1, 2, 3]
+
+def test_interrupted_bulk_load_is_repaired_by_init_db(conn):
+    insert(conn, 1, 'лес')
+    conn.commit()
+    begin_bulk_load(conn)
+    insert(conn, 2, 'лес зимой')
+    conn.commit()
+    conn.close()
+    # Процесс упал до end_bulk_load: следующий запуск пересобирает FTS
+    conn = init_db()
+    assert fts_triggers_exist(conn.cursor())
+    assert fts_ids(conn, 'лес') == [1, 2]
+    conn.close()
+
+def test_batch_writer_commits_by_size_and_rolls_back_failed_batch(conn):
+    def write(conn, batch):
+        for n, description in batch:
+            insert(conn, n, description)
+
+    writer = BatchWriter(conn, write, batch_size=2, commit_interval=3600)
+    writer.add((1, 'а'))
+    assert conn.in_transaction is False and writer.batch == [(1, 'а')]
+    writer.add((2, 'б'))
+    assert writer.batch == [] and not conn.in_transaction
+    writer.add((3, 'в'))
+    with pytest.raises(sqlite3.IntegrityError):
+        writer.add((3, 'дубликат'))   # Нарушение UNIQUE(file_path): вся пачка откатывается
+    assert writer.batch == []
+    assert [row[0] for row in conn.execute('SELECT id FROM images ORDER BY id')] == [1, 2]
@@ -0,0 +1,80 @@
+import sqlite3
+import faiss
+import numpy as np
+import pytest
+from catalog import create_faiss_index
+from catalog.create_faiss_index import (build_full, build_incremental, build_shard, shard_ranges, init_state_table,
+                                        index_spec, load_spec)
+from catalog.embedding_store import init_store_table, count_embeddings
+from catalog.sharded_index import load_manifest
+
+DIMENSION = 8
+
+def make_store(ids, seed=0):
+    """База в памяти с хранилищем эмбеддингов для указанных id."""
+    conn = sqlite3.connect(':memory:')
+    init_store_table(conn)
+    init_state_table(conn)
+    vectors = np.random.default_rng(seed).random((len(ids), DIMENSION), dtype=np.float32)
+    conn.executemany('INSERT INTO embeddings (image_id, content_hash, dtype, vector) VALUES (?, ?, ?, ?)',
+                     [(image_id, str(image_id), 'f4', vector.tobytes()) for image_id, vector in zip(ids, vectors)])
+    conn.commit()
+    return conn
+
+def test_shard_ranges_cover_all_ids_without_empty_ranges():
+    conn = make_store([10, 11])
+    ranges = shard_ranges(conn, 4)
+    assert ranges[0][0] is None and ranges[-1][1] is None
+    assert all(count_embeddings(conn, min_id, max_id) > 0 for min_id, max_id in ranges)
+    assert sum(count_embeddings(conn, min_id, max_id) for min_id, max_id in ranges) == 2
+    for (_, max_id), (next_min, _) in zip(ranges, ranges[1:]):
+        assert next_min == max_id + 1
+
+def test_build_full_with_more_shards_than_vectors(tmp_path, monkeypatch):
+    monkeypatch.setattr(create_faiss_index, 'INDEX_PATH', str(tmp_path / 'image_index.faiss'))
+    conn = make_store([1, 2, 3])
+    dimension, total = build_full(conn, 'ivf', n_shards=4, encoding='sq8')
+    assert (dimension, total) == (DIMENSION, 3)
+    shards = load_manifest(create_faiss_index.INDEX_PATH)
+    assert 1 < len(shards) < 4
+
+def test_build_shard_without_vectors_for_training():
+    conn = make_store([1, 2, 3])
+    init_state_table(conn)
+    with pytest.raises(ValueError):
+        build_shard(conn, DIMENSION, 'ivf', min_id=100, max_id=200)
+
+def change_description(conn, image_id):
+    """Хеш описания изменился: вектор нужно заменить при инкрементальном обновлении."""
+    conn.execute("UPDATE embeddings SET content_hash = 'изменено' WHERE image_id = ?", (image_id,))
+    conn.commit()
+
+def test_incremental_rebuild_keeps_index_parameters(tmp_path, monkeypatch):
+    monkeypatch.setattr(create_faiss_index, 'INDEX_PATH', str(tmp_path / 'image_index.faiss'))
+    conn = make_store(range(1, 51))
+    build_full(conn, 'hnsw', metric='cosine', encoding='sqfp16')
+    change_description(conn, 7)
+    # HNSW не поддерживает удаление: полная перестройка с параметрами существующего индекса
+    build_incremental(conn)
+    index = faiss.read_index(create_faiss_index.INDEX_PATH)
+    assert index_spec(index) == ('hnsw', 'cosine', 'sqfp16')
+    assert load_spec(conn) == {'index_type': 'hnsw', 'metric': 'cosine', 'encoding': 'sqfp16'}
+
+def test_incremental_refuses_other_metric(tmp_path, monkeypatch):
+    monkeypatch.setattr(create_faiss_index, 'INDEX_PATH', str(tmp_path / 'image_index.faiss'))
+    conn = make_store(range(1, 51))
+    build_full(conn, 'flat', metric='cosine')
+    with pytest.raises(ValueError):
+        build_incremental(conn, metric='l2')
+    build_incremental(conn, metric='cosine')
+
+def test_incremental_infers_parameters_of_legacy_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(create_faiss_index, 'INDEX_PATH', str(tmp_path / 'image_index.faiss'))
+    conn = make_store(range(1, 51))
+    build_full(conn, 'flat', metric='cosine', encoding='sq8')
+    conn.execute('DELETE FROM faiss_spec')
+    conn.commit()
+    change_description(conn, 3)
+    build_incremental(conn)
+    assert index_spec(faiss.read_index(create_faiss_index.INDEX_PATH)) == ('flat', 'cosine', 'sq8')
+    assert load_spec(conn)['metric'] == 'cosine'
@@ -0,0 +1,38 @@
+import sqlite3
+import numpy as np
+from catalog.embedding_store import init_store_table, sample_embeddings
+
+def make_store(ids):
+    """Хранилище, в котором вектор изображения содержит его id."""
+    conn = sqlite3.connect(':memory:')
+    init_store_table(conn)
+    conn.executemany('INSERT INTO embeddings (image_id, content_hash, dtype, vector) VALUES (?, ?, ?, ?)',
+                     [(image_id, '', 'f4', np.full(4, image_id, dtype=np.float32).tobytes()) for image_id in ids])
+    return conn
+
+def sampled_ids(sample):
+    return sample[:, 0].astype(np.int64)
+
+def test_sample_from_sparse_ids_has_requested_size_and_distinct_rows():
+    ids = np.unique(np.random.default_rng(0).integers(1, 1_000_000, 20_000))
+    conn = make_store(ids.tolist())
+    sample = sample_embeddings(conn, 1000, seed=1)
+    assert sample.shape == (1000, 4)
+    assert len(np.unique(sampled_ids(sample))) == 1000
+    assert np.isin(sampled_ids(sample), ids).all()
+
+def test_sample_respects_id_range():
+    conn = make_store(range(1, 10_001))
+    sample = sample_embeddings(conn, 500, min_id=2001, max_id=4000, seed=1)
+    assert sample.shape == (500, 4)
+    assert ((sampled_ids(sample) >= 2001) & (sampled_ids(sample) <= 4000)).all()
+
+def test_sample_larger_than_range_returns_all_vectors():
+    ids = list(range(1, 3000, 7))
+    conn = make_store(ids)
+    sample = sample_embeddings(conn, 10_000, seed=1)
+    assert sorted(sampled_ids(sample).tolist()) == ids
+
+def test_sample_of_empty_range_is_none():
+    conn = make_store(range(1, 100))
+    assert sample_embeddings(conn, 10, min_id=1000) is None
@@ -0,0 +1,94 @@
+import os
+import pytest
+from catalog.file_scanner import DirectoryScanner
+from catalog.index_images import init_db
+
+OLD_MTIME_NS = 1_000_000_000 * 10**9
+
+def write(path, data=b'image'):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    os.utime(path, ns=(OLD_MTIME_NS, OLD_MTIME_NS))
+
+def settle(*dirs):
+    """Старый mtime каталогов: следующее изменение гарантированно его сдвинет."""
+    for path in dirs:
+        os.utime(path, ns=(OLD_MTIME_NS, OLD_MTIME_NS))
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    root = tmp_path / 'photos'
+    write(root / 'a.jpg')
+    write(root / 'b.png')
+    write(root / 'notes.txt')
+    write(root / 'trip' / 'c.jpg')
+    settle(root, root / 'trip')
+    conn = init_db()
+    yield root, conn
+    conn.close()
+
+def scan(root, conn, **options):
+    """Один проход сканера; файлы записываются в images, как после индексации."""
+    scanner = DirectoryScanner(str(root), recursive=True, conn=conn, **options)
+    found = []
+    for _, files in scanner:
+        for file_path, (size, mtime_ns, inode) in files:
+            found.append(os.path.relpath(file_path, root))
+            conn.execute('''
+                INSERT INTO images (file_path, file_size, file_mtime_ns, file_inode) VALUES (?, ?, ?, ?)
+                ON CONFLICT(file_path) DO UPDATE SET file_size = excluded.file_size,
+                    file_mtime_ns = excluded.file_mtime_ns, file_inode = excluded.file_inode
+            ''', (file_path, size, mtime_ns, inode))
+    conn.commit()
+    return sorted(found), scanner
+
+def test_first_scan_reads_all_directories(tree):
+    root, conn = tree
+    found, scanner = scan(root, conn)
+    assert found == ['a.jpg', 'b.png', os.path.join('trip', 'c.jpg')]
+    assert (scanner.scanned_dirs, scanner.skipped_dirs) == (2, 0)
+
+def test_unchanged_directories_are_skipped(tree):
+    root, conn = tree
+    scan(root, conn)
+    found, scanner = scan(root, conn)
+    assert found == []
+    assert (scanner.scanned_dirs, scanner.skipped_dirs) == (0, 2)
+
+def test_in_place_edit_in_skipped_directory_is_found(tree):
+    root, conn = tree
+    scan(root, conn)
+    (root / 'trip' / 'c.jpg').write_bytes(b'edited image')
+    settle(root / 'trip')
+    found, scanner = scan(root, conn)
+    assert found == [os.path.join('trip', 'c.jpg')]
+    assert scanner.skipped_dirs == 2
+
+def test_new_file_changes_directory_mtime(tree):
+    root, conn = tree
+    scan(root, conn)
+    write(root / 'd.jpg')
+    found, scanner = scan(root, conn)
+    # Перечитанный каталог возвращается целиком; неизмененные файлы отсеивает вызывающий код
+    assert found == ['a.jpg', 'b.png', 'd.jpg']
+    assert (scanner.scanned_dirs, scanner.skipped_dirs) == (1, 1)
+
+def test_full_scan_and_changed_filters_ignore_journal(tree):
+    root, conn = tree
+    scan(root, conn)
+    _, scanner = scan(root, conn, full_scan=True)
+    assert scanner.skipped_dirs == 0
+    found, scanner = scan(root, conn, include=['*.jpg'])
+    assert found == ['a.jpg', os.path.join('trip', 'c.jpg')]
+    assert scanner.skipped_dirs == 0
+
+def test_skipped_directory_does_not_return_files_of_subdirectories(tree):
+    root, conn = tree
+    scan(root, conn)
+    # Файл подкаталога изменен, но это проверяется при обходе подкаталога, а не корня
+    (root / 'trip' / 'c.jpg').write_bytes(b'edited image')
+    settle(root / 'trip')
+    scanner = DirectoryScanner(str(root), recursive=True, conn=conn)
+    by_directory = {os.path.relpath(path, root): files for path, files in scanner}
+    assert list(by_directory) == ['trip']
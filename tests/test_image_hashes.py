@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from PIL import Image
+from catalog import catalog_db
+from catalog.image_hashes import (PerceptualIndex, collapse_near_duplicates, find_similar_images, hash_image_file,
+                                  hash_version)
+from catalog.index_images import init_db
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    """База каталога в tmp_path с тремя изображениями и их хешами."""
+    monkeypatch.chdir(tmp_path)
+    conn = init_db()
+    rng = np.random.default_rng(0)
+    for n in range(3):
+        path = tmp_path / f'img{n}.png'
+        Image.fromarray(rng.integers(0, 255, (64, 64, 3), dtype=np.uint8)).save(path)
+        hashes = hash_image_file(str(path))
+        conn.execute('INSERT INTO images (file_path, description, phash, dhash) VALUES (?, ?, ?, ?)',
+                     (str(path), f'описание {n}', hashes["phash"], hashes["dhash"]))
+    conn.commit()
+    yield conn
+    conn.close()
+
+def forbid_rebuild(monkeypatch):
+    def from_db(*args, **kwargs):
+        raise AssertionError('индекс перестроен')
+    monkeypatch.setattr(PerceptualIndex, 'from_db', classmethod(from_db))
+
+def test_saved_index_is_reused_while_hashes_are_unchanged(catalog, tmp_path, monkeypatch):
+    first = PerceptualIndex.load('images.db')
+    assert first.index.ntotal == 3
+    assert (tmp_path / 'phash_index.faiss').exists()
+
+    # Описание не входит в хеши: версия не меняется
+    catalog.execute("UPDATE images SET description = 'другое' WHERE id = 1")
+    catalog.commit()
+    with monkeypatch.context() as m:
+        forbid_rebuild(m)
+        assert PerceptualIndex.load('images.db').index.ntotal == 3
+
+@pytest.mark.parametrize('change', [
+    'UPDATE images SET phash = phash + 1 WHERE id = 1',
+    'DELETE FROM images WHERE id = 2',
+    "INSERT INTO images (file_path, phash, dhash) VALUES ('new.png', 1, 2)",
+])
+def test_index_is_rebuilt_after_hash_change(catalog, change):
+    PerceptualIndex.load('images.db')
+    version = hash_version(catalog)
+    catalog.execute(change)
+    catalog.commit()
+    assert hash_version(catalog) != version
+
+    expected = catalog.execute('SELECT id, phash FROM images').fetchall()
+    index = PerceptualIndex.load('images.db')
+    assert index.index.ntotal == len(expected)
+    for image_id, value in expected:
+        assert (image_id, 0) in index.search(value, k=len(expected))
+
+def test_saved_index_of_other_column_is_not_used(catalog):
+    PerceptualIndex.load('images.db', column='phash', index_path='hash_index.faiss')
+    index = PerceptualIndex.load('images.db', column='dhash', index_path='hash_index.faiss')
+    image_id, value = catalog.execute('SELECT id, dhash FROM images WHERE id = 3').fetchone()
+    assert index.search(value, k=1) == [(image_id, 0)]
+
+def test_find_similar_images_returns_exact_match_first(catalog, tmp_path):
+    results = find_similar_images(str(tmp_path / 'img1.png'), k=2, db_path='images.db')
+    assert results[0] == (2, str(tmp_path / 'img1.png'), 0)
+
+def test_database_without_counter_is_indexed_in_memory(catalog, tmp_path):
+    catalog.execute('DROP TABLE hash_version')
+    catalog.commit()
+    assert PerceptualIndex.load('images.db').index.ntotal == 3
+    assert not (tmp_path / 'phash_index.faiss').exists()
+
+def test_lookups_use_read_only_connections(catalog, tmp_path, monkeypatch):
+    modes = []
+    connect = catalog_db.connect
+
+    def recording_connect(db_path, readonly=False, **kwargs):
+        modes.append(readonly)
+        return connect(db_path, readonly, **kwargs)
+
+    monkeypatch.setattr(catalog_db, 'connect', recording_connect)
+    find_similar_images(str(tmp_path / 'img0.png'), k=3, db_path='images.db')
+    results = collapse_near_duplicates([{"id": 1}, {"id": 1}, {"id": 2}])
+    assert [result["id"] for result in results] == [1, 2]
+    assert modes and all(modes)
@@ -0,0 +1,84 @@
+import threading
+import pytest
+from catalog import catalog_db, job_queue
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'images.db')
+    conn = catalog_db.connect(path)
+    job_queue.init_jobs_table(conn)
+    for n in range(6):
+        job_queue.enqueue(conn, f'img{n}.jpg')
+    conn.commit()
+    conn.close()
+    return path
+
+@pytest.fixture
+def conn(db_path):
+    conn = catalog_db.connect(db_path)
+    yield conn
+    conn.close()
+
+def test_lease_marks_jobs_running_and_does_not_give_them_out_again(conn):
+    first = job_queue.lease(conn, 'a', limit=4)
+    second = job_queue.lease(conn, 'b', limit=4)
+    assert len(first) == 4 and len(second) == 2
+    assert not {job_id for job_id, _ in first} & {job_id for job_id, _ in second}
+    assert job_queue.counts(conn) == {job_queue.STATE_RUNNING: 6}
+
+def test_concurrent_workers_never_share_a_job(db_path):
+    leased = []
+    barrier = threading.Barrier(3)
+
+    def worker(owner):
+        conn = catalog_db.connect(db_path)
+        barrier.wait()
+        while True:
+            jobs = job_queue.lease(conn, owner, limit=1)
+            if not jobs:
+                break
+            leased.extend(job_id for job_id, _ in jobs)
+        conn.close()
+
+    threads = [threading.Thread(target=worker, args=(f'w{n}',)) for n in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(leased) == list(range(1, 7))
+
+def test_expired_lease_is_taken_over(conn):
+    (job_id, _), = job_queue.lease(conn, 'crashed', limit=1, lease_seconds=-1)
+    taken = job_queue.lease(conn, 'b', limit=6)
+    assert job_id in {taken_id for taken_id, _ in taken}
+
+def test_failed_attempts_requeue_until_limit(conn):
+    (job_id, _), = job_queue.lease(conn, 'a', limit=1)
+    for attempt in range(1, job_queue.MAX_ATTEMPTS + 1):
+        job_queue.fail(conn, job_id, f'ошибка {attempt}')
+        conn.commit()
+        state, attempts = conn.execute('SELECT state, attempts FROM index_jobs WHERE id = ?', (job_id,)).fetchone()
+        assert attempts == attempt
+        assert state == (job_queue.STATE_FAILED if attempt == job_queue.MAX_ATTEMPTS else job_queue.STATE_PENDING)
+    # Проваленное задание не возвращается ни арендой, ни повторной постановкой в очередь
+    job_queue.enqueue(conn, 'img0.jpg')
+    assert job_id not in {leased_id for leased_id, _ in job_queue.lease(conn, 'a', limit=10)}
+    assert job_queue.retry_failed(conn) == 1
+    assert job_queue.lease(conn, 'a', limit=10) == [(job_id, 'img0.jpg')]
+
+def test_retried_job_goes_after_fresh_ones(conn):
+    (job_id, _), = job_queue.lease(conn, 'a', limit=1)
+    job_queue.fail(conn, job_id, 'таймаут')
+    conn.commit()
+    jobs = job_queue.lease(conn, 'a', limit=6)
+    assert jobs[-1][0] == job_id
+
+def test_done_job_is_requeued_when_file_changes(conn):
+    (job_id, file_path), = job_queue.lease(conn, 'a', limit=1)
+    job_queue.complete(conn, job_id)
+    job_queue.release(conn, job_id)   # Уже выполненное задание release не трогает
+    conn.commit()
+    assert conn.execute('SELECT state FROM index_jobs WHERE id = ?', (job_id,)).fetchone()[0] == job_queue.STATE_DONE
+    job_queue.enqueue(conn, file_path)
+    conn.commit()
+    assert conn.execute('SELECT state FROM index_jobs WHERE id = ?', (job_id,)).fetchone()[0] == job_queue.STATE_PENDING
@@ -0,0 +1,112 @@
+import threading
+import pytest
+import requests
+from catalog.ollama_client import AdaptiveLimiter, OllamaClient
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self._body = body or {"response": "ok"}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code}", response=self)
+
+    def json(self):
+        return self._body
+
+def make_client(responses, urls=None, max_retries=2):
+    """Клиент без сети: session.post возвращает или бросает элементы responses по очереди."""
+    client = OllamaClient(urls or ['http://ollama-a'], max_retries=max_retries, backoff_base=0)
+    calls = []
+
+    def post(url, json, timeout):
+        calls.append(url)
+        result = responses.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    for endpoint in client.endpoints:
+        endpoint.session.post = post
+    return client, calls
+
+def test_limiter_acquire_up_to_limit_and_release():
+    limiter = AdaptiveLimiter(initial=2, max_limit=4)
+    assert limiter.try_acquire()
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+    limiter.release(latency=1.0)
+    assert limiter.in_flight == 1
+    assert limiter.try_acquire()
+
+def test_limiter_grows_on_success_and_halves_on_error():
+    limiter = AdaptiveLimiter(initial=4, max_limit=8)
+    limiter.try_acquire()
+    limiter.release(latency=1.0)
+    assert limiter.limit == pytest.approx(4.25)
+    limiter.try_acquire()
+    limiter.release(error=True)
+    assert limiter.limit == pytest.approx(2.125)
+    assert limiter.in_flight == 0
+
+def test_limiter_halves_on_slow_response():
+    limiter = AdaptiveLimiter(initial=4, max_limit=8, latency_tolerance=2.0)
+    limiter.try_acquire()
+    limiter.release(latency=1.0)
+    limiter.try_acquire()
+    limiter.release(latency=5.0)
+    assert limiter.limit == pytest.approx(4.25 / 2)
+
+def test_limiter_never_drops_below_min():
+    limiter = AdaptiveLimiter(initial=1)
+    for _ in range(3):
+        limiter.try_acquire()
+        limiter.release(error=True)
+    assert limiter.limit == 1
+    assert limiter.free == 1
+
+def test_url_without_scheme_is_rejected():
+    with pytest.raises(ValueError):
+        OllamaClient(['localhost:11434'])
+
+def test_transient_error_is_retried_on_another_endpoint():
+    client, calls = make_client([requests.exceptions.ConnectionError('refused'), FakeResponse()],
+                                urls=['http://ollama-a', 'http://ollama-b'])
+    assert client.post('/api/generate', {}) == {"response": "ok"}
+    assert len(calls) == 2 and calls[0] != calls[1]
+    assert all(stats["in_flight"] == 0 for stats in client.stats())
+
+def test_server_error_exhausts_retries_and_releases_slot():
+    client, calls = make_client([FakeResponse(503)] * 3, max_retries=2)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.post('/api/generate', {})
+    assert len(calls) == 3
+    assert client.stats()[0]["in_flight"] == 0
+
+def test_non_retryable_error_releases_slot():
+    client, calls = make_client([requests.exceptions.ChunkedEncodingError('broken'),
+                                 requests.exceptions.InvalidURL('bad'),
+                                 FakeResponse()])
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client.post('/api/generate', {})
+    assert len(calls) == 1
+    assert client.stats()[0]["in_flight"] == 0
+
+    with pytest.raises(requests.exceptions.InvalidURL):
+        client.post('/api/generate', {})
+    assert client.stats()[0]["in_flight"] == 0
+
+    # Слот свободен: следующий запрос не ждет бесконечно в _acquire_endpoint
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(client.post('/api/generate', {})), daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+    assert result == {"response": "ok"}
+
+def test_client_error_is_not_retried():
+    client, calls = make_client([FakeResponse(404)])
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.post('/api/generate', {})
+    assert len(calls) == 1
+    assert client.stats()[0]["in_flight"] == 0
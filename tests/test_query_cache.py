@@ -0,0 +1,29 @@
+from catalog.query_cache import ResultCache
+
+def test_result_cache_is_cleared_only_explicitly():
+    cache = ResultCache(ttl=60)
+    cache.put('кошка', 5, ['результат'])
+    assert cache.get('кошка', 5) == ['результат']
+    assert cache.get('кошка', 10) is None
+    cache.clear()
+    assert cache.get('кошка', 5) is None
+
+def test_result_cache_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('catalog.query_cache.time.monotonic', lambda: now[0])
+    cache = ResultCache(ttl=10)
+    cache.put('кошка', 5, ['результат'])
+    now[0] += 11
+    assert cache.get('кошка', 5) is None
+
+def test_index_swap_clears_results_of_old_index():
+    from types import SimpleNamespace
+    from catalog.search_server import SearchService
+    # Без загрузки модели и индекса: проверяется только подмена в потоке модели
+    service = SearchService.__new__(SearchService)
+    service.result_cache = ResultCache(ttl=60)
+    service.result_cache.put('кошка', 5, ['результат старого индекса'])
+    new_index = SimpleNamespace(ntotal=3)
+    service._swap_index(new_index, (1, 2, 3))
+    assert service.index is new_index and service.generation == (1, 2, 3)
+    assert service.result_cache.get('кошка', 5) is None
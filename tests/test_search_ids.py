@@ -0,0 +1,53 @@
+import faiss
+import numpy as np
+import pytest
+from catalog.create_faiss_index import create_faiss_index, search_ids, set_search_params
+from catalog.sharded_index import ShardedIndex
+
+DIMENSION = 16
+N_VECTORS = 2000
+
+@pytest.fixture(scope='module')
+def data():
+    rng = np.random.default_rng(0)
+    vectors = rng.random((N_VECTORS, DIMENSION), dtype=np.float32)
+    ids = np.arange(N_VECTORS, dtype=np.int64) * 3 + 100   # id не совпадают с позициями
+    allowed = np.sort(rng.choice(ids, 50, replace=False))
+    return vectors, ids, allowed, vectors[:5]
+
+def exact_top_k(vectors, ids, allowed, queries, k):
+    """Точный top-k по L2 среди разрешенных id."""
+    mask = np.isin(ids, allowed)
+    distances = ((queries[:, None, :] - vectors[None, mask, :]) ** 2).sum(axis=2)
+    return ids[mask][np.argsort(distances, axis=1)[:, :k]]
+
+@pytest.mark.parametrize('index_type', ['flat', 'hnsw', 'ivf'])
+def test_filtered_search_returns_only_allowed_ids(data, index_type):
+    vectors, ids, allowed, queries = data
+    index = create_faiss_index(vectors, DIMENSION, ids, index_type)
+    set_search_params(index, nprobe=64, ef_search=256)
+    distances, labels = search_ids(index, queries, 10, allowed)
+    assert labels.shape == (len(queries), 10)
+    assert np.isin(labels, allowed).all()
+    assert (np.diff(distances, axis=1) >= 0).all()
+    if index_type == 'flat':
+        np.testing.assert_array_equal(labels, exact_top_k(vectors, ids, allowed, queries, 10))
+
+def test_flat_index_is_wrapped_in_id_map(data):
+    vectors, ids, allowed, _ = data
+    assert isinstance(create_faiss_index(vectors[:10], DIMENSION, ids[:10], 'flat'), faiss.IndexIDMap)
+
+def test_k_larger_than_allowed_pads_with_minus_one(data):
+    vectors, ids, _, queries = data
+    index = create_faiss_index(vectors, DIMENSION, ids, 'flat')
+    _, labels = search_ids(index, queries[:1], 5, ids[[7, 3]])
+    assert sorted(labels[0][:2].tolist()) == sorted(ids[[7, 3]].tolist())
+    assert (labels[0][2:] == -1).all()
+
+def test_sharded_index_merges_filtered_results(data):
+    vectors, ids, allowed, queries = data
+    half = N_VECTORS // 2
+    shards = ShardedIndex([create_faiss_index(vectors[:half], DIMENSION, ids[:half], 'flat'),
+                           create_faiss_index(vectors[half:], DIMENSION, ids[half:], 'flat')])
+    _, labels = search_ids(shards, queries, 10, allowed)
+    np.testing.assert_array_equal(labels, exact_top_k(vectors, ids, allowed, queries, 10))
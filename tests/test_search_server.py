@@ -0,0 +1,29 @@
+import pytest
+from fastapi import HTTPException
+from catalog.search_server import parse_bbox, parse_date, parse_image_format
+
+@pytest.mark.parametrize('value', ['a,b,c,d', '1,2,3', '1,2,3,4,5', 'nan,1,2,3', '50,30,40,40', '0,0,100,10'])
+def test_invalid_bbox_is_rejected_with_400(value):
+    with pytest.raises(HTTPException) as error:
+        parse_bbox(value)
+    assert error.value.status_code == 400
+
+def test_bbox_is_parsed_to_four_floats():
+    assert parse_bbox('43,40.5,44,42') == (43.0, 40.5, 44.0, 42.0)
+    assert parse_bbox(None) is None and parse_bbox('') is None
+
+@pytest.mark.parametrize('value', ['yesterday', '2021-13-01', '2021-02-30', '2021-01-01 10:00', '2021-1-1'])
+def test_invalid_date_is_rejected_with_400(value):
+    with pytest.raises(HTTPException) as error:
+        parse_date(value, 'date_from')
+    assert error.value.status_code == 400
+
+@pytest.mark.parametrize('value', ['2021-01-01', '2021-01-01T10:00', '2021-01-01T10:00:59'])
+def test_valid_dates_are_accepted(value):
+    assert parse_date(value, 'date_to') == value
+
+def test_image_format_must_be_known_to_pil():
+    assert parse_image_format('jpeg') == 'jpeg'
+    with pytest.raises(HTTPException) as error:
+        parse_image_format('xyz')
+    assert error.value.status_code == 400